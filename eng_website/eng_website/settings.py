@@ -26,12 +26,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'services.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'knowledge_base.identity_map.IdentityMapMiddleware',
 ]
 
 ROOT_URLCONF = 'eng_website.urls'
@@ -53,6 +55,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'eng_website.wsgi.application'
+ASGI_APPLICATION = 'eng_website.asgi.application'
+# Route the async page views (knowledge_base/async_views.py); only worth it when served through asgi.py
+ASYNC_VIEWS = False
 
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
@@ -65,6 +70,33 @@ DATABASES = {
         'PASSWORD': 'postgres',
         'HOST': 'localhost',
         'PORT': '5432',
+        # persistent connections, so the one a worker opens during warmup (knowledge_base/warmup.py) serves
+        # its requests; health checks replace a connection the server dropped meanwhile
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replicas (services/db_router.py): copies of 'default' on the hosts in DATABASE_REPLICA_HOSTS get the reads,
+# writes stay on 'default'. Any alias listed in DATABASE_REPLICAS works, locally e.g. a second sqlite file
+# kept in sync by hand; give it 'TEST': {'MIRROR': 'default'} so tests do not create it.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['services.db_router.ReplicaRouter']
+# Seconds reads stay on the primary for a client after a request that wrote (read-your-writes)
+REPLICA_STICKY_SECONDS = 10
+# Seconds between health probes of a replica, and how long a failed one is skipped
+REPLICA_HEALTH_CHECK_INTERVAL = 5
+REPLICA_RETRY_INTERVAL = 30
+
+# One cache for every worker: the version keys that invalidate the per-process category resolver and id
+# indexes, the rendered cards and their hit counters only reach the other workers through it.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
     }
 }
 
@@ -102,16 +134,57 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Without DEBUG, collectstatic fingerprints every file and writes .gz copies; services.static_files.serve_static
+# serves them from STATIC_ROOT with immutable cache headers. Run collectstatic on every deploy.
+if not DEBUG:
+    STATICFILES_STORAGE = 'services.static_files.CompressedManifestStaticFilesStorage'
 
 MEDIA_ROOT = "media/"
 MEDIA_URL = 'media/'
 
+# Widths of the generated image thumbnails (services/thumbnails.py). They are named by content hash,
+# so the web server can serve media/thumbnails/ with far-future immutable cache headers.
+THUMBNAIL_WIDTHS = (320, 640, 1280)
+
 CKEDITOR_UPLOAD_PATH = "media/"
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Seconds between batched writes of buffered article/quiz view counts, None disables the timer
+VIEWS_FLUSH_INTERVAL = 10
+
+# Seconds between bulk inserts of buffered quiz attempts, None disables the timer
+ATTEMPTS_FLUSH_INTERVAL = 10
+
+# Seconds after which the homepage snapshot is rebuilt in the background, None disables it.
+# The refresh_homepage_snapshot command only reaches the workers through a shared CACHES backend.
+HOMEPAGE_SNAPSHOT_MAX_AGE = 300
+
+# Urls per sitemap shard (the protocol allows 50 000) and seconds after which a cached shard, feed or the
+# sitemap index is checked against the database again; content saves invalidate them earlier.
+# Shards are split by id range, so changing the size regenerates every one of them.
+SITEMAP_SHARD_SIZE = 5000
+SITEMAP_MAX_AGE = 3600
+
+# Seconds a rendered article or category card stays cached. Cards are keyed by the row's updated_at, counters
+# and thumbnail url, so a change renders a new card at once and this only bounds how long unused ones are kept.
+FRAGMENT_CACHE_TIMEOUT = 86400
+# Seconds between flushes of the card cache hit/miss counters into the shared cache
+FRAGMENT_STATS_FLUSH_INTERVAL = 10
+
+# Seconds a category stays in a worker's resolver (knowledge_base/identity_map.py) before it is read again,
+# None keeps it until the next category save; saves reach the other workers through the shared cache.
+CATEGORY_RESOLVER_MAX_AGE = 60
+# Seconds after which a worker reads the article and quiz ids it samples from (knowledge_base/sampling.py)
+# again, None keeps them until the next content save
+ID_INDEX_MAX_AGE = 300
+
+# Seconds a compiled quiz page stays cached, content changes drop it earlier; bounds how stale its views are
+QUIZ_PAYLOAD_MAX_AGE = 60
+
 CKEDITOR_CONFIGS = {
     'default': {
         'skin': 'moono',
@@ -14,12 +14,21 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.conf import settings
 from django.conf.urls.static import static
-from django.urls import path,include
+from django.urls import path, include, re_path
+
+from knowledge_base.views import BulkExportView
+from services.static_files import serve_static
 
 urlpatterns = [
+    path('admin/knowledge_base/export/', staff_member_required(BulkExportView.as_view()), name='knowledge-base-export'),
     path('admin/', admin.site.urls),
     path('ckeditor/', include('ckeditor_uploader.urls')),
     path('', include('knowledge_base.urls')),
-]+ static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if not settings.DEBUG:
+    # collected, fingerprinted and precompressed files; runserver's staticfiles handler covers DEBUG
+    urlpatterns.append(re_path(rf'^{settings.STATIC_URL.lstrip("/")}(?P<path>.*)$', serve_static))
@@ -0,0 +1,13 @@
+import os
+
+# Read by gunicorn from the working directory: gunicorn eng_website.wsgi
+
+
+def post_fork(server, worker):
+    # every worker warms itself up before it accepts its first request
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eng_website.settings')
+    import django
+    django.setup()
+
+    from knowledge_base.warmup import warm_up
+    warm_up(log=lambda message: worker.log.info(f'warmup {message}'))
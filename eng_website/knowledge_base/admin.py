@@ -1,10 +1,9 @@
 from django.contrib import admin
+from django.template.response import TemplateResponse
 
 from knowledge_base.models import Category, TopicCategory, HandbookCategory, PhrasesCategory, ArticleCategory, \
     QuizCategory, \
-    Article, Topic, PhrasesArticle, Lesson, Quiz, Question, Answer, QuizResult
-
-
+    Article, Topic, PhrasesArticle, Lesson, Quiz, Question, Answer, QuizResult, ViewStat
 
 
 class CategoryAdminBase(admin.ModelAdmin):
@@ -96,6 +95,51 @@ class QuizAdmin(ArticleTypedAdminBase):
     type = Category.QUIZ
 
 
-admin.site.register(Question)
+@admin.register(Question)
+class QuestionAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'answered', 'correct_rate')
+    list_select_related = ('quiz',)
+    readonly_fields = ('answered', 'answered_correctly', 'correct_rate')
+
+    @admin.display(description='Доля правильных ответов')
+    def correct_rate(self, obj):
+        rate = obj.correct_rate
+        return '—' if rate is None else f'{rate:.0%}'
+
+
 admin.site.register(Answer)
 admin.site.register(QuizResult)
+
+
+@admin.register(ViewStat)
+class ViewStatAdmin(admin.ModelAdmin):
+    report_days = 7
+    default_top = 10
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            top = max(int(request.GET.get('top', self.default_top)), 1)
+        except ValueError:
+            top = self.default_top
+
+        section_labels = dict(Category.TYPE_CHOICES)
+        top_by_sections = ViewStat.get_top_by_sections(top=top, days=self.report_days)
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Популярное за {self.report_days} дней',
+            'top': top,
+            'days': self.report_days,
+            'sections': [(section_labels.get(section, section), rows) for section, rows in top_by_sections.items()],
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/knowledge_base/viewstat/report.html', context)
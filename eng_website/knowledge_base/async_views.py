@@ -0,0 +1,214 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import BadRequest
+from django.http import Http404
+from django.utils.cache import get_conditional_response
+from django.utils.translation import gettext as _
+from django.views.generic import View
+
+from . import views
+from .identity_map import aget_or_load, category_resolver
+from .models import Category, HandbookCategory
+from .pagination import InvalidCursor, akeyset_page
+from .quiz_payloads import quiz_payloads
+from .snapshots import homepage_snapshot
+from .views import add_validator_headers, category_aggregates, category_list_validators_from, \
+    category_validators_from, object_validators, CATEGORY_LIST_VALIDATOR_FIELDS, \
+    snapshot_validators, validator_headers, QuizSubmitView, SearchView, SitemapIndexView, \
+    SitemapShardView  # noqa: F401, sync only
+
+# Async twins of the page views for ASGI deployments, routed instead of the sync ones with ASYNC_VIEWS = True.
+# They read through the async ORM, share the validators, contexts and templates of knowledge_base.views and
+# never touch the database from the event loop: rows are loaded before the context is built and templates
+# are rendered by the handler in its sync thread. Quiz submits, search, sitemaps and the export stay sync.
+
+
+class AsyncConditionalGetMixin:
+    async def aget_validators(self):
+        return None
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await View.dispatch(self, request, *args, **kwargs)
+
+        validators = await self.aget_validators()
+        if validators is None:
+            return await View.dispatch(self, request, *args, **kwargs)
+
+        etag, timestamp = validator_headers(validators)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = await View.dispatch(self, request, *args, **kwargs)
+        elif response.status_code == 304:
+            self.not_modified()
+        return add_validator_headers(response, etag, timestamp)
+
+
+class AsyncKeysetPaginationMixin:
+    async def apaginate_keyset(self, queryset):
+        try:
+            items, self.next_cursor = await akeyset_page(queryset, self.ordering, self.request.GET.get('cursor'),
+                                                         self.page_size)
+        except InvalidCursor:
+            raise BadRequest('Invalid cursor')
+        return items
+
+    async def arender(self, context):
+        # the json fragment is rendered right away, so off the event loop
+        if self.request.GET.get('format') == 'json':
+            return await sync_to_async(self.render_to_response)(context)
+        return self.render_to_response(context)
+
+
+class IndexView(AsyncConditionalGetMixin, views.IndexView):
+    async def aget_validators(self):
+        self.snapshot = await homepage_snapshot.aget()
+        return snapshot_validators(self.snapshot)
+
+    async def get(self, request, *args, **kwargs):
+        return self.render_to_response(self.get_context_data(**kwargs))
+
+
+class HandbookTopicsListView(AsyncConditionalGetMixin, views.HandbookTopicsListView):
+    async def aget_validators(self):
+        data = await Category.objects.filter(type=Category.HANDBOOK).aaggregate(**category_aggregates('articles'))
+        return category_validators_from(data)
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        self.topics = await sync_to_async(HandbookCategory.get_topics_with_lessons)()
+        return self.render_to_response(self.get_context_data())
+
+    def get_topics(self):
+        return self.topics
+
+
+class LessonDetailView(AsyncConditionalGetMixin, views.LessonDetailView):
+    async def aget_validators(self):
+        return self.validators_from(
+            await self.model.objects.filter(slug=self.kwargs.get(self.slug_url_kwarg)).aaggregate(**self.aggregates))
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.get_queryset().filter(slug=self.kwargs.get(self.slug_url_kwarg)).afirst()
+        if self.object is None:
+            raise Http404(_("No %(verbose_name)s found matching the query")
+                          % {"verbose_name": self.model._meta.verbose_name})
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class CategoriesListMixin(AsyncConditionalGetMixin, AsyncKeysetPaginationMixin):
+    async def aget_validators(self):
+        queryset = self.model.objects.filter(type=self.type or self.model.proxy_type)
+        return category_list_validators_from([row async for row in queryset.values_list(
+            *CATEGORY_LIST_VALIDATOR_FIELDS)])
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = await self.apaginate_keyset(self.model.all_with_child_count(self.type))
+        return await self.arender(self.get_context_data())
+
+
+class ItemsListMixin(AsyncConditionalGetMixin, AsyncKeysetPaginationMixin):
+    async def aget_validators(self):
+        # also loads the category the sync views resolve lazily
+        category = await category_resolver.aget(slug=self.kwargs.get('slug'))
+        if category is None:
+            raise Http404(_("No %(verbose_name)s found matching the query")
+                          % {"verbose_name": self.category_model._meta.verbose_name})
+        self.category = category
+        return self.validators_from(await self.validators_queryset().afirst())
+
+    async def get(self, request, *args, **kwargs):
+        queryset = self.model.objects.filter(category_id=self.category.pk).defer(*self.deferred_fields)
+        self.object_list = await self.apaginate_keyset(queryset)
+        return await self.arender(self.get_context_data())
+
+
+class DetailMixin(AsyncConditionalGetMixin):
+    async def aload_object(self, queryset=None, key='slug'):
+        queryset = self.get_queryset() if queryset is None else queryset
+        slug = self.get_slug()
+
+        async def load():
+            obj = await queryset.filter(slug=slug).afirst()
+            if obj is not None and obj.category_id is not None:
+                obj.category = await category_resolver.aget(pk=obj.category_id)
+            return obj
+
+        # the same identity map keys as views.load_by_slug
+        return await aget_or_load((queryset.model, key, slug), load)
+
+    async def aget_validators(self):
+        obj = await self.aload_object(self.validators_queryset(), key='validators')
+        if obj is None:
+            return None
+        self.validated_pk = obj.pk
+        return object_validators(obj)
+
+    async def get(self, request, *args, **kwargs):
+        obj = await self.aload_object()
+        if obj is None:
+            raise Http404(_("No %(verbose_name)s found matching the query")
+                          % {"verbose_name": self.model._meta.verbose_name})
+        self.object = self.count_view(obj)
+        return self.render_to_response(self.get_context_data(object=self.object))
+
+
+class QuizDetailView(AsyncConditionalGetMixin, views.QuizDetailView):
+    async def aload_object(self):
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        return await aget_or_load((self.model, 'payload', slug), lambda: quiz_payloads.aget(slug))
+
+    async def aget_validators(self):
+        payload = await self.aload_object()
+        if payload is None:
+            return None
+        return self.validators_from(payload, await category_resolver.aget(pk=payload['category_id']))
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await self.aload_object()
+        if self.object is not None:
+            self.category = await category_resolver.aget(pk=self.object['category_id'])
+        return self.render_to_response(self.get_context_data())
+
+
+class TopicsCategoriesListView(CategoriesListMixin, views.TopicsCategoriesListView):
+    pass
+
+
+class TopicsListView(ItemsListMixin, views.TopicsListView):
+    pass
+
+
+class TopicDetailView(DetailMixin, views.TopicDetailView):
+    pass
+
+
+class PhrasebookCategoriesListView(CategoriesListMixin, views.PhrasebookCategoriesListView):
+    pass
+
+
+class PhrasesArticlesListView(ItemsListMixin, views.PhrasesArticlesListView):
+    pass
+
+
+class PhrasesArticleDetailView(DetailMixin, views.PhrasesArticleDetailView):
+    pass
+
+
+class ArticleCategoriesListView(CategoriesListMixin, views.ArticleCategoriesListView):
+    pass
+
+
+class ArticlesListView(ItemsListMixin, views.ArticlesListView):
+    pass
+
+
+class ArticleDetailView(DetailMixin, views.ArticleDetailView):
+    pass
+
+
+class QuizCategoriesListView(CategoriesListMixin, views.QuizCategoriesListView):
+    pass
+
+
+class QuizzesListView(ItemsListMixin, views.QuizzesListView):
+    pass
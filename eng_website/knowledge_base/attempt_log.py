@@ -0,0 +1,74 @@
+import atexit
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from .view_counter import WriteBehindBuffer
+
+
+class AttemptLog(WriteBehindBuffer):
+    # Graded attempts are kept in memory and bulk inserted together with their answers.
+    # The same flush adds them to the per-question answered / answered_correctly totals,
+    # one UPDATE per distinct pair of increments. Attempts of quizzes and answers to questions deleted
+    # since grading are dropped, so they cannot fail the foreign keys of the whole batch.
+    flush_interval_setting = 'ATTEMPTS_FLUSH_INTERVAL'
+
+    def _empty(self):
+        return []
+
+    def _merge(self, pending):
+        self._pending[:0] = pending
+
+    def record(self, attempt, answers):
+        with self._lock:
+            self._pending.append((attempt, answers))
+            self._schedule_flush()
+
+    @staticmethod
+    def _existing(pending):
+        from .models import Quiz, Question, Answer
+
+        def existing(model, ids):
+            return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+        quiz_ids = existing(Quiz, {attempt.quiz_id for attempt, _ in pending})
+        question_ids = existing(Question, {answer.question_id for _, answers in pending for answer in answers})
+        answer_ids = existing(Answer, {answer.answer_id for _, answers in pending for answer in answers} - {None})
+
+        kept = []
+        for attempt, answers in pending:
+            if attempt.quiz_id not in quiz_ids:
+                continue
+            answers = [answer for answer in answers if answer.question_id in question_ids]
+            for answer in answers:
+                if answer.answer_id not in answer_ids:
+                    answer.answer_id = None
+            kept.append((attempt, answers))
+        return kept
+
+    def _write(self, pending):
+        from .models import QuizAttempt, AttemptAnswer, Question
+
+        with transaction.atomic():
+            pending = self._existing(pending)
+
+            answered, correct = Counter(), Counter()
+            for _, answers in pending:
+                for answer in answers:
+                    answered[answer.question_id] += 1
+                    correct[answer.question_id] += answer.correct
+
+            pks_by_increments = defaultdict(list)
+            for question_id, count in answered.items():
+                pks_by_increments[(count, correct[question_id])].append(question_id)
+
+            QuizAttempt.objects.bulk_create([attempt for attempt, _ in pending])
+            AttemptAnswer.objects.bulk_create([answer for _, answers in pending for answer in answers])
+            for (count, correct_count), pks in pks_by_increments.items():
+                Question.objects.filter(pk__in=pks).update(answered=F('answered') + count,
+                                                           answered_correctly=F('answered_correctly') + correct_count)
+
+
+attempt_log = AttemptLog()
+atexit.register(attempt_log.flush)
@@ -0,0 +1,310 @@
+import asyncio
+import json
+import statistics
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from types import ModuleType
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, reset_queries
+from django.db.models import Count
+from django.test import AsyncClient, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Category, Article, Quiz
+from .pagination import cursor_for
+
+METRICS = ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries')
+# metrics where a bigger number is an improvement
+HIGHER_IS_BETTER = ('throughput_rps',)
+
+
+def benchmark_host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+def percentile(sorted_values, percent):
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def deep_page_scenarios(name, path, queryset, ordering=('-views', '-id')):
+    # a page from the middle of the category and the infinite scroll fragment for it
+    count = queryset.count()
+    if count < 2:
+        return {}
+    cursor = cursor_for(queryset.order_by(*ordering)[count // 2], ordering)
+    return {f'{name}-deep': (path, {'cursor': cursor}), f'{name}-json': (path, {'cursor': cursor, 'format': 'json'})}
+
+
+def default_scenarios():
+    # one url per view, pointing at the biggest category of each section
+    scenarios = {'index': (reverse('index'), {}), 'handbook': (reverse('handbook'), {})}
+
+    def biggest_category(type, related):
+        return (Category.objects.filter(type=type).annotate(items=Count(related))
+                .order_by('-items', 'id').first())
+
+    sections = (
+        (Category.TOPIC, 'topics-categories', 'topics', 'topic'),
+        (Category.PHRASEBOOK, 'phrasebook-categories', 'phrasebook-category', 'phrase-article'),
+        (Category.ARTICLE, 'articles-categories', 'articles-category', 'article'),
+    )
+    for type, list_name, category_name, detail_name in sections:
+        scenarios[list_name] = (reverse(list_name), {})
+        category = biggest_category(type, 'articles')
+        if category is None:
+            continue
+        path = reverse(category_name, kwargs={'slug': category.slug})
+        scenarios[category_name] = (path, {})
+        scenarios.update(deep_page_scenarios(category_name, path, Article.objects.filter(category=category)))
+        article = Article.objects.filter(category=category).order_by('-views').first()
+        if article is not None:
+            scenarios[detail_name] = (reverse(detail_name, kwargs={'category_slug': category.slug,
+                                                                   'slug': article.slug}), {})
+
+    lesson = Article.objects.filter(category__type=Category.HANDBOOK, parent__isnull=False).first()
+    if lesson is not None:
+        scenarios['lesson'] = (reverse('lesson', kwargs={'slug': lesson.slug}), {})
+
+    scenarios['quizzes-categories'] = (reverse('quizzes-categories'), {})
+    category = biggest_category(Category.QUIZ, 'quizzes')
+    if category is not None:
+        path = reverse('quizzes-category', kwargs={'slug': category.slug})
+        scenarios['quizzes-category'] = (path, {})
+        scenarios.update(deep_page_scenarios('quizzes-category', path, Quiz.objects.filter(category=category)))
+        quiz = Quiz.objects.filter(category=category).first()
+        if quiz is not None:
+            scenarios['quiz'] = (reverse('quiz', kwargs={'category_slug': category.slug, 'slug': quiz.slug}), {})
+
+    scenarios['search'] = (reverse('search'), {'q': 'grammar'})
+    return scenarios
+
+
+def run_scenario(client, path, params, requests, warmup):
+    for _ in range(warmup):
+        client.get(path, params)
+
+    with CaptureQueriesContext(connection) as ctx:
+        status = client.get(path, params).status_code
+    queries = len(ctx.captured_queries)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        request_started = time.perf_counter()
+        client.get(path, params)
+        latencies.append((time.perf_counter() - request_started) * 1000)
+        reset_queries()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'path': path,
+        'status': status,
+        'requests': requests,
+        'throughput_rps': round(requests / elapsed, 2),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'queries': queries,
+    }
+
+
+def run_benchmark(scenarios=None, requests=200, warmup=10, only=None, log=lambda message: None):
+    client = Client(HTTP_HOST=benchmark_host())
+    scenarios = scenarios or default_scenarios()
+    results = {}
+    for name, (path, params) in scenarios.items():
+        if only and name not in only:
+            continue
+        results[name] = run_scenario(client, path, params, requests, warmup)
+        log(format_result(name, results[name]))
+    return results
+
+
+@lru_cache(maxsize=None)
+def stack_urlconf(stack):
+    # the knowledge base pages served by the sync views or by their async twins, as a ROOT_URLCONF
+    from . import async_views, views
+    from .urls import build_urlpatterns
+
+    urlconf = ModuleType(f'knowledge_base.{stack}_urls')
+    urlconf.urlpatterns = build_urlpatterns(async_views if stack == 'async' else views)
+    return urlconf
+
+
+def sync_load(path, params, concurrency, requests):
+    # WSGI: one thread per concurrent client, each with its own connection
+    def worker(count):
+        client = Client(HTTP_HOST=benchmark_host())
+        latencies = []
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                client.get(path, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+        return latencies
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        counts = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        return [latency for latencies in executor.map(worker, counts) for latency in latencies]
+
+
+def async_load(path, params, concurrency, requests):
+    # ASGI: concurrent clients are tasks on one event loop
+    async def worker(count):
+        client = AsyncClient(HTTP_HOST=benchmark_host())
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            await client.get(path, params)
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies
+
+    async def run():
+        counts = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        try:
+            return await asyncio.gather(*(worker(count) for count in counts))
+        finally:
+            # the test client leaves the connections of the sync_to_async thread open
+            await sync_to_async(connections.close_all)()
+
+    return [latency for latencies in asyncio.run(run()) for latency in latencies]
+
+
+def run_load_scenario(stack, path, params, concurrency, requests, warmup):
+    load = async_load if stack == 'async' else sync_load
+    with override_settings(ROOT_URLCONF=stack_urlconf(stack)):
+        load(path, params, concurrency, warmup)
+
+        started = time.perf_counter()
+        latencies = sorted(load(path, params, concurrency, requests))
+        elapsed = time.perf_counter() - started
+
+        # a second, traced pass: tracemalloc slows every allocation down
+        tracemalloc.start()
+        try:
+            load(path, params, concurrency, min(requests, concurrency * 4))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'path': path,
+        'concurrency': concurrency,
+        'requests': requests,
+        'throughput_rps': round(requests / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'peak_memory_kib': round(peak / 1024, 1),
+    }
+
+
+def run_load_test(scenarios=None, concurrency=16, requests=400, warmup=16, only=None, log=lambda message: None):
+    # in-process sync (WSGI test client, threads) against async (ASGI test client, event loop) per view
+    scenarios = scenarios or default_scenarios()
+    results = {}
+    for name, (path, params) in scenarios.items():
+        if only and name not in only:
+            continue
+        results[name] = {stack: run_load_scenario(stack, path, params, concurrency, requests, warmup)
+                         for stack in ('sync', 'async')}
+        for stack, result in results[name].items():
+            log(f'{name:24} {stack:5} {result["throughput_rps"]:>9.1f} rps  p50 {result["p50_ms"]:>8.2f} ms  '
+                f'p95 {result["p95_ms"]:>8.2f} ms  peak {result["peak_memory_kib"]:>9.1f} KiB')
+    return results
+
+
+# pages that must not slow down as the number of articles grows
+GROWTH_SCENARIOS = ('topics-categories', 'phrasebook-categories', 'articles-categories', 'quizzes-categories')
+
+
+def run_growth_benchmark(sizes, requests=100, warmup=10, log=lambda message: None):
+    # Adds synthetic articles (and a tenth as many quizzes) until each size is reached and measures the category
+    # list pages at every step: {size: {scenario: result}}. Writes to the database, run it on a disposable one.
+    from .synthetic import ContentGenerator
+
+    client = Client(HTTP_HOST=benchmark_host())
+    results = {}
+    for size in sorted(sizes):
+        missing = size - Article.objects.count()
+        if missing > 0:
+            # one new category per type and step, so the list pages keep the same length while the articles grow
+            ContentGenerator(articles=missing, categories_per_type=1, content_words=30, prefix=f'growth{size}',
+                             seed=size).generate()
+        results[size] = {}
+        for name in GROWTH_SCENARIOS:
+            results[size][name] = run_scenario(client, reverse(name), {}, requests, warmup)
+            log(format_result(f'{size:>8} {name}', results[size][name]))
+    return results
+
+
+def run_category_size_benchmark(sizes, requests=100, warmup=10, log=lambda message: None):
+    # Creates an article category with each number of synthetic articles and measures its paginated list pages:
+    # the first page, a cursor page from the middle, its infinite scroll fragment and a revalidation of the
+    # first page, {size: {scenario: result}}. Writes to the database, run it on a disposable one.
+    from .synthetic import ContentGenerator
+
+    client = Client(HTTP_HOST=benchmark_host())
+    results = {}
+    for size in sorted(sizes):
+        prefix = f'size{size}'
+        category = Category.objects.filter(slug=f'{prefix}-{Category.ARTICLE.lower()}-0').first()
+        if category is None:
+            # the articles rotate through the four article types, one category each
+            ContentGenerator(articles=size * 4, quizzes=0, categories_per_type=1, content_words=30, prefix=prefix,
+                             seed=size).generate()
+            category = Category.objects.get(slug=f'{prefix}-{Category.ARTICLE.lower()}-0')
+        path = reverse('articles-category', kwargs={'slug': category.slug})
+        deep = deep_page_scenarios('deep', path, Article.objects.filter(category=category))
+        revalidating = Client(HTTP_HOST=benchmark_host(), HTTP_IF_NONE_MATCH=client.get(path)['ETag'])
+        scenarios = {
+            'first': (client, path, {}),
+            'deep': (client, *deep['deep-deep']),
+            'json': (client, *deep['deep-json']),
+            'not-modified': (revalidating, path, {}),
+        }
+        results[size] = {}
+        for name, (scenario_client, scenario_path, params) in scenarios.items():
+            results[size][name] = run_scenario(scenario_client, scenario_path, params, requests, warmup)
+            log(format_result(f'{size:>8} {name}', results[size][name]))
+    return results
+
+
+def format_result(name, result):
+    return (f'{name:24} {result["throughput_rps"]:>9.1f} rps  p50 {result["p50_ms"]:>8.2f} ms  '
+            f'p95 {result["p95_ms"]:>8.2f} ms  p99 {result["p99_ms"]:>8.2f} ms  {result["queries"]:>3} queries')
+
+
+def compare(results, baseline):
+    # {scenario: {metric: (baseline, current, change in percent, regression)}}
+    comparison = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        comparison[name] = {}
+        for metric in METRICS:
+            before, after = baseline[name][metric], result[metric]
+            change = (after - before) / before * 100 if before else (0.0 if after == before else float('inf'))
+            regression = change < 0 if metric in HIGHER_IS_BETTER else change > 0
+            comparison[name][metric] = (before, after, round(change, 1), regression)
+    return comparison
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return json.load(results_file)['results']
+
+
+def save_results(path, results, meta):
+    with open(path, 'w') as results_file:
+        json.dump({'meta': meta, 'results': results}, results_file, indent=2, sort_keys=True)
@@ -0,0 +1,166 @@
+import math
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, unquote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, UnidentifiedImageError
+
+# Article html is compiled once on save (Article.save, the recompile_content command): CKEditor output is
+# reduced to an allowlist of tags and attributes, re-serialized with every tag closed, images get lazy loading
+# and their dimensions, and the words are counted for the reading time. Detail pages print the result as is.
+WORDS_PER_MINUTE = 180
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'audio', 'b', 'blockquote', 'br', 'caption', 'code', 'col', 'colgroup', 'dd', 'div', 'dl', 'dt',
+    'em', 'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'iframe', 'img', 'li', 'mark',
+    'ol', 'p', 'pre', 's', 'small', 'source', 'span', 'strike', 'strong', 'sub', 'sup', 'table', 'tbody', 'td',
+    'tfoot', 'th', 'thead', 'tr', 'u', 'ul', 'video',
+}
+VOID_TAGS = {'br', 'col', 'hr', 'img', 'source'}
+# dropped together with everything inside them
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template', 'object', 'form', 'button', 'select', 'textarea'}
+
+COMMON_ATTRIBUTES = {'class', 'style', 'title', 'lang', 'dir'}
+TAG_ATTRIBUTES = {
+    'a': {'href', 'name', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'iframe': {'src', 'width', 'height', 'allow', 'allowfullscreen', 'frameborder'},
+    'audio': {'src', 'controls', 'preload'},
+    'video': {'src', 'controls', 'preload', 'poster', 'width', 'height'},
+    'source': {'src', 'type'},
+    'ol': {'start', 'type'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'table': {'border', 'cellpadding', 'cellspacing'},
+    'col': {'span'},
+}
+URL_ATTRIBUTES = {'href', 'src', 'poster'}
+URL_SCHEMES = {'', 'http', 'https', 'mailto', 'tel'}
+UNSAFE_STYLE_RE = re.compile(r'expression\s*\(|javascript:|url\s*\(', re.IGNORECASE)
+STYLE_SIZE_RE = re.compile(r'(?:^|;)\s*(width|height)\s*:\s*(\d+)px', re.IGNORECASE)
+WORD_RE = re.compile(r'\w+')
+
+
+def reading_time(words):
+    return max(1, math.ceil(words / WORDS_PER_MINUTE))
+
+
+def media_image_size(src):
+    # (width, height) of an uploaded image the src points to, None for anything else
+    path = unquote(urlsplit(src).path).lstrip('/')
+    media_prefix = settings.MEDIA_URL.lstrip('/')
+    if not media_prefix or not path.startswith(media_prefix):
+        return None
+    try:
+        with default_storage.open(path[len(media_prefix):], 'rb') as image_file:
+            # only the header is parsed
+            return Image.open(image_file).size
+    except (OSError, ValueError, UnidentifiedImageError):
+        return None
+
+
+def safe_url(value):
+    try:
+        scheme = urlsplit(value.strip()).scheme.lower()
+    except ValueError:
+        return False
+    return scheme in URL_SCHEMES
+
+
+class ContentCompiler(HTMLParser):
+    def __init__(self, image_size=media_image_size):
+        super().__init__(convert_charrefs=True)
+        self.image_size = image_size
+        self.parts = []
+        self.open_tags = []
+        self.skipped_depth = 0
+        self.words = 0
+
+    def clean_attributes(self, tag, attrs):
+        allowed = COMMON_ATTRIBUTES | TAG_ATTRIBUTES.get(tag, set())
+        cleaned = {}
+        for name, value in attrs:
+            value = '' if value is None else value
+            if name not in allowed or name in cleaned:
+                continue
+            if name in URL_ATTRIBUTES and not safe_url(value):
+                continue
+            if name == 'style' and UNSAFE_STYLE_RE.search(value):
+                continue
+            cleaned[name] = value
+        if tag == 'a' and cleaned.get('target') == '_blank':
+            cleaned['rel'] = 'noopener'
+        elif tag == 'img':
+            self.complete_image(cleaned)
+        return cleaned
+
+    def complete_image(self, attributes):
+        attributes.setdefault('loading', 'lazy')
+        attributes.setdefault('decoding', 'async')
+        if 'width' in attributes and 'height' in attributes:
+            return
+        # CKEditor stores the size the author dragged to in the style attribute
+        size = {name.lower(): value for name, value in STYLE_SIZE_RE.findall(attributes.get('style', ''))}
+        if 'width' not in size or 'height' not in size:
+            natural = self.image_size(attributes['src']) if attributes.get('src') else None
+            if natural is None:
+                return
+            size = {'width': str(natural[0]), 'height': str(natural[1])}
+        attributes.setdefault('width', size['width'])
+        attributes.setdefault('height', size['height'])
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipped_depth += 1
+            return
+        if self.skipped_depth or tag not in ALLOWED_TAGS:
+            return
+        attributes = self.clean_attributes(tag, attrs)
+        self.parts.append('<' + tag + ''.join(
+            f' {name}' if name == 'allowfullscreen' else f' {name}="{escape(value)}"'
+            for name, value in attributes.items()
+        ) + '>')
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS or tag in SKIPPED_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipped_depth = max(0, self.skipped_depth - 1)
+            return
+        if self.skipped_depth or tag not in self.open_tags:
+            # stray closing tag
+            return
+        # closes whatever the author left open inside it
+        while True:
+            open_tag = self.open_tags.pop()
+            self.parts.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skipped_depth:
+            return
+        self.words += len(WORD_RE.findall(data))
+        self.parts.append(escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        while self.open_tags:
+            self.parts.append(f'</{self.open_tags.pop()}>')
+        return ''.join(self.parts).strip()
+
+
+def compile_content(html, image_size=media_image_size):
+    # returns (compiled html, word count)
+    compiler = ContentCompiler(image_size)
+    compiler.feed(html or '')
+    compiled = compiler.close()
+    return compiled, compiler.words
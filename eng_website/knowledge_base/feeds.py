@@ -0,0 +1,83 @@
+import hashlib
+import time
+
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import Http404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import parse_http_date_safe, quote_etag
+from django.utils.text import Truncator
+
+from .models import Article, SearchDocument
+from .sitemaps import FEED_SECTIONS, SECTIONS, site_url, sitemaps
+from .views import add_validator_headers
+
+
+class SectionFeed(Feed):
+    # RSS of the latest changed rows of a section. The generated response is cached per section and host until
+    # the next content change, the same version and SITEMAP_MAX_AGE as the sitemaps. Readers revalidate with
+    # the ETag (a hash of the feed) or Last-Modified (its latest item) and get a 304 while it is unchanged.
+    key_prefix = 'knowledge_base:feed:rss:'
+    language = 'ru'
+    items_count = 30
+    description_words = 60
+
+    def __call__(self, request, *args, **kwargs):
+        key, version = f'{self.key_prefix}{kwargs.get("section")}:{site_url(request)}', sitemaps.version()
+        entry = cache.get(key)
+        if not sitemaps.is_current(entry, version):
+            response = super().__call__(request, *args, **kwargs)
+            entry = {'version': version, 'checked_at': time.time(), 'response': response,
+                     'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+                     'last_modified': parse_http_date_safe(response.headers.get('Last-Modified'))}
+            cache.set(key, entry, None)
+        etag, timestamp = entry['etag'], entry['last_modified']
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp) or entry['response']
+        return add_validator_headers(response, etag, timestamp)
+
+    def get_object(self, request, section):
+        if section not in FEED_SECTIONS:
+            raise Http404('Unknown feed')
+        return SECTIONS[section]
+
+    def title(self, section):
+        return f'{section.title} — Английский язык бесплатно'
+
+    def link(self, section):
+        return reverse(section.list_url_name)
+
+    def description(self, section):
+        return f'Новые и обновлённые материалы раздела «{section.title}»'
+
+    def items(self, section):
+        queryset = section.queryset().select_related('category').order_by('-updated_at', '-id')
+        if section.model is Article:
+            queryset = queryset.defer('content')
+        return queryset[:self.items_count]
+
+    def item_title(self, item):
+        return item.title
+
+    def item_description(self, item):
+        compiled_content = getattr(item, 'compiled_content', '')
+        if not compiled_content:
+            return item.category.title
+        return Truncator(SearchDocument.html_to_text(compiled_content)).words(self.description_words)
+
+    def item_link(self, item):
+        return item.path
+
+    def item_pubdate(self, item):
+        # rows keep no creation time
+        return item.updated_at
+
+    def item_updateddate(self, item):
+        return item.updated_at
+
+
+class AtomSectionFeed(SectionFeed):
+    key_prefix = 'knowledge_base:feed:atom:'
+    feed_type = Atom1Feed
+    subtitle = SectionFeed.description
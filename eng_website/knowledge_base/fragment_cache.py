@@ -0,0 +1,72 @@
+import atexit
+import hashlib
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .view_counter import WriteBehindBuffer
+
+KEY_PREFIX = 'knowledge_base:fragment:'
+OUTCOMES = ('hits', 'misses')
+
+
+def fragment_key(name, vary_on):
+    # Every value the fragment depends on is part of the key, the row's updated_at among them: a changed row
+    # is rendered under a new key and its old fragment is never read again, it just expires.
+    digest = hashlib.md5(':'.join(str(value) for value in vary_on).encode()).hexdigest()
+    return f'{KEY_PREFIX}{name}:{digest}'
+
+
+def fragment_timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 86400)
+
+
+class FragmentStats(WriteBehindBuffer):
+    # Hits and misses per fragment name are counted in memory and added to counters in the shared cache
+    # on flush, so every worker's numbers add up in one place (see the fragment_cache_stats command).
+    flush_interval_setting = 'FRAGMENT_STATS_FLUSH_INTERVAL'
+    key_prefix = 'knowledge_base:fragment-stats:'
+    names_key = 'knowledge_base:fragment-stats-names'
+
+    def _empty(self):
+        return Counter()
+
+    def _merge(self, pending):
+        self._pending.update(pending)
+
+    def record(self, name, hit):
+        with self._lock:
+            self._pending[(name, OUTCOMES[0] if hit else OUTCOMES[1])] += 1
+            self._schedule_flush()
+
+    def counter_key(self, name, outcome):
+        return f'{self.key_prefix}{name}:{outcome}'
+
+    def _write(self, pending):
+        names = cache.get(self.names_key, set())
+        if not {name for name, _ in pending} <= names:
+            cache.set(self.names_key, names | {name for name, _ in pending}, None)
+        for (name, outcome), count in pending.items():
+            key = self.counter_key(name, outcome)
+            cache.add(key, 0, None)
+            cache.incr(key, count)
+
+    def totals(self):
+        # {name: {'hits': n, 'misses': n}} flushed so far
+        keys = {(name, outcome): self.counter_key(name, outcome)
+                for name in cache.get(self.names_key, set()) for outcome in OUTCOMES}
+        values = cache.get_many(keys.values())
+        totals = {}
+        for (name, outcome), key in sorted(keys.items()):
+            totals.setdefault(name, {})[outcome] = values.get(key, 0)
+        return totals
+
+    def reset(self):
+        names = cache.get(self.names_key, set())
+        cache.delete_many([self.counter_key(name, outcome) for name in names for outcome in OUTCOMES])
+        cache.delete(self.names_key)
+
+
+fragment_stats = FragmentStats()
+atexit.register(fragment_stats.flush)
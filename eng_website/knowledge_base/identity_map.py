@@ -0,0 +1,176 @@
+import asyncio
+import copy
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+from services.db_router import primary
+
+_current_map = ContextVar('knowledge_base_identity_map', default=None)
+
+
+class IdentityMapMiddleware:
+    # Every request gets its own identity map: rows loaded through get_or_load are read once per request
+    # and every part of the view gets the same instance.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # lets the handler await this middleware, as django's MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _current_map.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _current_map.reset(token)
+
+    async def __acall__(self, request):
+        token = _current_map.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _current_map.reset(token)
+
+
+def get_or_load(key, load):
+    identity_map = _current_map.get()
+    if identity_map is None:
+        return load()
+    if key not in identity_map:
+        identity_map[key] = load()
+    return identity_map[key]
+
+
+async def aget_or_load(key, load):
+    # load is a coroutine function
+    identity_map = _current_map.get()
+    if identity_map is None:
+        return await load()
+    if key not in identity_map:
+        identity_map[key] = await load()
+    return identity_map[key]
+
+
+def remember(key, obj):
+    identity_map = _current_map.get()
+    if identity_map is not None:
+        identity_map[key] = obj
+
+
+class CategoryResolver:
+    # Process-wide LRU of categories by slug and by id in front of the identity map.
+    # Category saves and deletes bump the version in the cache, so other processes drop their LRU as well.
+    # Entries older than CATEGORY_RESOLVER_MAX_AGE are read again in case a version bump was lost.
+    version_key = 'knowledge_base:category-resolver'
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._categories = OrderedDict()
+        self._version = None
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'CATEGORY_RESOLVER_MAX_AGE', 60)
+
+    def _cached(self, key):
+        with self._lock:
+            version = cache.get(self.version_key, 0)
+            if version != self._version:
+                self._categories.clear()
+                self._version = version
+            category, loaded_at = self._categories.get(key, (None, None))
+            if category is None:
+                return None, version
+            max_age = self.max_age
+            if max_age is not None and time.monotonic() - loaded_at > max_age:
+                del self._categories[key]
+                return None, version
+            self._categories.move_to_end(key)
+            return category, version
+
+    def _store(self, category, version):
+        with self._lock:
+            if version != self._version:
+                return
+            loaded_at = time.monotonic()
+            for key in (('slug', category.slug), ('pk', category.pk)):
+                self._categories[key] = (category, loaded_at)
+                self._categories.move_to_end(key)
+            while len(self._categories) > self.maxsize:
+                self._categories.popitem(last=False)
+
+    def _resolve(self, field, value):
+        from .models import Category
+
+        category, version = self._cached((field, value))
+        if category is None:
+            # shared by the whole process until the next category save, never from a lagging replica
+            with primary():
+                category = Category.objects.filter(**{field: value}).first()
+            if category is None:
+                return None
+            self._store(category, version)
+        return self._share(category)
+
+    async def _aresolve(self, field, value):
+        from .models import Category
+
+        category, version = self._cached((field, value))
+        if category is None:
+            with primary():
+                category = await Category.objects.filter(**{field: value}).afirst()
+            if category is None:
+                return None
+            self._store(category, version)
+        return self._share(category)
+
+    def _share(self, category):
+        # the shared instance stays untouched, the request works on its own copy
+        category = copy.copy(category)
+        remember(('category', 'slug', category.slug), category)
+        remember(('category', 'pk', category.pk), category)
+        return category
+
+    def get(self, slug=None, pk=None):
+        field, value = ('slug', slug) if slug is not None else ('pk', pk)
+        if value is None:
+            return None
+        return get_or_load(('category', field, value), lambda: self._resolve(field, value))
+
+    async def aget(self, slug=None, pk=None):
+        field, value = ('slug', slug) if slug is not None else ('pk', pk)
+        if value is None:
+            return None
+        return await aget_or_load(('category', field, value), lambda: self._aresolve(field, value))
+
+    def preload(self):
+        # every category in one query, as far as the LRU holds them (each is kept by slug and by id)
+        from .models import Category
+
+        _, version = self._cached(None)
+        with primary():
+            categories = list(Category.objects.order_by('id')[:self.maxsize // 2])
+        for category in categories:
+            self._store(category, version)
+        return len(categories)
+
+    def invalidate(self):
+        cache.add(self.version_key, 0, None)
+        cache.incr(self.version_key)
+        with self._lock:
+            self._categories.clear()
+            self._version = None
+
+
+category_resolver = CategoryResolver()
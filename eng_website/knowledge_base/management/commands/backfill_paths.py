@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from knowledge_base.models import Category
+from knowledge_base.sitemaps import sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Rewrites the stored page paths of every article and quiz'
+
+    def handle(self, *args, **options):
+        # after url changes, and for rows written without signals (bulk_create, update, raw sql)
+        with transaction.atomic():
+            updated = Category.update_paths()
+        self.stdout.write(f'{updated} paths updated')
+        if updated:
+            sitemaps.invalidate()
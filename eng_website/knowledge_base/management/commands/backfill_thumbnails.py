@@ -0,0 +1,47 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from knowledge_base.models import Category, Article, Quiz
+from services.thumbnails import cache_key, generate_safely, load_index
+
+
+class Command(BaseCommand):
+    help = 'Generates the thumbnails of every category, article and quiz image in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--force', action='store_true', help='Regenerate images that already have thumbnails')
+
+    def handle(self, *args, workers, force, **options):
+        started = time.perf_counter()
+        names = set()
+        for model in (Category, Article, Quiz):
+            names.update(model.objects.exclude(image='').exclude(image__isnull=True)
+                         .values_list('image', flat=True).iterator())
+        if not force:
+            names = {name for name in names if not load_index(name)}
+        self.stdout.write(f'{len(names)} images to process')
+        if not names:
+            return
+
+        # forked workers must not share the parent's database connection
+        connections.close_all()
+        failed = 0
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            for name, index, error in executor.map(generate_safely, sorted(names), chunksize=8):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    # the workers filled their own copy of a local cache
+                    cache.set(cache_key(name), index, None)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{len(names) - failed} images done, {failed} failed in {elapsed:.1f} s')
@@ -0,0 +1,84 @@
+import platform
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from knowledge_base.benchmarks import run_benchmark, run_category_size_benchmark, run_growth_benchmark, run_load_test, \
+    compare, load_results, save_results
+
+
+class Command(BaseCommand):
+    help = 'Measures throughput, latency percentiles and query counts of every view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per view')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per view')
+        parser.add_argument('--only', nargs='*', help='Url names to run, all views by default')
+        parser.add_argument('--output', help='Write results as json to this file')
+        parser.add_argument('--baseline', help='Compare with results written earlier by --output')
+        parser.add_argument('--max-regression', type=float, default=None,
+                            help='Fail when a latency/throughput metric regresses by more percent than this')
+        parser.add_argument('--load-test', action='store_true',
+                            help='Compare the sync and async views under concurrent clients instead')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients of --load-test')
+        parser.add_argument('--growth', type=int, nargs='+', metavar='ARTICLES',
+                            help='Grow the database to these article counts with synthetic rows and measure the '
+                                 'category list pages at each, for disposable databases only')
+        parser.add_argument('--category-size', type=int, nargs='+', metavar='ARTICLES',
+                            help='Create a category with each of these article counts and measure its paginated '
+                                 'pages and a 304, for disposable databases only')
+
+    def handle(self, *args, **options):
+        if options['growth'] or options['category_size']:
+            benchmark = run_growth_benchmark if options['growth'] else run_category_size_benchmark
+            results = benchmark(options['growth'] or options['category_size'], requests=options['requests'],
+                                warmup=options['warmup'], log=self.stdout.write)
+            if options['output']:
+                save_results(options['output'], results, {
+                    'created_at': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'requests': options['requests'],
+                })
+            return
+
+        if options['load_test']:
+            results = run_load_test(concurrency=options['concurrency'], requests=options['requests'],
+                                    warmup=options['warmup'], only=options['only'], log=self.stdout.write)
+            if options['output']:
+                save_results(options['output'], results, {
+                    'created_at': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'concurrency': options['concurrency'],
+                })
+            return
+
+        results = run_benchmark(requests=options['requests'], warmup=options['warmup'], only=options['only'],
+                                log=self.stdout.write)
+
+        if options['output']:
+            save_results(options['output'], results, {
+                'created_at': timezone.now().isoformat(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'database': connection.vendor,
+                'requests': options['requests'],
+            })
+
+        if not options['baseline']:
+            return
+
+        limit = options['max_regression']
+        regressions = []
+        for name, metrics in compare(results, load_results(options['baseline'])).items():
+            self.stdout.write(name)
+            for metric, (before, after, change, regression) in metrics.items():
+                line = f'    {metric:15} {before:>10} -> {after:<10} {change:+.1f}%'
+                self.stdout.write(self.style.ERROR(line) if regression else line)
+                # any extra query is a regression, timings only past the allowed noise
+                if regression and limit is not None and (metric == 'queries' or abs(change) > limit):
+                    regressions.append(f'{name} {metric} {before} -> {after}')
+
+        if regressions:
+            raise CommandError('Regressions: ' + ', '.join(regressions))
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from knowledge_base.models import ViewStat
+
+
+class Command(BaseCommand):
+    help = 'Folds old daily view stats into weekly buckets and old weekly buckets into monthly ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=60, help='Days kept with daily resolution')
+        parser.add_argument('--keep-weeks', type=int, default=26, help='Weeks kept with weekly resolution')
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+
+        weeks_before = today - timedelta(days=options['keep_days'])
+        weeks_before -= timedelta(days=weeks_before.weekday())
+        weeks = ViewStat.compact(ViewStat.WEEK, weeks_before)
+
+        months_before = (today - timedelta(weeks=options['keep_weeks'])).replace(day=1)
+        months = ViewStat.compact(ViewStat.MONTH, months_before)
+
+        self.stdout.write(f'Compacted into {weeks} weekly and {months} monthly buckets')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from knowledge_base.bulk_export import CHUNK_SIZE, export_ndjson, parse_since
+
+
+class Command(BaseCommand):
+    help = 'Streams categories, articles and quizzes with their questions, answers and results as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rows changed since this ISO date or datetime')
+        parser.add_argument('--output', help='File to write, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, since, output, chunk_size, **options):
+        try:
+            since = parse_since(since) if since else None
+        except ValueError as error:
+            raise CommandError(error)
+
+        lines = export_ndjson(since, chunk_size)
+        if output is None:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(output, 'w', encoding='utf-8') as output_file:
+            output_file.writelines(lines)
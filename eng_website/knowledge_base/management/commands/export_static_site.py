@@ -0,0 +1,49 @@
+import multiprocessing
+import os
+import time
+from functools import partial
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from knowledge_base.static_export import (collect_pages, file_for_path, init_worker, load_manifest, render_page,
+                                          save_manifest)
+
+
+class Command(BaseCommand):
+    help = 'Renders every public page to static html, re-rendering only pages whose content changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help='Directory served by nginx')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of render processes')
+        parser.add_argument('--force', action='store_true', help='Re-render every page')
+
+    def handle(self, *args, output_dir, workers, force, **options):
+        started = time.perf_counter()
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = {} if force else load_manifest(output_dir)
+        pages = collect_pages()
+
+        for path in manifest.keys() - pages.keys():
+            file_for_path(output_dir, path).unlink(missing_ok=True)
+            del manifest[path]
+
+        changed = [path for path, page_hash in pages.items() if manifest.get(path) != page_hash]
+        self.stdout.write(f'{len(changed)} of {len(pages)} pages changed')
+
+        failed = 0
+        if changed:
+            # forked workers must not share the parent's database connection
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(workers, initializer=init_worker) as pool:
+                for path, status in pool.imap_unordered(partial(render_page, output_dir), changed, chunksize=8):
+                    if status == 200:
+                        manifest[path] = pages[path]
+                    else:
+                        failed += 1
+                        manifest.pop(path, None)
+                        self.stderr.write(f'{path}: {status}')
+
+        save_manifest(output_dir, manifest)
+        self.stdout.write(f'Rendered {len(changed) - failed} pages in {time.perf_counter() - started:.1f} s')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from knowledge_base.fragment_cache import fragment_stats
+
+
+class Command(BaseCommand):
+    help = 'Shows the hits and misses of the cached card fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Start counting from zero afterwards')
+
+    def handle(self, *args, reset, **options):
+        # workers add their counts every FRAGMENT_STATS_FLUSH_INTERVAL seconds
+        fragment_stats.flush()
+        for name, counts in fragment_stats.totals().items():
+            total = counts['hits'] + counts['misses']
+            ratio = counts['hits'] / total * 100 if total else 0.0
+            self.stdout.write(f'{name:24} {counts["hits"]:>10} hits {counts["misses"]:>10} misses  {ratio:5.1f}%')
+        if reset:
+            fragment_stats.reset()
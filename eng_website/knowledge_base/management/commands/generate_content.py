@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from knowledge_base.synthetic import ContentGenerator
+
+
+class Command(BaseCommand):
+    help = 'Fills the knowledge base with synthetic categories, articles and quizzes for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--articles', type=int, default=1000)
+        parser.add_argument('--quizzes', type=int, default=None, help='Defaults to a tenth of --articles')
+        parser.add_argument('--categories-per-type', type=int, default=None)
+        parser.add_argument('--questions-per-quiz', type=int, default=10)
+        parser.add_argument('--content-words', type=int, default=300)
+        parser.add_argument('--prefix', default='syn', help='Slug prefix, change it to add a second data set')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        ContentGenerator(
+            articles=options['articles'],
+            quizzes=options['quizzes'],
+            categories_per_type=options['categories_per_type'],
+            questions_per_quiz=options['questions_per_quiz'],
+            content_words=options['content_words'],
+            prefix=options['prefix'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        ).generate()
+        self.stdout.write(f'Done in {time.perf_counter() - started:.1f} s')
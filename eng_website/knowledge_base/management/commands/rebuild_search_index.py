@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from knowledge_base.models import Article, SearchDocument
+
+
+class Command(BaseCommand):
+    help = 'Recreates the search documents of every article'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, batch_size, **options):
+        articles = Article.objects.only('id', 'title', 'content').order_by('id')
+        last_id, total = 0, 0
+        while True:
+            batch = list(articles.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            with transaction.atomic():
+                SearchDocument.objects.filter(article__in=batch).delete()
+                SearchDocument.objects.bulk_create([
+                    SearchDocument(article=article, title=article.title,
+                                   body=SearchDocument.html_to_text(article.content))
+                    for article in batch
+                ])
+            last_id, total = batch[-1].id, total + len(batch)
+            self.stdout.write(f'{total} articles indexed')
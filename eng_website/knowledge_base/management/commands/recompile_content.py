@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from knowledge_base.models import Article, Category
+from knowledge_base.sitemaps import sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Recompiles the stored html and reading time of every article'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--missing', action='store_true', help='Only articles that were never compiled')
+
+    def handle(self, *args, batch_size, missing, **options):
+        articles = Article.objects.only('id', 'category', 'content', 'compiled_content', 'time_for_read').order_by('id')
+        if missing:
+            articles = articles.filter(compiled_content='')
+        last_id, total, changed_total = 0, 0, 0
+        while True:
+            batch = list(articles.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            changed = []
+            now = timezone.now()
+            for article in batch:
+                compiled, time_for_read = article.compiled_content, article.time_for_read
+                article.compile_content()
+                if (article.compiled_content, article.time_for_read) != (compiled, time_for_read):
+                    # a new updated_at invalidates the etags of the pages showing it
+                    article.updated_at = now
+                    changed.append(article)
+            with transaction.atomic():
+                Article.objects.bulk_update(changed, ['compiled_content', 'time_for_read', 'updated_at'])
+                Category.touch_items({article.category_id for article in changed})
+            last_id, total, changed_total = batch[-1].id, total + len(batch), changed_total + len(changed)
+            self.stdout.write(f'{total} articles compiled, {changed_total} changed')
+        if changed_total:
+            # bulk_update sends no signals
+            sitemaps.invalidate()
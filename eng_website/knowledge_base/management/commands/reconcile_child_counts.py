@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from knowledge_base.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Recounts the stored number of articles and quizzes of every category'
+
+    def handle(self, *args, **options):
+        # writes that bypass the signals (bulk_create, update, raw sql) leave the counters behind
+        with transaction.atomic():
+            before = dict(Category.objects.values_list('id', 'child_count'))
+            Category.update_child_counts()
+            after = dict(Category.objects.values_list('id', 'child_count'))
+        drifted = [id for id, count in after.items() if before.get(id) != count]
+        self.stdout.write(f'{len(after)} categories recounted, {len(drifted)} corrected')
+        for id in drifted:
+            self.stdout.write(f'    category {id}: {before[id]} -> {after[id]}')
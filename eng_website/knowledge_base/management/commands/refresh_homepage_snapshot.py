@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from knowledge_base.snapshots import homepage_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Builds the homepage snapshot, optionally repeating every --interval seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=None, help='Keep refreshing with this period in seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            snapshot = homepage_snapshot.rebuild()
+            self.stdout.write(f'Homepage snapshot v{snapshot["version"]} built in '
+                              f'{(time.perf_counter() - started) * 1000:.1f} ms')
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
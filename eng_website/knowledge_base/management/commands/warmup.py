@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from knowledge_base.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = 'Compiles templates, builds the url resolver, opens connections and fills the content caches'
+
+    def handle(self, *args, **options):
+        warm_up(log=self.stdout.write)
@@ -0,0 +1,35 @@
+# Generated by Django 4.1.1 on 2026-10-18 11:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('knowledge_base', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='ID материала')),
+                ('section', models.CharField(blank=True, choices=[('TPC', 'Topic'), ('PRSBK', 'Phrasebook'), ('ART', 'Article'), ('HNDBK', 'Handbook'), ('QUIZ', 'Quiz')], max_length=10, verbose_name='Раздел')),
+                ('period', models.CharField(choices=[('D', 'День'), ('W', 'Неделя'), ('M', 'Месяц')], default='D', max_length=1, verbose_name='Период')),
+                ('day', models.DateField(verbose_name='Начало периода')),
+                ('hits', models.PositiveIntegerField(default=0, verbose_name='Просмотры')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Тип материала')),
+            ],
+            options={
+                'verbose_name': 'Статистика просмотров',
+                'verbose_name_plural': 'Статистика просмотров',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='viewstat',
+            constraint=models.UniqueConstraint(fields=('period', 'day', 'content_type', 'object_id'), name='knowledge_base_viewstat_unique_bucket'),
+        ),
+    ]
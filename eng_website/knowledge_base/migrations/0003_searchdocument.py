@@ -0,0 +1,88 @@
+# Generated by Django 4.1.1 on 2026-10-18 11:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+POSTGRESQL_FORWARD = [
+    """
+    ALTER TABLE knowledge_base_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', title), 'A') ||
+        setweight(to_tsvector('english', title), 'A') ||
+        setweight(to_tsvector('russian', body), 'B') ||
+        setweight(to_tsvector('english', body), 'B')
+    ) STORED;
+    """,
+    """
+    CREATE INDEX knowledge_base_searchdocument_vector_gin ON knowledge_base_searchdocument USING GIN (search_vector);
+    """,
+]
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS knowledge_base_searchdocument_vector_gin;",
+    "ALTER TABLE knowledge_base_searchdocument DROP COLUMN IF EXISTS search_vector;",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE knowledge_base_searchdocument_fts USING fts5(
+        title, body, content='knowledge_base_searchdocument', content_rowid='id', tokenize='unicode61'
+    );
+    """,
+    """
+    CREATE TRIGGER knowledge_base_searchdocument_fts_insert AFTER INSERT ON knowledge_base_searchdocument BEGIN
+        INSERT INTO knowledge_base_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END;
+    """,
+    """
+    CREATE TRIGGER knowledge_base_searchdocument_fts_delete AFTER DELETE ON knowledge_base_searchdocument BEGIN
+        INSERT INTO knowledge_base_searchdocument_fts(knowledge_base_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END;
+    """,
+    """
+    CREATE TRIGGER knowledge_base_searchdocument_fts_update AFTER UPDATE ON knowledge_base_searchdocument BEGIN
+        INSERT INTO knowledge_base_searchdocument_fts(knowledge_base_searchdocument_fts, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO knowledge_base_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+    END;
+    """,
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS knowledge_base_searchdocument_fts_insert;",
+    "DROP TRIGGER IF EXISTS knowledge_base_searchdocument_fts_delete;",
+    "DROP TRIGGER IF EXISTS knowledge_base_searchdocument_fts_update;",
+    "DROP TABLE IF EXISTS knowledge_base_searchdocument_fts;",
+]
+
+
+def run_for_vendor(postgresql, sqlite):
+    def run(apps, schema_editor):
+        statements = {'postgresql': postgresql, 'sqlite': sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0002_viewstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.TextField(verbose_name='Название')),
+                ('body', models.TextField(verbose_name='Текст без разметки')),
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='knowledge_base.article', verbose_name='Статья')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ',
+                'verbose_name_plural': 'Поисковые документы',
+            },
+        ),
+        migrations.RunPython(run_for_vendor(POSTGRESQL_FORWARD, SQLITE_FORWARD),
+                             run_for_vendor(POSTGRESQL_BACKWARD, SQLITE_BACKWARD)),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.1.1 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0004_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['category', '-views', '-id'], name='kb_article_category_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['category', '-views', '-id'], name='kb_quiz_category_views_idx'),
+        ),
+    ]
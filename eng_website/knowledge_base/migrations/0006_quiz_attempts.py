@@ -0,0 +1,54 @@
+# Generated by Django 4.1.1 on 2026-10-18 11:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0005_category_views_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answered',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Ответов'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answered_correctly',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Правильных ответов'),
+        ),
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('score', models.PositiveIntegerField(verbose_name='Правильных ответов')),
+                ('total', models.PositiveIntegerField(verbose_name='Вопросов')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Пройден')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='knowledge_base.quiz', verbose_name='Тест')),
+            ],
+            options={
+                'verbose_name': 'Попытка',
+                'verbose_name_plural': 'Попытки',
+            },
+        ),
+        migrations.CreateModel(
+            name='AttemptAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('correct', models.BooleanField(verbose_name='Правильный')),
+                ('answer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempt_answers', to='knowledge_base.answer', verbose_name='Ответ')),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='knowledge_base.quizattempt', verbose_name='Попытка')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempt_answers', to='knowledge_base.question', verbose_name='Вопрос')),
+            ],
+            options={
+                'verbose_name': 'Ответ в попытке',
+                'verbose_name_plural': 'Ответы в попытках',
+            },
+        ),
+    ]
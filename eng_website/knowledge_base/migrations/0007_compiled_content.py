@@ -0,0 +1,24 @@
+# Generated by Django 4.1.1 on 2026-10-18 11:37
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0006_quiz_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='compiled_content',
+            field=models.TextField(blank=True, editable=False, verbose_name='Скомпилированное содержание'),
+        ),
+        migrations.AlterField(
+            model_name='article',
+            name='time_for_read',
+            field=models.PositiveIntegerField(default=1, editable=False, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
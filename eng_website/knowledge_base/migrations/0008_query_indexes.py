@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+from services.migration_operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # the indexes are built without locking the tables against writes, see services/migration_operations.py
+    atomic = False
+
+    dependencies = [
+        ('knowledge_base', '0007_compiled_content'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='category',
+            index=models.Index(fields=['parent', 'type'], name='kb_category_parent_type_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='article',
+            index=models.Index(fields=['category', 'parent'], name='kb_article_category_parent_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='article',
+            index=models.Index(fields=['updated_at', 'id'], name='kb_article_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='article',
+            index=models.Index(condition=models.Q(('compiled_content', '')), fields=['id'],
+                               name='kb_article_uncompiled_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='quiz',
+            index=models.Index(fields=['updated_at', 'id'], name='kb_quiz_updated_idx'),
+        ),
+    ]
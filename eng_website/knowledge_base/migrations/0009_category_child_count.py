@@ -0,0 +1,33 @@
+# Generated by Django 4.1.1 on 2026-10-18 11:56
+
+from django.db import migrations, models
+
+FILL_CHILD_COUNTS = [
+    """
+    UPDATE knowledge_base_category SET child_count = (
+        SELECT COUNT(*) FROM knowledge_base_quiz WHERE knowledge_base_quiz.category_id = knowledge_base_category.id
+    ) WHERE type = 'QUIZ';
+    """,
+    """
+    UPDATE knowledge_base_category SET child_count = (
+        SELECT COUNT(*) FROM knowledge_base_article
+        WHERE knowledge_base_article.category_id = knowledge_base_category.id
+    ) WHERE type <> 'QUIZ';
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='child_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Материалов'),
+        ),
+        migrations.RunSQL(FILL_CHILD_COUNTS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.1 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+# the urls of knowledge_base/urls.py at the time of this migration, later changes go through backfill_paths
+FILL_PATHS = [
+    """
+    UPDATE knowledge_base_article SET path = COALESCE((
+        SELECT CASE c.type
+            WHEN 'TPC' THEN '/topics/' || c.slug || '/' || knowledge_base_article.slug
+            WHEN 'PRSBK' THEN '/phrasebook/' || c.slug || '/' || knowledge_base_article.slug
+            WHEN 'ART' THEN '/articles/' || c.slug || '/' || knowledge_base_article.slug
+            WHEN 'HNDBK' THEN '/handbook/' || knowledge_base_article.slug || '/'
+            ELSE ''
+        END
+        FROM knowledge_base_category c WHERE c.id = knowledge_base_article.category_id
+    ), '');
+    """,
+    """
+    UPDATE knowledge_base_quiz SET path = COALESCE((
+        SELECT '/quizzes/' || c.slug || '/' || knowledge_base_quiz.slug
+        FROM knowledge_base_category c WHERE c.id = knowledge_base_quiz.category_id
+    ), '');
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0009_category_child_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Адрес'),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Адрес'),
+        ),
+        migrations.RunSQL(FILL_PATHS, migrations.RunSQL.noop),
+    ]
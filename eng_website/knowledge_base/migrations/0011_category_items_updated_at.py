@@ -0,0 +1,34 @@
+# Generated by Django 4.1.1 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+FILL_ITEMS_UPDATED_AT = [
+    """
+    UPDATE knowledge_base_category SET items_updated_at = (
+        SELECT MAX(updated_at) FROM knowledge_base_quiz
+        WHERE knowledge_base_quiz.category_id = knowledge_base_category.id
+    ) WHERE type = 'QUIZ';
+    """,
+    """
+    UPDATE knowledge_base_category SET items_updated_at = (
+        SELECT MAX(updated_at) FROM knowledge_base_article
+        WHERE knowledge_base_article.category_id = knowledge_base_category.id
+    ) WHERE type <> 'QUIZ';
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('knowledge_base', '0010_stored_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='items_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Материалы изменены'),
+        ),
+        migrations.RunSQL(FILL_ITEMS_UPDATED_AT, migrations.RunSQL.noop),
+    ]
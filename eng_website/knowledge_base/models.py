@@ -1,13 +1,23 @@
+import uuid
 from collections import defaultdict
-from random import shuffle, sample
+from datetime import timedelta
+from html import unescape
 
-from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.contrib.contenttypes.models import ContentType
+from django.core.validators import MinValueValidator
+from django.db import models, transaction, IntegrityError
 from ckeditor.fields import RichTextField
-from django.db.models import Prefetch, Count
+from django.db.models import Prefetch, F, Sum, prefetch_related_objects, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, TruncWeek, TruncMonth
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
 
 from services.db_tools import dict_fetch_all
+from services.thumbnails import thumbnail_url
+from .content_compiler import compile_content, reading_time
+from .sampling import article_ids, quiz_ids
+from .view_counter import view_counter
 
 
 class Category(models.Model):
@@ -24,6 +34,15 @@ class Category(models.Model):
         (HANDBOOK, 'Handbook'),
         (QUIZ, 'Quiz')
     ]
+    # url names of the article pages per category type, quizzes are at 'quiz' whatever their category
+    ARTICLE_URL_NAMES = {
+        TOPIC: 'topic',
+        PHRASEBOOK: 'phrase-article',
+        ARTICLE: 'article',
+        HANDBOOK: 'lesson',
+    }
+    # stands in for the row's slug when a category's paths are built, see detail_path_parts
+    PATH_MARKER = 'path-marker'
 
     proxy_type = None
 
@@ -40,10 +59,21 @@ class Category(models.Model):
     )
     image = models.ImageField(verbose_name='Превью картинка', upload_to='preview_images/categories/', null=True,
                               blank=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+    # rows listed under the category: quizzes for quiz categories, articles for the others. Kept exact by
+    # signals.update_child_counts, recomputed by the reconcile_child_counts command
+    child_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Материалов')
+    # when a row listed under the category last changed, its views included: the validator of the category's
+    # list pages, see touch_items
+    items_updated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Материалы изменены')
 
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
+        indexes = [
+            # the recursive walk of the handbook topics, see HandbookCategory.get_all_topics
+            models.Index(fields=['parent', 'type'], name='kb_category_parent_type_idx'),
+        ]
 
     def __str__(self):
         return f'{self.type}:{self.title}'
@@ -52,7 +82,56 @@ class Category(models.Model):
     def all_with_child_count(cls, type = None):
         if type is None:
             type = cls.proxy_type
-        return cls.objects.filter(type=type).annotate(child_count=models.Count('articles')).all()
+        return cls.objects.filter(type=type).all()
+
+    @classmethod
+    def update_child_counts(cls, ids=None):
+        # recounted from the rows rather than incremented, so concurrent saves can not drift the counters
+        categories = cls.objects.all() if ids is None else cls.objects.filter(pk__in=[id for id in ids if id])
+
+        def count_of(model):
+            counts = (model.objects.filter(category=OuterRef('pk')).order_by().values('category')
+                      .annotate(count=models.Count('id')).values('count'))
+            return Coalesce(Subquery(counts), 0)
+
+        categories.filter(type=cls.QUIZ).update(child_count=count_of(Quiz))
+        categories.exclude(type=cls.QUIZ).update(child_count=count_of(Article))
+
+    @classmethod
+    def touch_items(cls, ids):
+        # ids may be a values('category_id') queryset, rows without a category are skipped by the IN
+        cls.objects.filter(pk__in=ids).update(items_updated_at=timezone.now())
+
+    def detail_path_parts(self, model):
+        # (prefix, suffix) around a row's slug in the path of its page, None when rows of the model have no page
+        url_name = 'quiz' if model is Quiz else self.ARTICLE_URL_NAMES.get(self.type)
+        if url_name is None:
+            return None
+        kwargs = {'slug': self.PATH_MARKER} if url_name == 'lesson' else \
+            {'category_slug': self.slug, 'slug': self.PATH_MARKER}
+        prefix, _, suffix = reverse(url_name, kwargs=kwargs).rpartition(self.PATH_MARKER)
+        return prefix, suffix
+
+    def detail_path(self, model, slug):
+        parts = self.detail_path_parts(model)
+        return f'{parts[0]}{slug}{parts[1]}' if parts else ''
+
+    @classmethod
+    def update_paths(cls, ids=None):
+        # Rewrites the stored paths of the articles and quizzes under these categories (all when None) with
+        # one UPDATE per category and model, a slug or type change cascades to every row without loading it.
+        # Rows left without a category have no page. Returns the number of rows changed.
+        categories = Category.objects.all() if ids is None else Category.objects.filter(pk__in=[id for id in ids if id])
+        updated = 0
+        for category in categories.only('id', 'slug', 'type'):
+            for model in (Article, Quiz):
+                parts = category.detail_path_parts(model)
+                path = Concat(Value(parts[0]), F('slug'), Value(parts[1]), output_field=models.CharField()) \
+                    if parts else Value('')
+                updated += model.objects.filter(category=category).exclude(path=path).update(path=path)
+        for model in (Article, Quiz):
+            updated += model.objects.filter(category__isnull=True).exclude(path='').update(path='')
+        return updated
 
 
 class TopicCategory(Category):
@@ -141,11 +220,16 @@ class QuizCategory(Category):
         verbose_name_plural = 'Темы тестов'
         proxy = True
 
-    @classmethod
-    def all_with_child_count(cls, type= None):
-        if type is None:
-            type = cls.proxy_type
-        return cls.objects.filter(type=type).annotate(child_count=models.Count('quizzes')).all()
+
+def set_path(row, save_kwargs):
+    # the stored path of an article or quiz follows its slug and category
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and not {'slug', 'category', 'category_id'} & set(update_fields):
+        return
+    category = row.category
+    row.path = category.detail_path(row._meta.concrete_model, row.slug) if category else ''
+    if update_fields is not None:
+        save_kwargs['update_fields'] = {*update_fields, 'path'}
 
 
 class Article(models.Model):
@@ -155,20 +239,48 @@ class Article(models.Model):
     category = models.ForeignKey("Category", related_name='articles', null=True,
                                  blank=True, verbose_name="Категория", on_delete=models.SET_NULL)
     content = RichTextField()
+    # sanitized content with image attributes, see content_compiler; filled on save together with time_for_read
+    compiled_content = models.TextField(blank=True, editable=False, verbose_name='Скомпилированное содержание')
     slug = models.SlugField(unique=True, db_index=True)
     views = models.PositiveIntegerField(default=0, blank=True)
-    time_for_read = models.PositiveIntegerField(validators=[MinValueValidator(1), ])
+    time_for_read = models.PositiveIntegerField(default=1, editable=False, validators=[MinValueValidator(1), ])
 
     image = models.ImageField(verbose_name='Превью картинка', upload_to='preview_images/articles/', null=True,
                               blank=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+    # url of the page, set on save and by Category.update_paths: cards and breadcrumbs need no reverse()
+    path = models.CharField(max_length=255, blank=True, editable=False, verbose_name='Адрес')
 
     class Meta:
         verbose_name = "Статья"
         verbose_name_plural = "Статьи"
+        indexes = [
+            # keyset pagination of category pages, see views.KeysetPaginationMixin
+            models.Index(fields=['category', '-views', '-id'], name='kb_article_category_views_idx'),
+            # root lessons of the handbook topics, see Lesson.get_topic__lessons_map
+            models.Index(fields=['category', 'parent'], name='kb_article_category_parent_idx'),
+            # feeds (latest changes first) and the export since a date
+            models.Index(fields=['updated_at', 'id'], name='kb_article_updated_idx'),
+            # recompile_content --missing, only rows never compiled are in it
+            models.Index(fields=['id'], condition=models.Q(compiled_content=''), name='kb_article_uncompiled_idx'),
+        ]
 
     def __str__(self):
         return f'{self.category.type}_{self.category.title}:{self.title}'
 
+    def compile_content(self):
+        self.compiled_content, words = compile_content(self.content)
+        self.time_for_read = reading_time(words)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if 'content' not in self.get_deferred_fields() and (update_fields is None or 'content' in update_fields):
+            self.compile_content()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'compiled_content', 'time_for_read'}
+        set_path(self, kwargs)
+        super().save(*args, **kwargs)
+
     @classmethod
     def all_in_category(cls, slug):
         return cls.objects.filter(category__slug=slug).all()
@@ -176,17 +288,15 @@ class Article(models.Model):
     @classmethod
     def get_large_feed_data(cls):
         articles = []
-        for article in cls.objects.filter(category__type=Category.ARTICLE).order_by('-views')[:3]:
+        url_section = reverse('articles-categories')
+        queryset = cls.objects.filter(category__type=Category.ARTICLE).only('title', 'views', 'image', 'path')
+        for article in queryset.order_by('-views')[:3]:
             articles.append({
                 'title': article.title,
                 'views': article.views,
-                'img_url': article.image.url,
-                'url': reverse(f'article', kwargs={
-                    'category_slug': article.category.slug,
-                    'slug': article.slug,
-
-                }),
-                'url_section': reverse(f'articles-categories'),
+                'img_url': thumbnail_url(article.image, 1280),
+                'url': article.path,
+                'url_section': url_section,
             })
 
         return articles
@@ -198,23 +308,25 @@ class Article(models.Model):
             (Category.TOPIC, 'topics', 'topic'), (Category.ARTICLE, 'articles', 'article'),
             (Category.PHRASEBOOK, 'phrasebook', 'phrase-article')
         )
-        for type, section, url_name in type_section_url_name_pairs:
+        # the id index is grouped by type already, so the rows need no category
+        type_by_id = {}
+        for type, _, _ in type_section_url_name_pairs:
+            type_by_id.update((pk, type) for pk in article_ids.sample(type, count_for_section))
+
+        articles_by_type = defaultdict(list)
+        for article in cls.objects.filter(id__in=type_by_id).only('title', 'views', 'image', 'path'):
+            articles_by_type[type_by_id[article.id]].append(article)
+
+        for type, section, _ in type_section_url_name_pairs:
             articles = []
-            count_db = cls.objects.filter(category__type=type).aggregate(count=Count('id'))['count']
-            if count_for_section > count_db:
-                queryset = cls.objects.filter(category__type=type).all()
-            else:
-                queryset = cls.objects.filter(id__in=sample(range(1, count_db), count_for_section))
-            for article in queryset:
+            url_section = reverse(f'{section}-categories')
+            for article in articles_by_type[type]:
                 articles.append({
                     'title': article.title,
                     'views': article.views,
-                    'img_url': article.image.url,
-                    'url': reverse(f'{url_name}', kwargs={
-                        'category_slug': article.category.slug,
-                        'slug': article.slug,
-                    }),
-                    'url_section': reverse(f'{section}-categories'),
+                    'img_url': thumbnail_url(article.image, 640),
+                    'url': article.path,
+                    'url_section': url_section,
                 })
             materials_by_sections[section] = articles
 
@@ -254,10 +366,10 @@ class Lesson(Article):
                 ba.slug
             FROM 
                 knowledge_base_article ba
-
-            JOIN knowledge_base_category bc ON bc.id = ba.category_id
             WHERE
-                ba.parent_id IS NULL AND bc.type ='HNDBK'
+                ba.parent_id IS NULL
+                -- from the handbook topics, not from every root article, see kb_article_category_parent_idx
+                AND ba.category_id IN (SELECT id FROM knowledge_base_category WHERE type = 'HNDBK')
 
             UNION
                 SELECT 
@@ -293,16 +405,32 @@ class Quiz(models.Model):
 
     image = models.ImageField(verbose_name='Превью картинка', upload_to='preview_images/articles/', null=True,
                               blank=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Изменено')
+    # url of the page, see Article.path
+    path = models.CharField(max_length=255, blank=True, editable=False, verbose_name='Адрес')
 
     class Meta:
         verbose_name = 'Тест'
         verbose_name_plural = 'Тесты'
+        indexes = [
+            models.Index(fields=['category', '-views', '-id'], name='kb_quiz_category_views_idx'),
+            models.Index(fields=['updated_at', 'id'], name='kb_quiz_updated_idx'),
+        ]
 
     def __str__(self):
         return f'{self.category.title}:{self.title}'
 
+    def save(self, *args, **kwargs):
+        set_path(self, kwargs)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def touch(cls, **filters):
+        cls.objects.filter(**filters).update(updated_at=timezone.now())
+        Category.touch_items(cls.objects.filter(**filters).values('category_id'))
+
     def get_absolute_url(self):
-        return reverse('quiz', kwargs={'category_slug': self.category.slug, 'slug': self.slug})
+        return self.path
 
     @classmethod
     def all_in_category(cls, slug):
@@ -310,8 +438,13 @@ class Quiz(models.Model):
 
     @classmethod
     def get_quiz_article_data(cls, slug: str):
+        return cls.get_quiz_data(cls.objects.get(slug=slug))
+
+    @classmethod
+    def get_quiz_data(cls, article):
         prefetch_questions = Prefetch('questions',
-                                      queryset=Question.objects.prefetch_related('answers')
+                                      queryset=Question.objects.prefetch_related(
+                                          Prefetch('answers', queryset=Answer.objects.order_by('id')))
                                       .order_by('number'),
                                       to_attr='ordered_questions'
                                       )
@@ -319,10 +452,11 @@ class Quiz(models.Model):
                                     queryset=QuizResult.objects.order_by('min_value'),
                                     to_attr='ordered_results'
                                     )
-        article = cls.objects.prefetch_related(prefetch_questions, prefetch_results).get(slug=slug)
+        prefetch_related_objects([article], prefetch_questions, prefetch_results)
 
-        quiz_article_data = {'title': article.title,
-                             'img_url': article.image.url if article.image else None,
+        quiz_article_data = {'id': article.id,
+                             'title': article.title,
+                             'img_url': thumbnail_url(article.image, 640) or None,
                              'time_for_read': article.time_for_read,
                              'views': article.views,
                              'questions': [],
@@ -335,28 +469,22 @@ class Quiz(models.Model):
         return quiz_article_data
 
     @classmethod
-    def increase_views_by_one(cls, slug):
-        obj = cls.objects.get(slug=slug)
-        obj.views += 1
-        obj.save()
+    def increase_views_by_one(cls, pk):
+        view_counter.record(cls, pk)
 
     @classmethod
     def get_most_raited_materials(cls, count=4):
         articles = []
 
-        count_db = cls.objects.aggregate(count=Count('id'))['count']
-        if count > count_db:
-            queryset = cls.objects.all()
-        else:
-            queryset = cls.objects.filter(id__in=sample(range(1, count_db), count))
-
-        for article in queryset:
+        url_section = reverse('quizzes-categories')
+        queryset = cls.objects.filter(id__in=quiz_ids.sample(Category.QUIZ, count))
+        for article in queryset.only('title', 'views', 'image', 'path'):
             articles.append({
                 'title': article.title,
                 'views': article.views,
-                'img_url': article.image.url,
-                'url': article.get_absolute_url(),
-                'url_section': reverse(f'quizzes-categories'),
+                'img_url': thumbnail_url(article.image, 640),
+                'url': article.path,
+                'url_section': url_section,
             })
         return articles
 
@@ -365,6 +493,9 @@ class Question(models.Model):
     number = models.PositiveIntegerField(validators=[MinValueValidator(1), ], verbose_name='номер вопроса')
     content = models.TextField(verbose_name='Содержание')
     quiz = models.ForeignKey(Quiz, verbose_name='Тест', on_delete=models.CASCADE, related_name='questions')
+    # totals of graded attempts, increased in batches by the attempt log flush
+    answered = models.PositiveIntegerField(default=0, editable=False, verbose_name='Ответов')
+    answered_correctly = models.PositiveIntegerField(default=0, editable=False, verbose_name='Правильных ответов')
 
     class Meta:
         verbose_name = "Вопрос"
@@ -373,11 +504,14 @@ class Question(models.Model):
     def __str__(self):
         return f'{self.quiz.title}: {self.number} - {self.content}'
 
+    @property
+    def correct_rate(self):
+        return self.answered_correctly / self.answered if self.answered else None
+
     def get_question_data(self):
-        data = {'number': self.number, 'content': self.content, 'answers': []}
-        answers = list(self.answers.all())
-        shuffle(answers)
-        for answer in answers:
+        data = {'id': self.id, 'number': self.number, 'content': self.content, 'answers': []}
+        # stable order so the payload can be cached, the page shuffles the answers
+        for answer in self.answers.all():
             data['answers'].append(answer.get_answer_data())
 
         return data
@@ -396,7 +530,7 @@ class Answer(models.Model):
         return f'{self.question.content}: {self.content} - {self.correct}'
 
     def get_answer_data(self):
-        return {'content': self.content, 'correct': self.correct}
+        return {'id': self.id, 'content': self.content, 'correct': self.correct}
 
 
 class QuizResult(models.Model):
@@ -414,3 +548,200 @@ class QuizResult(models.Model):
 
     def get_data(self):
         return {'content': self.content, 'min_value': self.min_value, 'max_value': self.max_value}
+
+
+class QuizAttempt(models.Model):
+    # the id is generated in python so attempts and their answers can be bulk inserted together
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    quiz = models.ForeignKey(Quiz, verbose_name='Тест', on_delete=models.CASCADE, related_name='attempts')
+    score = models.PositiveIntegerField(verbose_name='Правильных ответов')
+    total = models.PositiveIntegerField(verbose_name='Вопросов')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Пройден')
+
+    class Meta:
+        verbose_name = 'Попытка'
+        verbose_name_plural = 'Попытки'
+
+    def __str__(self):
+        return f'{self.quiz_id}: {self.score}/{self.total}'
+
+
+class AttemptAnswer(models.Model):
+    attempt = models.ForeignKey(QuizAttempt, verbose_name='Попытка', on_delete=models.CASCADE, related_name='answers')
+    question = models.ForeignKey(Question, verbose_name='Вопрос', on_delete=models.CASCADE,
+                                 related_name='attempt_answers')
+    answer = models.ForeignKey(Answer, verbose_name='Ответ', on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='attempt_answers')
+    correct = models.BooleanField(verbose_name='Правильный')
+
+    class Meta:
+        verbose_name = 'Ответ в попытке'
+        verbose_name_plural = 'Ответы в попытках'
+
+
+class ViewStat(models.Model):
+    DAY = 'D'
+    WEEK = 'W'
+    MONTH = 'M'
+
+    PERIOD_CHOICES = [
+        (DAY, 'День'),
+        (WEEK, 'Неделя'),
+        (MONTH, 'Месяц'),
+    ]
+
+    content_type = models.ForeignKey(ContentType, verbose_name='Тип материала', on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField(verbose_name='ID материала')
+    section = models.CharField(max_length=10, choices=Category.TYPE_CHOICES, blank=True, verbose_name='Раздел')
+    period = models.CharField(max_length=1, choices=PERIOD_CHOICES, default=DAY, verbose_name='Период')
+    day = models.DateField(verbose_name='Начало периода')
+    hits = models.PositiveIntegerField(default=0, verbose_name='Просмотры')
+
+    class Meta:
+        verbose_name = 'Статистика просмотров'
+        verbose_name_plural = 'Статистика просмотров'
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'day', 'content_type', 'object_id'],
+                                    name='knowledge_base_viewstat_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f'{self.section}:{self.object_id} {self.period} {self.day} - {self.hits}'
+
+    @classmethod
+    def add_daily_hits(cls, hits):
+        pks_by_model = defaultdict(set)
+        for model, pk, _ in hits:
+            pks_by_model[model].add(pk)
+
+        content_types = ContentType.objects.get_for_models(*pks_by_model)
+        sections = {}
+        for model, pks in pks_by_model.items():
+            for pk, section in model.objects.filter(pk__in=pks).values_list('pk', 'category__type'):
+                sections[(model, pk)] = section or ''
+
+        buckets = {}
+        for (model, pk, day), count in hits.items():
+            if (model, pk) in sections:
+                buckets[(content_types[model].id, pk, day)] = (sections[(model, pk)], count)
+        cls._add_hits(cls.DAY, buckets)
+
+    @classmethod
+    def _add_hits(cls, period, buckets):
+        if not buckets:
+            return
+
+        existing = cls.objects.filter(
+            period=period,
+            day__in={day for _, _, day in buckets},
+            content_type_id__in={content_type_id for content_type_id, _, _ in buckets},
+            object_id__in={object_id for _, object_id, _ in buckets},
+        ).values_list('content_type_id', 'object_id', 'day', 'id')
+        existing_ids = {(content_type_id, object_id, day): id for content_type_id, object_id, day, id in existing}
+
+        ids_by_count = defaultdict(list)
+        new_stats = []
+        for key, (section, count) in buckets.items():
+            if key in existing_ids:
+                ids_by_count[count].append(existing_ids[key])
+            else:
+                content_type_id, object_id, day = key
+                new_stats.append(cls(content_type_id=content_type_id, object_id=object_id, section=section,
+                                     period=period, day=day, hits=count))
+
+        for count, ids in ids_by_count.items():
+            cls.objects.filter(id__in=ids).update(hits=F('hits') + count)
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(new_stats)
+        except IntegrityError:
+            # another worker created some of the buckets since we looked, add to them one by one
+            for stat in new_stats:
+                updated = cls.objects.filter(period=period, day=stat.day, content_type_id=stat.content_type_id,
+                                             object_id=stat.object_id).update(hits=F('hits') + stat.hits)
+                if not updated:
+                    stat.save()
+
+    @classmethod
+    def compact(cls, period, before):
+        if period == cls.WEEK:
+            source_period, trunc = cls.DAY, TruncWeek('day')
+        elif period == cls.MONTH:
+            source_period, trunc = cls.WEEK, TruncMonth('day')
+        else:
+            raise ValueError(f'Can not compact into period {period}')
+
+        with transaction.atomic():
+            source = cls.objects.filter(period=source_period, day__lt=before)
+            buckets = {}
+            for row in (source.values('content_type_id', 'object_id', 'section', bucket=trunc)
+                        .annotate(total=Sum('hits')).order_by()):
+                key = (row['content_type_id'], row['object_id'], row['bucket'])
+                section, count = buckets.get(key, (row['section'], 0))
+                buckets[key] = (section, count + row['total'])
+            cls._add_hits(period, buckets)
+            source.delete()
+
+        return len(buckets)
+
+    @staticmethod
+    def get_top_by_sections(top=10, days=7):
+        sql = """
+            SELECT 
+                section, object_id, content_type_id, title, hits, position
+            FROM (
+                SELECT
+                    vs.section,
+                    vs.object_id,
+                    vs.content_type_id,
+                    COALESCE(ba.title, bq.title) AS title,
+                    SUM(vs.hits) AS hits,
+                    ROW_NUMBER() OVER (PARTITION BY vs.section ORDER BY SUM(vs.hits) DESC) AS position
+                FROM
+                    knowledge_base_viewstat vs
+                LEFT JOIN knowledge_base_article ba ON vs.content_type_id = %s AND ba.id = vs.object_id
+                LEFT JOIN knowledge_base_quiz bq ON vs.content_type_id = %s AND bq.id = vs.object_id
+                WHERE
+                    vs.period = %s AND vs.day >= %s
+                GROUP BY
+                    vs.section, vs.object_id, vs.content_type_id, ba.title, bq.title
+            ) ranked
+            WHERE
+                position <= %s
+            ORDER BY
+                section, position;
+        """
+        content_types = ContentType.objects.get_for_models(Article, Quiz)
+        since = timezone.localdate() - timedelta(days=days - 1)
+        params = [content_types[Article].id, content_types[Quiz].id, ViewStat.DAY, since, top]
+
+        top_by_sections = defaultdict(list)
+        for row in dict_fetch_all(sql, params):
+            top_by_sections[row['section']].append(row)
+
+        return top_by_sections
+
+
+class SearchDocument(models.Model):
+    article = models.OneToOneField(Article, verbose_name='Статья', on_delete=models.CASCADE,
+                                   related_name='search_document')
+    title = models.TextField(verbose_name='Название')
+    body = models.TextField(verbose_name='Текст без разметки')
+
+    class Meta:
+        verbose_name = 'Поисковый документ'
+        verbose_name_plural = 'Поисковые документы'
+
+    def __str__(self):
+        return self.title
+
+    @staticmethod
+    def html_to_text(content):
+        return ' '.join(unescape(strip_tags(content)).split())
+
+    @classmethod
+    def update_for(cls, article):
+        cls.objects.update_or_create(article_id=article.pk, defaults={
+            'title': article.title,
+            'body': cls.html_to_text(article.content),
+        })
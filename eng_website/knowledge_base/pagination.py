@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != size or not all(isinstance(value, int) for value in values):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def after(ordering, values):
+    # rows strictly after values in ordering, e.g. ('-views', '-id') gives
+    # views <= v AND (views < v OR (views = v AND id < i)); the leading bound keeps it an index range scan
+    fields = [(field.lstrip('-'), 'lt' if field.startswith('-') else 'gt') for field in ordering]
+    condition = Q()
+    equal = Q()
+    for (field, lookup), value in zip(fields, values):
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    first_field, first_lookup = fields[0]
+    return Q(**{f'{first_field}__{first_lookup}e': values[0]}) & condition
+
+
+def cursor_for(obj, ordering):
+    return encode_cursor([getattr(obj, field.lstrip('-')) for field in ordering])
+
+
+def keyset_page(queryset, ordering, cursor=None, size=24):
+    # Returns (items, next cursor or None). The last field of ordering has to be unique; size None is one page.
+    items = list(page_queryset(queryset, ordering, cursor, size))
+    return split_page(items, ordering, size)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, size=24):
+    items = [item async for item in page_queryset(queryset, ordering, cursor, size)]
+    return split_page(items, ordering, size)
+
+
+def page_queryset(queryset, ordering, cursor, size):
+    if cursor:
+        queryset = queryset.filter(after(ordering, decode_cursor(cursor, len(ordering))))
+    queryset = queryset.order_by(*ordering)
+    return queryset if size is None else queryset[:size + 1]
+
+
+def split_page(items, ordering, size):
+    if size is None or len(items) <= size:
+        return items, None
+    items = items[:size]
+    return items, cursor_for(items[-1], ordering)
@@ -0,0 +1,58 @@
+import json
+import re
+from collections import Counter
+from pathlib import Path
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+QUERY_BUDGETS_PATH = Path(__file__).resolve().parent / 'query_budgets.json'
+
+STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+VALUES_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def query_shape(sql):
+    # the same statement with different parameters maps to the same shape
+    sql = STRING_LITERAL_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = VALUES_LIST_RE.sub('(?)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def repeated_shapes(queries):
+    shapes = Counter(query_shape(query['sql']) for query in queries)
+    return {shape: count for shape, count in shapes.items() if count > 1}
+
+
+class QueryAudit(CaptureQueriesContext):
+    def __init__(self, connection=connection):
+        super().__init__(connection)
+
+    @property
+    def count(self):
+        return len(self.captured_queries)
+
+    @property
+    def repeated(self):
+        return repeated_shapes(self.captured_queries)
+
+    def report(self):
+        lines = [f'{self.count} queries']
+        for shape, count in sorted(self.repeated.items(), key=lambda item: -item[1]):
+            lines.append(f'  repeated {count}x: {shape}')
+        return '\n'.join(lines)
+
+
+def load_query_budgets(path=QUERY_BUDGETS_PATH):
+    with open(path) as budgets_file:
+        return json.load(budgets_file)
+
+
+def save_query_budgets(budgets, path=QUERY_BUDGETS_PATH):
+    with open(path, 'w') as budgets_file:
+        json.dump(budgets, budgets_file, indent=4, sort_keys=True)
+        budgets_file.write('\n')
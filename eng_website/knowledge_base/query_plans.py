@@ -0,0 +1,173 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from .benchmarks import default_scenarios
+from .query_audit import query_shape
+
+QUERY_PLANS_PATH = Path(__file__).resolve().parent / 'query_plans.json'
+
+# a plan may cost this much more than its baseline before it counts as a regression
+COST_TOLERANCE = 1.25
+# tables that stay small whatever the content size, a full read of them is cheaper than an index
+SMALL_TABLES = ('knowledge_base_category', 'django_content_type')
+# pages that read every row of a table on purpose, once per content change; they are cached in between.
+# Statements without a WHERE (the id indexes of sampling.py) read every row by definition and are not checked.
+FULL_READ_SCENARIOS = ('sitemap',)
+
+SQLITE_STEP_RE = re.compile(r'^(SCAN|SEARCH) (\w+)(?: VIRTUAL TABLE INDEX \d+:(\S*))?'
+                            r'(?: USING (?:COVERING )?INDEX (\w+))?')
+WHERE_RE = re.compile(r'\bWHERE\b', re.IGNORECASE)
+
+
+class CapturedQueries:
+    # the statements and their parameters as sent to the driver, EXPLAIN needs both
+    def __init__(self, connection=connection):
+        self.connection = connection
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many:
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = self.connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+
+def explain_sqlite(cursor, sql, params):
+    # sqlite has no costs: the plan is the list of its steps
+    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+    steps, scans, indexes = [], set(), set()
+    for _, _, _, detail in cursor.fetchall():
+        steps.append(detail)
+        step = SQLITE_STEP_RE.match(detail)
+        if step is None:
+            continue
+        kind, table, virtual_constraints, index = step.groups()
+        if index:
+            indexes.add(index)
+        # a SCAN walks the whole table or index, unless it is a full text table searched by a MATCH
+        if kind == 'SCAN' and not virtual_constraints:
+            scans.add(table)
+    return {'cost': None, 'steps': steps, 'scans': scans, 'indexes': indexes}
+
+
+def postgresql_plan(cursor, sql, params):
+    cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    root = plan[0]['Plan']
+    nodes, stack = [], [root]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.get('Plans', ()))
+    return root, nodes
+
+
+def explain_postgresql(cursor, sql, params):
+    # the planner rightly reads a table of a few pages sequentially, which says nothing about the production
+    # sized one; the scans are taken from a second plan with seq scans discouraged, so only a missing index shows
+    root, nodes = postgresql_plan(cursor, sql, params)
+    steps, indexes = [], set()
+    for node in nodes:
+        relation, index = node.get('Relation Name'), node.get('Index Name')
+        steps.append(' '.join(part for part in (node['Node Type'], relation, index) if part))
+        if index:
+            indexes.add(index)
+    cursor.execute('SET enable_seqscan = off')
+    try:
+        _, forced_nodes = postgresql_plan(cursor, sql, params)
+    finally:
+        cursor.execute('RESET enable_seqscan')
+    scans = {node.get('Relation Name') for node in forced_nodes if node['Node Type'] == 'Seq Scan'}
+    return {'cost': root['Total Cost'], 'steps': steps, 'scans': scans, 'indexes': indexes}
+
+
+def explain(sql, params, connection=connection):
+    explain_plan = explain_postgresql if connection.vendor == 'postgresql' else explain_sqlite
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        plan = explain_plan(cursor, sql, params)
+    # scans of CTEs and subqueries are not table reads
+    plan['scans'] = sorted(plan['scans'] & tables)
+    plan['indexes'] = sorted(plan['indexes'])
+    return plan
+
+
+def query_key(scenario, sql):
+    return f'{scenario}:{hashlib.sha1(query_shape(sql).encode()).hexdigest()[:10]}'
+
+
+def plan_scenarios():
+    # the benchmark pages plus the crawler endpoints
+    scenarios = default_scenarios()
+    scenarios['sitemap'] = (reverse('sitemap'), {})
+    scenarios['sitemap-shard'] = (reverse('sitemap-shard', kwargs={'section': 'articles', 'shard': 0}), {})
+    scenarios['feed'] = (reverse('feed-rss', kwargs={'section': 'articles'}), {})
+    return scenarios
+
+
+def collect_plans(scenarios, host='localhost'):
+    # {scenario:shape hash: plan} of every SELECT the pages run with cold caches
+    client = Client(HTTP_HOST=host)
+    plans = {}
+    for name, (path, params) in scenarios.items():
+        cache.clear()
+        with CapturedQueries() as captured:
+            response = client.get(path, params)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        for sql, query_params in captured.queries:
+            if sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                plans.setdefault(query_key(name, sql), {'sql': query_shape(sql), **explain(sql, query_params)})
+    return plans
+
+
+def check_plan(key, plan, baselines):
+    # problems of one plan, baselines are the recorded plans of this database or None when there are none yet
+    scenario = key.split(':')[0]
+    problems = []
+    if scenario not in FULL_READ_SCENARIOS and WHERE_RE.search(plan['sql']):
+        scans = [table for table in plan['scans'] if table not in SMALL_TABLES]
+        if scans:
+            problems.append(f'{key} reads {", ".join(scans)} sequentially: {plan["sql"]}')
+    if baselines is None:
+        return problems
+    baseline = baselines.get(key)
+    if baseline is None:
+        problems.append(f'{key} has no recorded plan: {plan["sql"]}')
+    elif plan['cost'] is not None and plan['cost'] > (baseline['cost'] or 0) * COST_TOLERANCE:
+        problems.append(f'{key} costs {plan["cost"]}, recorded {baseline["cost"]}: {plan["sql"]}')
+    elif plan['cost'] is None and not set(baseline['indexes']) <= set(plan['indexes']):
+        # without costs, an index the plan no longer uses is the regression
+        lost = sorted(set(baseline['indexes']) - set(plan['indexes']))
+        problems.append(f'{key} no longer uses {", ".join(lost)}: {plan["sql"]}')
+    return problems
+
+
+def load_query_plans(path=QUERY_PLANS_PATH):
+    # {database vendor: {query key: plan}}
+    with open(path) as plans_file:
+        return json.load(plans_file)
+
+
+def save_query_plans(vendor, plans, path=QUERY_PLANS_PATH):
+    recorded = load_query_plans(path) if path.exists() else {}
+    recorded[vendor] = plans
+    with open(path, 'w') as plans_file:
+        json.dump(recorded, plans_file, indent=4, sort_keys=True, ensure_ascii=False)
+        plans_file.write('\n')
@@ -0,0 +1,105 @@
+from bisect import bisect_right
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.html import json_script
+
+from services.db_router import primary
+
+
+class QuizPayloads:
+    # Compiled quiz pages in the cache: questions are serialized into their <script> tag once, next to the
+    # answer key and sorted result ranges used for grading, so serving or grading a hot quiz reads one cache
+    # key and runs no queries. Answers keep a stable order,
+    # the page shuffles them with a per-response seed (see static/js/quiz.js).
+    # Question, answer, result and quiz saves drop the payload; views shown on the page are at most
+    # QUIZ_PAYLOAD_MAX_AGE seconds old.
+    key_prefix = 'knowledge_base:quiz-payload:'
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'QUIZ_PAYLOAD_MAX_AGE', 60)
+
+    def key(self, slug):
+        return f'{self.key_prefix}{slug}'
+
+    def compile(self, slug):
+        from .models import Quiz
+
+        # cached until the next change, so the read that follows a save must already see it
+        with primary():
+            quiz = Quiz.objects.filter(slug=slug).first()
+            if quiz is None:
+                return None
+            payload = Quiz.get_quiz_data(quiz)
+        questions, results = payload.pop('questions'), payload.pop('results')
+        # the browser only gets ids and texts, answers are graded against answer_key on submit
+        public_questions = [
+            {**question, 'answers': [{'id': answer['id'], 'content': answer['content']}
+                                     for answer in question['answers']]}
+            for question in questions
+        ]
+        payload.update({
+            'slug': quiz.slug,
+            'path': quiz.path,
+            'category_id': quiz.category_id,
+            'updated_at': quiz.updated_at,
+            'questions_script': json_script(public_questions, 'quiz_questions'),
+            'answer_key': {question['id']: {answer['id']: answer['correct'] for answer in question['answers']}
+                           for question in questions},
+            # sorted by min_value (see get_quiz_data) for the bisect in result_for
+            'results': results,
+            'result_mins': [result['min_value'] for result in results],
+        })
+        return payload
+
+    def get(self, slug):
+        payload = cache.get(self.key(slug))
+        if payload is None:
+            payload = self.compile(slug)
+            if payload is not None:
+                cache.set(self.key(slug), payload, self.max_age)
+        return payload
+
+    async def aget(self, slug):
+        payload = await cache.aget(self.key(slug))
+        if payload is None:
+            # a dozen queries with prefetches, run together in one trip to the ORM thread
+            payload = await sync_to_async(self.compile)(slug)
+            if payload is not None:
+                await cache.aset(self.key(slug), payload, self.max_age)
+        return payload
+
+    def invalidate(self, *slugs):
+        # now for reads inside this transaction, after commit for payloads other workers compiled meanwhile
+        keys = [self.key(slug) for slug in slugs]
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    def invalidate_where(self, **filters):
+        from .models import Quiz
+
+        self.invalidate(*Quiz.objects.filter(**filters).values_list('slug', flat=True))
+
+
+def result_for(payload, score):
+    # the last range starting at or below the score, if the score is not past its end
+    index = bisect_right(payload['result_mins'], score) - 1
+    if index >= 0 and score <= payload['results'][index]['max_value']:
+        return payload['results'][index]
+
+
+def grade(payload, choices):
+    # choices maps question id -> chosen answer id; returns (score, [(question id, answer id, correct)])
+    # for the questions of the quiz that were answered, skipped ones do not count towards their statistics
+    graded = []
+    for question_id, answer_id in choices.items():
+        answers = payload['answer_key'].get(question_id)
+        if answers is not None:
+            graded.append((question_id, answer_id if answer_id in answers else None, answers.get(answer_id, False)))
+    return sum(correct for _, _, correct in graded), graded
+
+
+quiz_payloads = QuizPayloads()
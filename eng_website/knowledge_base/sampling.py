@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class IdIndex:
+    # Ids grouped by key (the category type) in plain lists with an id -> (key, position) map,
+    # so adding, moving and removing an id are O(1) and sampling n ids is O(n).
+    # The version in the cache lets other processes notice changes they did not get a signal for,
+    # and the ids are read again after ID_INDEX_MAX_AGE seconds in case a version bump was lost.
+
+    def __init__(self, name, load):
+        self.version_key = f'knowledge_base:id-index:{name}'
+        self._load = load
+        self._lock = threading.RLock()
+        self._ids = None
+        self._positions = {}
+        self._version = None
+        self._loaded_at = None
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'ID_INDEX_MAX_AGE', 300)
+
+    def _expired(self):
+        max_age = self.max_age
+        return max_age is not None and time.monotonic() - self._loaded_at > max_age
+
+    def _ensure_loaded(self):
+        version = cache.get(self.version_key, 0)
+        if self._ids is not None and version == self._version and not self._expired():
+            return
+
+        self._ids, self._positions = {}, {}
+        for pk, key in self._load():
+            self._append(pk, key)
+        self._version = version
+        self._loaded_at = time.monotonic()
+
+    def _append(self, pk, key):
+        ids = self._ids.setdefault(key, [])
+        self._positions[pk] = (key, len(ids))
+        ids.append(pk)
+
+    def _pop(self, pk):
+        key, position = self._positions.pop(pk)
+        ids = self._ids[key]
+        last = ids.pop()
+        if last != pk:
+            ids[position] = last
+            self._positions[last] = (key, position)
+
+    def _changed(self, apply):
+        with self._lock:
+            cache.add(self.version_key, 0, None)
+            version = cache.incr(self.version_key)
+            # the ids are still current when no other process bumped the version in between
+            if self._ids is not None and version == self._version + 1:
+                apply()
+            else:
+                self._ids = None
+            self._version = version
+
+    def add(self, pk, key):
+        def apply():
+            if pk in self._positions:
+                self._pop(pk)
+            self._append(pk, key)
+
+        self._changed(apply)
+
+    def remove(self, pk):
+        def apply():
+            if pk in self._positions:
+                self._pop(pk)
+
+        self._changed(apply)
+
+    def invalidate(self):
+        self._changed(lambda: None)
+        with self._lock:
+            self._ids = None
+
+    def load(self):
+        # number of ids, read now instead of by the first sample
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._positions)
+
+    def sample(self, key, n):
+        with self._lock:
+            self._ensure_loaded()
+            ids = self._ids.get(key, [])
+            return random.sample(ids, min(n, len(ids)))
+
+
+def load_article_ids():
+    from .models import Article
+
+    return Article.objects.values_list('id', 'category__type').iterator()
+
+
+def load_quiz_ids():
+    # all under one key: quizzes are sampled whatever their category, like the homepage always showed them
+    from .models import Category, Quiz
+
+    return ((pk, Category.QUIZ) for pk in Quiz.objects.values_list('id', flat=True).iterator())
+
+
+article_ids = IdIndex('articles', load_article_ids)
+quiz_ids = IdIndex('quizzes', load_quiz_ids)
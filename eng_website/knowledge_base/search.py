@@ -0,0 +1,142 @@
+import re
+
+from django.db import connection
+from django.utils.html import escape
+
+from services.db_tools import dict_fetch_all
+
+# highlight markers that can't appear in stripped text, replaced by <mark> after escaping
+SELECTION_START = '\x02'
+SELECTION_STOP = '\x03'
+
+
+class PostgresSearchBackend:
+    # search_vector is a generated tsvector column with a GIN index, see migration 0003
+    query_cte = """
+        WITH q AS (
+            SELECT websearch_to_tsquery('russian', %s) || websearch_to_tsquery('english', %s) AS query
+        )
+    """
+
+    def count(self, text):
+        sql = f"""
+            {self.query_cte}
+            SELECT
+                COUNT(*) AS total
+            FROM
+                knowledge_base_searchdocument sd, q
+            WHERE
+                sd.search_vector @@ q.query;
+        """
+        return dict_fetch_all(sql, [text, text])[0]['total']
+
+    def search(self, text, offset, limit):
+        sql = f"""
+            {self.query_cte}
+            SELECT
+                sd.article_id,
+                ts_headline('russian', sd.title, q.query, %s) AS title,
+                ts_headline('russian', sd.body, q.query, %s) AS snippet,
+                ts_rank_cd(sd.search_vector, q.query) AS rank,
+                ba.path
+            FROM
+                knowledge_base_searchdocument sd
+            CROSS JOIN q
+            JOIN knowledge_base_article ba ON ba.id = sd.article_id
+            WHERE
+                sd.search_vector @@ q.query
+            ORDER BY
+                rank DESC, sd.article_id
+            LIMIT %s OFFSET %s;
+        """
+        selection = f'StartSel={SELECTION_START}, StopSel={SELECTION_STOP}'
+        title_options = f'{selection}, HighlightAll=true'
+        snippet_options = f'{selection}, MaxFragments=2, MaxWords=30, MinWords=10'
+        return dict_fetch_all(sql, [text, text, title_options, snippet_options, limit, offset])
+
+
+class SqliteSearchBackend:
+    # FTS5 external content table kept in sync by triggers, see migration 0003
+
+    @staticmethod
+    def match_expression(text):
+        terms = re.findall(r'\w+', text)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def count(self, text):
+        match = self.match_expression(text)
+        if not match:
+            return 0
+        sql = """
+            SELECT
+                COUNT(*) AS total
+            FROM
+                knowledge_base_searchdocument_fts
+            WHERE
+                knowledge_base_searchdocument_fts MATCH %s;
+        """
+        return dict_fetch_all(sql, [match])[0]['total']
+
+    def search(self, text, offset, limit):
+        match = self.match_expression(text)
+        if not match:
+            return []
+        sql = """
+            SELECT
+                sd.article_id,
+                highlight(knowledge_base_searchdocument_fts, 0, %s, %s) AS title,
+                snippet(knowledge_base_searchdocument_fts, 1, %s, %s, '…', 30) AS snippet,
+                bm25(knowledge_base_searchdocument_fts, 10.0, 1.0) AS rank,
+                ba.path
+            FROM
+                knowledge_base_searchdocument_fts
+            JOIN knowledge_base_searchdocument sd ON sd.id = knowledge_base_searchdocument_fts.rowid
+            JOIN knowledge_base_article ba ON ba.id = sd.article_id
+            WHERE
+                knowledge_base_searchdocument_fts MATCH %s
+            ORDER BY
+                rank, sd.article_id
+            LIMIT %s OFFSET %s;
+        """
+        markers = [SELECTION_START, SELECTION_STOP]
+        return dict_fetch_all(sql, [*markers, *markers, match, limit, offset])
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return SqliteSearchBackend()
+
+
+def highlight(text):
+    return escape(text).replace(SELECTION_START, '<mark>').replace(SELECTION_STOP, '</mark>')
+
+
+class SearchResults:
+    # lazy sequence for Paginator: count() and one slice cost one query each
+    def __init__(self, text):
+        self.text = text
+        self.backend = get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.text) if self.text else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError('SearchResults only supports slicing')
+        if not self.text:
+            return []
+        offset = item.start or 0
+        rows = self.backend.search(self.text, offset, item.stop - offset)
+        for row in rows:
+            row['title'] = highlight(row['title'])
+            row['snippet'] = highlight(row['snippet'])
+            # the stored path of the article, empty for rows without a page
+            row['url'] = row.pop('path') or None
+        return rows
@@ -0,0 +1,161 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from services import thumbnails
+from .identity_map import category_resolver
+from .models import Category, Article, Quiz, Question, Answer, QuizResult, SearchDocument
+from .quiz_payloads import quiz_payloads
+from .sampling import article_ids, quiz_ids
+from .sitemaps import sitemaps
+from .snapshots import homepage_snapshot
+
+HOMEPAGE_MODELS = (Category, Article, Quiz)
+
+
+def is_one_of(sender, models):
+    # proxy models (Topic, Lesson, QuizCategory...) send signals with themselves as the sender
+    return sender._meta.concrete_model in models
+
+
+def id_index_for(sender):
+    if is_one_of(sender, (Article,)):
+        return article_ids
+    if is_one_of(sender, (Quiz,)):
+        return quiz_ids
+
+
+def id_key_for(id_index, instance):
+    # the keys of sampling.load_article_ids and load_quiz_ids
+    if id_index is quiz_ids:
+        return Category.QUIZ
+    return instance.category.type if instance.category_id else None
+
+
+@receiver(post_save)
+def add_to_id_index(sender, instance, **kwargs):
+    id_index = id_index_for(sender)
+    if id_index is not None:
+        pk, key = instance.pk, id_key_for(id_index, instance)
+        transaction.on_commit(lambda: id_index.add(pk, key))
+
+
+@receiver(post_delete)
+def remove_from_id_index(sender, instance, **kwargs):
+    id_index = id_index_for(sender)
+    if id_index is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: id_index.remove(pk))
+
+
+@receiver(pre_save)
+def remember_category(sender, instance, update_fields=None, **kwargs):
+    # the category a row is moved away from needs its counter updated as well
+    if is_one_of(sender, (Article, Quiz)) and instance.pk is not None and \
+            (update_fields is None or 'category' in update_fields):
+        instance._previous_category_id = (sender._base_manager.filter(pk=instance.pk)
+                                          .values_list('category_id', flat=True).first())
+
+
+@receiver(pre_save)
+def remember_quiz_slug(sender, instance, update_fields=None, **kwargs):
+    # the payload cached under the slug a quiz is renamed from has to be dropped as well
+    if is_one_of(sender, (Quiz,)) and instance.pk is not None and (update_fields is None or 'slug' in update_fields):
+        instance._previous_slug = sender._base_manager.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def update_child_counts(sender, instance, signal, created=False, **kwargs):
+    # in the same transaction as the change; a deleted category's rows are SET_NULL and it has no counter left
+    if is_one_of(sender, (Article, Quiz)):
+        previous = instance.__dict__.pop('_previous_category_id', instance.category_id)
+        if signal is post_delete or created or previous != instance.category_id:
+            Category.update_child_counts({previous, instance.category_id})
+        # any change shows on the list pages of the category
+        Category.touch_items({previous, instance.category_id})
+    elif is_one_of(sender, (Category,)) and signal is post_save:
+        # the type decides whether articles or quizzes are counted
+        Category.update_child_counts([instance.pk])
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_id_indexes(sender, **kwargs):
+    # category type changes and SET_NULL on delete move many articles at once, quizzes are keyed on neither
+    if is_one_of(sender, (Category,)):
+        transaction.on_commit(article_ids.invalidate)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_category_resolver(sender, **kwargs):
+    if is_one_of(sender, (Category,)):
+        transaction.on_commit(category_resolver.invalidate)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def update_paths(sender, instance, signal, **kwargs):
+    # a renamed or retyped category moves the pages of its rows, a deleted one leaves its rows without a page
+    if is_one_of(sender, (Category,)):
+        if signal is post_delete:
+            if Category.update_paths([]):
+                quiz_payloads.invalidate_where(category__isnull=True)
+        elif Category.update_paths([instance.pk]):
+            quiz_payloads.invalidate_where(category=instance.pk)
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+@receiver(post_save, sender=QuizResult)
+@receiver(post_delete, sender=QuizResult)
+def touch_quiz(sender, instance, **kwargs):
+    Quiz.touch(pk=instance.quiz_id)
+    quiz_payloads.invalidate_where(pk=instance.quiz_id)
+    sitemaps.schedule_invalidate()
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def touch_quiz_of_answer(sender, instance, **kwargs):
+    Quiz.touch(questions=instance.question_id)
+    quiz_payloads.invalidate_where(questions=instance.question_id)
+    sitemaps.schedule_invalidate()
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_quiz_payload(sender, instance, **kwargs):
+    if is_one_of(sender, (Quiz,)):
+        previous = instance.__dict__.pop('_previous_slug', None)
+        quiz_payloads.invalidate(*{instance.slug, previous} - {None})
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_sitemaps(sender, **kwargs):
+    # the rows, urls and lastmods listed in the sitemaps and feeds
+    if is_one_of(sender, HOMEPAGE_MODELS):
+        sitemaps.schedule_invalidate()
+
+
+@receiver(post_save)
+def generate_thumbnails(sender, instance, **kwargs):
+    # runs before the homepage rebuild below, so the snapshot already links the thumbnails
+    if is_one_of(sender, HOMEPAGE_MODELS) and instance.image:
+        name = instance.image.name
+        transaction.on_commit(lambda: thumbnails.ensure(name))
+
+
+@receiver(post_save)
+def update_search_document(sender, instance, **kwargs):
+    if is_one_of(sender, (Article,)):
+        SearchDocument.update_for(instance)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def rebuild_homepage_snapshot(sender, **kwargs):
+    if is_one_of(sender, HOMEPAGE_MODELS):
+        homepage_snapshot.schedule_rebuild()
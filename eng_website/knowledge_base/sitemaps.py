@@ -0,0 +1,192 @@
+import time
+from datetime import timezone
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.urls import reverse
+
+from .models import Category, Article, Quiz
+
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+CHUNK_SIZE = 1000
+
+
+def site_url(request):
+    # sitemaps and feeds are cached per site url, which is only safe while ALLOWED_HOSTS lists the real hosts:
+    # with a wildcard every Host header a client makes up would get its own cache entry
+    return f'{request.scheme}://{request.get_host()}'
+
+
+def w3c_datetime(value):
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+
+
+def url_entry(location, lastmod):
+    lastmod = f'<lastmod>{w3c_datetime(lastmod)}</lastmod>' if lastmod else ''
+    return f'<url><loc>{escape(location)}</loc>{lastmod}</url>\n'
+
+
+class SitemapSection:
+    # The rows of a section are sharded by id range, shard n lists the ids in [n * size, (n + 1) * size):
+    # a new row only changes the last shard and an edit or delete only its own, the others stay cached.
+    # A shard's fingerprint (rows, latest updated_at, latest category updated_at) tells whether it changed,
+    # the category is in the fingerprint because its slug is part of the urls.
+
+    def __init__(self, name, title, model, type, list_url_name):
+        self.name = name
+        self.title = title
+        self.model = model
+        self.type = type
+        self.list_url_name = list_url_name
+
+    def queryset(self):
+        return self.model.objects.filter(category__type=self.type)
+
+    def fingerprint_aggregates(self):
+        return {'rows': Count('id'), 'updated': Max('updated_at'), 'category_updated': Max('category__updated_at')}
+
+    def fingerprints(self, size):
+        # {shard: fingerprint} of every non-empty shard in one grouped query
+        rows = (self.queryset().values(shard=F('id') / size).annotate(**self.fingerprint_aggregates())
+                .order_by('shard'))
+        return {row.pop('shard'): tuple(row.values()) for row in rows}
+
+    def fingerprint(self, shard, size):
+        return tuple(self.shard_queryset(shard, size).aggregate(**self.fingerprint_aggregates()).values())
+
+    def shard_queryset(self, shard, size):
+        return self.queryset().filter(id__gte=shard * size, id__lt=(shard + 1) * size)
+
+    def entries(self, shard, size):
+        # (stored path, lastmod) in id order, read in chunks so a large shard is never held in memory as rows
+        return (self.shard_queryset(shard, size).order_by('id').values_list('path', 'updated_at')
+                .iterator(chunk_size=CHUNK_SIZE))
+
+
+class CategorySitemapSection(SitemapSection):
+    # category pages of the sections that have them, the handbook lists its topics on one page
+    url_names = {
+        Category.TOPIC: 'topics',
+        Category.PHRASEBOOK: 'phrasebook-category',
+        Category.ARTICLE: 'articles-category',
+        Category.QUIZ: 'quizzes-category',
+    }
+
+    def queryset(self):
+        return self.model.objects.filter(type__in=self.url_names)
+
+    def fingerprint_aggregates(self):
+        return {'rows': Count('id'), 'updated': Max('updated_at')}
+
+    def entries(self, shard, size):
+        rows = (self.shard_queryset(shard, size).order_by('id').values_list('slug', 'type', 'updated_at')
+                .iterator(chunk_size=CHUNK_SIZE))
+        for slug, type, updated_at in rows:
+            yield reverse(self.url_names[type], kwargs={'slug': slug}), updated_at
+
+
+SECTIONS = {section.name: section for section in (
+    SitemapSection('topics', 'Топики', Article, Category.TOPIC, 'topics-categories'),
+    SitemapSection('phrasebook', 'Разговорник', Article, Category.PHRASEBOOK, 'phrasebook-categories'),
+    SitemapSection('articles', 'Статьи', Article, Category.ARTICLE, 'articles-categories'),
+    SitemapSection('handbook', 'Справочник', Article, Category.HANDBOOK, 'handbook'),
+    SitemapSection('quizzes', 'Тесты', Quiz, Category.QUIZ, 'quizzes-categories'),
+    CategorySitemapSection('categories', 'Категории', Category, None, None),
+)}
+# sections with a feed of their latest rows, see feeds.py
+FEED_SECTIONS = ('topics', 'phrasebook', 'articles', 'handbook', 'quizzes')
+
+
+class Sitemaps:
+    # The index and every shard are cached. Content saves bump the version after commit (see signals); a shard
+    # cached under an older version, or checked more than SITEMAP_MAX_AGE seconds ago, costs one aggregate over
+    # its id range and is only rendered again when its fingerprint moved. The age bounds how long writes that
+    # bypass the signals (bulk_create, update) stay unseen. Shards are rendered as a stream and stored at the end.
+    key_prefix = 'knowledge_base:sitemap:'
+    version_key = 'knowledge_base:sitemap-version'
+
+    @property
+    def shard_size(self):
+        # the protocol allows 50 000 urls per file
+        return getattr(settings, 'SITEMAP_SHARD_SIZE', 5000)
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'SITEMAP_MAX_AGE', 3600)
+
+    def version(self):
+        cache.add(self.version_key, 0, None)
+        return cache.get(self.version_key, 0)
+
+    def invalidate(self):
+        cache.add(self.version_key, 0, None)
+        cache.incr(self.version_key)
+
+    def schedule_invalidate(self):
+        transaction.on_commit(self.invalidate)
+
+    def is_current(self, entry, version):
+        return entry is not None and entry['version'] == version and time.time() - entry['checked_at'] < self.max_age
+
+    def index(self):
+        # [(section name, shard, lastmod)]
+        key, version = f'{self.key_prefix}index', self.version()
+        entry = cache.get(key)
+        if not self.is_current(entry, version):
+            shards = []
+            for section in SECTIONS.values():
+                for shard, (_, *dates) in section.fingerprints(self.shard_size).items():
+                    shards.append((section.name, shard, max(date for date in dates if date)))
+            entry = {'version': version, 'checked_at': time.time(), 'shards': shards}
+            cache.set(key, entry, None)
+        return entry['shards']
+
+    def shard_key(self, section, shard, base_url):
+        # the file holds absolute urls, so it is cached per host
+        return f'{self.key_prefix}{section.name}:{shard}:{base_url}'
+
+    def lookup(self, section, shard, base_url):
+        # (cached entry or None when the shard has to be rendered, fingerprint)
+        key, version = self.shard_key(section, shard, base_url), self.version()
+        entry = cache.get(key)
+        if self.is_current(entry, version):
+            return entry, entry['fingerprint']
+        fingerprint = section.fingerprint(shard, self.shard_size)
+        if entry is not None and entry['fingerprint'] == fingerprint:
+            entry.update(version=version, checked_at=time.time())
+            cache.set(key, entry, None)
+            return entry, fingerprint
+        return None, fingerprint
+
+    def render_shard(self, section, shard, base_url, fingerprint):
+        # yields the file in chunks and caches it once complete, a client that disconnects stores nothing
+        version, checked_at = self.version(), time.time()
+        parts = [f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{XMLNS}">\n']
+        yield parts[0]
+        chunk = []
+        for path, lastmod in section.entries(shard, self.shard_size):
+            chunk.append(url_entry(base_url + path, lastmod))
+            if len(chunk) == CHUNK_SIZE:
+                parts.append(''.join(chunk))
+                yield parts[-1]
+                chunk = []
+        parts.append(''.join(chunk) + '</urlset>\n')
+        yield parts[-1]
+        cache.set(self.shard_key(section, shard, base_url), {
+            'version': version, 'checked_at': checked_at, 'fingerprint': fingerprint, 'content': ''.join(parts),
+        }, None)
+
+    def render_index(self, shards, base_url):
+        lines = [f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{XMLNS}">\n']
+        for name, shard, lastmod in shards:
+            location = base_url + reverse('sitemap-shard', kwargs={'section': name, 'shard': shard})
+            lines.append(f'<sitemap><loc>{escape(location)}</loc>'
+                         f'<lastmod>{w3c_datetime(lastmod)}</lastmod></sitemap>\n')
+        lines.append('</sitemapindex>\n')
+        return ''.join(lines)
+
+
+sitemaps = Sitemaps()
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from services.db_router import primary
+from services.db_tools import run_in_thread
+
+
+class HomepageSnapshot:
+    # Homepage data is built once and kept in the cache, the view only reads it.
+    # Content saves rebuild it after commit; a snapshot older than HOMEPAGE_SNAPSHOT_MAX_AGE
+    # is still served while a background thread builds the next version.
+    cache_key = 'knowledge_base:homepage-snapshot'
+    version_key = 'knowledge_base:homepage-snapshot-version'
+
+    def __init__(self):
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'HOMEPAGE_SNAPSHOT_MAX_AGE', 300)
+
+    def build_data(self):
+        from .models import Article, Quiz
+
+        materials_by_sections = Article.get_most_raited_materials_by_sections()
+        materials_by_sections['tests'] = Quiz.get_most_raited_materials()
+        return {
+            'large_feed': Article.get_large_feed_data(),
+            'materials_by_sections': materials_by_sections,
+        }
+
+    async def abuild_data(self):
+        # the sections are independent, each is read in its own thread over its own connection
+        from .models import Article, Quiz
+
+        large_feed, materials_by_sections, tests = await asyncio.gather(
+            run_in_thread(Article.get_large_feed_data),
+            run_in_thread(Article.get_most_raited_materials_by_sections),
+            run_in_thread(Quiz.get_most_raited_materials),
+        )
+        materials_by_sections['tests'] = tests
+        return {'large_feed': large_feed, 'materials_by_sections': materials_by_sections}
+
+    def rebuild(self):
+        return self._store(self.build_data())
+
+    async def arebuild(self):
+        return await sync_to_async(self._store)(await self.abuild_data())
+
+    def _store(self, snapshot):
+        cache.add(self.version_key, 0, None)
+        snapshot['version'] = cache.incr(self.version_key)
+        snapshot['built_at'] = time.time()
+        cache.set(self.cache_key, snapshot, None)
+        return snapshot
+
+    def get(self):
+        snapshot = cache.get(self.cache_key)
+        if snapshot is None:
+            return self.rebuild()
+        return self._refresh_if_old(snapshot)
+
+    async def aget(self):
+        snapshot = await cache.aget(self.cache_key)
+        if snapshot is None:
+            return await self.arebuild()
+        return self._refresh_if_old(snapshot)
+
+    def _refresh_if_old(self, snapshot):
+        max_age = self.max_age
+        if max_age is not None and time.time() - snapshot['built_at'] > max_age:
+            self._refresh_in_background()
+        return snapshot
+
+    def schedule_rebuild(self):
+        requested_at = time.time()
+        transaction.on_commit(lambda: self._rebuild_if_older(requested_at))
+
+    def _rebuild_if_older(self, requested_at):
+        # several saves in one transaction share the rebuild done by the first callback
+        snapshot = cache.get(self.cache_key)
+        if snapshot is None or snapshot['built_at'] < requested_at:
+            with primary():
+                self.rebuild()
+
+    def _refresh_in_background(self):
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+
+        def refresh():
+            try:
+                self.rebuild()
+            finally:
+                connections.close_all()
+                self._refresh_lock.release()
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+homepage_snapshot = HomepageSnapshot()
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+from collections import defaultdict
+from pathlib import Path
+
+from django.test import RequestFactory, override_settings
+from django.urls import reverse, resolve
+
+from .models import Category, Article, Quiz, Question, Answer, QuizResult
+from .view_counter import view_counter
+
+MANIFEST_NAME = '.export-manifest.json'
+
+SECTIONS = (
+    (Category.TOPIC, 'topics-categories', 'topics', 'topic'),
+    (Category.PHRASEBOOK, 'phrasebook-categories', 'phrasebook-category', 'phrase-article'),
+    (Category.ARTICLE, 'articles-categories', 'articles-category', 'article'),
+)
+CARD_FIELDS = ('id', 'title', 'slug', 'views', 'time_for_read', 'image')
+
+
+def digest(*dependencies):
+    data = json.dumps(dependencies, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def card(row):
+    return {field: row[field] for field in CARD_FIELDS}
+
+
+def collect_pages():
+    # {url path: hash of every row the rendered page depends on}
+    categories = list(Category.objects.values('id', 'title', 'description', 'slug', 'type', 'image', 'parent_id')
+                      .order_by('id'))
+
+    articles_by_category = defaultdict(list)
+    for article in (Article.objects.values(*CARD_FIELDS, 'content', 'category_id', 'parent_id')
+                    .order_by('id').iterator()):
+        # content is only needed for its own page, keep the hash instead of the html
+        article['content'] = digest(article['content'])
+        articles_by_category[article['category_id']].append(article)
+
+    quizzes_by_category = defaultdict(list)
+    for quiz in Quiz.objects.values(*CARD_FIELDS, 'category_id').order_by('id'):
+        quizzes_by_category[quiz['category_id']].append(quiz)
+
+    quiz_parts = defaultdict(list)
+    answers_by_question = defaultdict(list)
+    for answer in Answer.objects.values('id', 'content', 'correct', 'question_id').order_by('id'):
+        answers_by_question[answer['question_id']].append(answer)
+    for question in Question.objects.values('id', 'number', 'content', 'quiz_id').order_by('id'):
+        quiz_parts[question['quiz_id']].append((question, answers_by_question[question['id']]))
+    for result in QuizResult.objects.values('id', 'min_value', 'max_value', 'content', 'quiz_id').order_by('id'):
+        quiz_parts[result['quiz_id']].append(result)
+
+    def of_type(type):
+        return [category for category in categories if category['type'] == type]
+
+    pages = {}
+    all_cards = [[card(row) for row in rows]
+                 for rows in (*articles_by_category.values(), *quizzes_by_category.values())]
+    pages[reverse('index')] = digest(categories, all_cards)
+
+    handbook_categories = of_type(Category.HANDBOOK)
+    handbook_lessons = [article for category in handbook_categories for article in articles_by_category[category['id']]]
+    handbook_structure = [handbook_categories,
+                          [(lesson['id'], lesson['title'], lesson['slug'], lesson['parent_id'])
+                           for lesson in handbook_lessons]]
+    pages[reverse('handbook')] = digest(handbook_structure)
+    for lesson in handbook_lessons:
+        pages[reverse('lesson', kwargs={'slug': lesson['slug']})] = digest(lesson, handbook_structure)
+
+    sections = [(type, list_name, category_name, detail_name, articles_by_category)
+                for type, list_name, category_name, detail_name in SECTIONS]
+    sections.append((Category.QUIZ, 'quizzes-categories', 'quizzes-category', 'quiz', quizzes_by_category))
+    for type, list_name, category_name, detail_name, items_by_category in sections:
+        section_categories = of_type(type)
+        pages[reverse(list_name)] = digest([(category, len(items_by_category[category['id']]))
+                                            for category in section_categories])
+        for category in section_categories:
+            items = items_by_category[category['id']]
+            pages[reverse(category_name, kwargs={'slug': category['slug']})] = digest(
+                category, [card(item) for item in items])
+            for item in items:
+                path = reverse(detail_name, kwargs={'category_slug': category['slug'], 'slug': item['slug']})
+                parts = quiz_parts[item['id']] if type == Category.QUIZ else None
+                pages[path] = digest(category['title'], item, parts)
+
+    return pages
+
+
+def file_for_path(output_dir, path):
+    # nginx: try_files $uri $uri.html $uri/index.html;
+    relative = path.strip('/')
+    if not relative or path.endswith('/'):
+        return Path(output_dir, relative, 'index.html')
+    return Path(output_dir, f'{relative}.html')
+
+
+def init_worker():
+    # exported pages are not visits, keep the view counter and snapshot refresher quiet
+    override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None).enable()
+
+
+def view_for(match):
+    # category pages link their next page as ?cursor=..., which a static site cannot serve: render them whole
+    view_class = getattr(match.func, 'view_class', None)
+    if view_class is not None and hasattr(view_class, 'page_size'):
+        return view_class.as_view(**match.func.view_initkwargs, page_size=None)
+    return match.func
+
+
+def render_page(output_dir, path):
+    request = RequestFactory().get(path)
+    match = resolve(path)
+    try:
+        response = view_for(match)(request, *match.args, **match.kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+    except Exception as error:
+        return path, repr(error)
+    finally:
+        view_counter.clear()
+    if response.status_code != 200:
+        return path, response.status_code
+
+    file = file_for_path(output_dir, path)
+    file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = file.with_name(f'.{file.name}.tmp')
+    tmp_file.write_bytes(response.content)
+    os.replace(tmp_file, file)
+    return path, response.status_code
+
+
+def load_manifest(output_dir):
+    try:
+        with open(Path(output_dir, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    manifest_path = Path(output_dir, MANIFEST_NAME)
+    tmp_path = manifest_path.with_name(f'.{MANIFEST_NAME}.tmp')
+    with open(tmp_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
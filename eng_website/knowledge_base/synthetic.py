@@ -0,0 +1,130 @@
+import random
+
+from django.db import transaction
+
+from .models import Category, Article, Quiz, Question, Answer, QuizResult, SearchDocument
+
+WORDS = (
+    'present past future simple continuous perfect tense verb noun adjective adverb article preposition '
+    'question answer sentence grammar lesson travel airport hotel restaurant weather family friend work '
+    'school holiday shopping health time weekend music film book city country language practice word '
+    'время глагол слово урок правило пример перевод разговор вопрос ответ путешествие семья работа'
+).split()
+
+ARTICLE_TYPES = (Category.TOPIC, Category.PHRASEBOOK, Category.ARTICLE, Category.HANDBOOK)
+
+
+class ContentGenerator:
+    # Fills the knowledge base with synthetic rows through bulk inserts, batch by batch,
+    # so memory stays flat from 1k to 1M rows. Handbook lessons form parent chains per topic.
+
+    def __init__(self, articles=1000, quizzes=None, categories_per_type=None, questions_per_quiz=10,
+                 answers_per_question=4, content_words=300, prefix='syn', seed=0, batch_size=1000,
+                 log=lambda message: None):
+        self.articles = articles
+        self.quizzes = articles // 10 if quizzes is None else quizzes
+        self.categories_per_type = categories_per_type or max(2, articles // 500)
+        self.questions_per_quiz = questions_per_quiz
+        self.answers_per_question = answers_per_question
+        self.content_words = content_words
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.log = log
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def html(self):
+        paragraphs = []
+        left = self.content_words
+        while left > 0:
+            words = min(left, self.random.randint(30, 120))
+            paragraphs.append(f'<p>{self.text(words)}</p>')
+            left -= words
+        return ''.join(paragraphs)
+
+    def generate(self):
+        categories = self.create_categories()
+        self.create_articles(categories)
+        self.create_quizzes(categories[Category.QUIZ])
+        # bulk inserts send no signals
+        ids = [category.id for created in categories.values() for category in created]
+        Category.update_child_counts(ids)
+        Category.touch_items(ids)
+        Category.update_paths(ids)
+
+    def create_categories(self):
+        categories = {}
+        for type, _ in Category.TYPE_CHOICES:
+            categories[type] = Category.objects.bulk_create([
+                Category(title=self.text(3).capitalize(), description=self.text(12), type=type,
+                         slug=f'{self.prefix}-{type.lower()}-{i}', image='preview_images/categories/synthetic.jpg')
+                for i in range(self.categories_per_type)
+            ])
+        self.log(f'{len(categories) * self.categories_per_type} categories')
+        return categories
+
+    def create_articles(self, categories):
+        created = 0
+        last_lesson_by_category = {}
+        while created < self.articles:
+            batch = []
+            for i in range(created, min(created + self.batch_size, self.articles)):
+                type = ARTICLE_TYPES[i % len(ARTICLE_TYPES)]
+                article = Article(
+                    title=self.text(4).capitalize(),
+                    content=self.html(),
+                    slug=f'{self.prefix}-article-{i}',
+                    category=self.random.choice(categories[type]),
+                    views=int(self.random.paretovariate(1.2)) - 1,
+                    image='preview_images/articles/synthetic.jpg',
+                )
+                # bulk_create skips Article.save
+                article.compile_content()
+                batch.append(article)
+
+            with transaction.atomic():
+                Article.objects.bulk_create(batch)
+                lessons = [article for article in batch if article.category.type == Category.HANDBOOK]
+                for lesson in lessons:
+                    lesson.parent_id = last_lesson_by_category.get(lesson.category_id)
+                    last_lesson_by_category[lesson.category_id] = lesson.id
+                Article.objects.bulk_update(lessons, ['parent'])
+                SearchDocument.objects.bulk_create([
+                    SearchDocument(article=article, title=article.title,
+                                   body=SearchDocument.html_to_text(article.content))
+                    for article in batch
+                ])
+
+            created += len(batch)
+            self.log(f'{created}/{self.articles} articles')
+
+    def create_quizzes(self, categories):
+        created = 0
+        batch_size = max(1, self.batch_size // (self.questions_per_quiz * self.answers_per_question))
+        while created < self.quizzes:
+            with transaction.atomic():
+                quizzes = Quiz.objects.bulk_create([
+                    Quiz(title=self.text(4).capitalize(), slug=f'{self.prefix}-quiz-{i}',
+                         category=self.random.choice(categories), views=int(self.random.paretovariate(1.2)) - 1,
+                         time_for_read=self.random.randint(1, 30), image='preview_images/articles/synthetic.jpg')
+                    for i in range(created, min(created + batch_size, self.quizzes))
+                ])
+                questions = Question.objects.bulk_create([
+                    Question(number=number, content=f'{self.text(8).capitalize()}?', quiz=quiz)
+                    for quiz in quizzes for number in range(1, self.questions_per_quiz + 1)
+                ])
+                Answer.objects.bulk_create([
+                    Answer(content=self.text(3), correct=i == 0, question=question)
+                    for question in questions for i in range(self.answers_per_question)
+                ])
+                step = self.questions_per_quiz // 3 + 1
+                QuizResult.objects.bulk_create([
+                    QuizResult(min_value=low, max_value=min(low + step - 1, self.questions_per_quiz),
+                               content=self.text(10), quiz=quiz)
+                    for quiz in quizzes for low in range(0, self.questions_per_quiz + 1, step)
+                ])
+
+            created += len(quizzes)
+            self.log(f'{created}/{self.quizzes} quizzes')
@@ -0,0 +1,35 @@
+from django import template
+from django.core.cache import cache
+
+from knowledge_base.fragment_cache import fragment_key, fragment_stats, fragment_timeout
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        key = fragment_key(name, [value.resolve(context) for value in self.vary_on])
+        fragment = cache.get(key)
+        fragment_stats.record(name, fragment is not None)
+        if fragment is None:
+            fragment = self.nodelist.render(context)
+            cache.set(key, fragment, fragment_timeout())
+        return fragment
+
+
+@register.tag
+def cached_fragment(parser, token):
+    # {% cached_fragment "name" value ... %}...{% endcached_fragment %}: the values are every input of the block
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f'{bits[0]} takes a fragment name and the values it depends on')
+    nodelist = parser.parse(('endcached_fragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]),
+                              [parser.compile_filter(bit) for bit in bits[2:]])
@@ -1,3 +1,1402 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, timedelta
+from tempfile import TemporaryDirectory
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, DatabaseError
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from PIL import Image
+
+from .attempt_log import attempt_log
+from .benchmarks import stack_urlconf
+from .fragment_cache import fragment_stats
+from .identity_map import category_resolver
+from .models import Category, Article, Quiz, Question, Answer, QuizResult, ViewStat, QuizAttempt, AttemptAnswer
+from .sampling import IdIndex, article_ids, quiz_ids
+from .snapshots import homepage_snapshot
+from .warmup import warm_up
+from .view_counter import view_counter
+
+
+PREVIEW_IMAGE = 'preview_images/articles/preview.jpg'
+media_root, media_settings = None, None
+
+
+def setUpModule():
+    # a real file behind the factories' preview image, every save generates its thumbnails. It is narrower than
+    # THUMBNAIL_WIDTHS, so there are no variants and the pages keep linking the original.
+    global media_root, media_settings
+    media_root = TemporaryDirectory()
+    media_settings = override_settings(MEDIA_ROOT=media_root.name)
+    media_settings.enable()
+    write_image(PREVIEW_IMAGE, 64, 48)
+
+
+def tearDownModule():
+    media_settings.disable()
+    media_root.cleanup()
+
+
+def write_image(name, width, height):
+    path = os.path.join(media_root.name, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new('RGB', (width, height), (200, 120, 40)).save(path, 'JPEG')
+
+
+def create_category(slug, type=Category.ARTICLE, **kwargs):
+    kwargs.setdefault('title', slug)
+    kwargs.setdefault('description', slug)
+    return Category.objects.create(slug=slug, type=type, **kwargs)
+
+
+def create_article(slug, category, **kwargs):
+    kwargs.setdefault('title', slug)
+    kwargs.setdefault('content', f'<p>{slug}</p>')
+    kwargs.setdefault('time_for_read', 5)
+    kwargs.setdefault('image', PREVIEW_IMAGE)
+    return Article.objects.create(slug=slug, category=category, **kwargs)
+
+
+def create_quiz(slug, category, **kwargs):
+    kwargs.setdefault('title', slug)
+    kwargs.setdefault('time_for_read', 5)
+    kwargs.setdefault('image', PREVIEW_IMAGE)
+    return Quiz.objects.create(slug=slug, category=category, **kwargs)
+
+
+def write_queries(queries):
+    return [query for query in queries if query['sql'].split(' ', 1)[0] in ('INSERT', 'UPDATE', 'DELETE')]
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None)
+class ViewCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('grammar')
+        cls.article = create_article('present-simple', cls.category)
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+
+    def setUp(self):
+        view_counter.clear()
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def test_concurrent_hits_are_not_lost(self):
+        threads_count, hits_per_thread = 16, 250
+
+        def hit():
+            for _ in range(hits_per_thread):
+                view_counter.record(Article, self.article.pk)
+                view_counter.record(Quiz, self.quiz.pk)
+
+        threads = [threading.Thread(target=hit) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with CaptureQueriesContext(connection) as ctx:
+            view_counter.flush()
+        # one increment and one touch of the categories per model plus a single insert of both daily rollups
+        self.assertEqual(len(write_queries(ctx.captured_queries)), 5)
+
+        self.article.refresh_from_db()
+        self.quiz.refresh_from_db()
+        self.assertEqual(self.article.views, threads_count * hits_per_thread)
+        self.assertEqual(self.quiz.views, threads_count * hits_per_thread)
+
+    def test_detail_requests_are_flushed_in_one_batch(self):
+        url = reverse('article', kwargs={'category_slug': self.category.slug, 'slug': self.article.slug})
+        requests_count = 20
+
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(requests_count):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(write_queries(ctx.captured_queries), [])
+
+        with CaptureQueriesContext(connection) as ctx:
+            view_counter.flush()
+        self.assertEqual(len(write_queries(ctx.captured_queries)), 3)
+
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.views, requests_count)
+
+    def test_proxy_models_share_counter(self):
+        from .models import Topic
+
+        view_counter.record(Topic, self.article.pk)
+        view_counter.record(Article, self.article.pk)
+        self.assertEqual(view_counter.pending_for(Article, self.article.pk), 2)
+
+    def test_timer_flush_closes_its_connections(self):
+        view_counter.record(Article, self.article.pk)
+        with mock.patch('knowledge_base.view_counter.connections.close_all') as close_all, \
+                mock.patch.object(view_counter, 'flush', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                view_counter._flush_in_background()
+        close_all.assert_called_once_with()
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None)
+class ViewStatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.topic_category = create_category('travel', Category.TOPIC)
+        cls.article_category = create_category('grammar')
+        cls.topics = [create_article(f'topic-{i}', cls.topic_category) for i in range(3)]
+        cls.article = create_article('present-simple', cls.article_category)
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+
+    def setUp(self):
+        view_counter.clear()
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def record_on(self, day, model, pk, count):
+        with mock.patch('knowledge_base.view_counter.timezone.localdate', return_value=day):
+            view_counter.record(model, pk, count)
+
+    def test_flushes_add_up_in_daily_buckets(self):
+        today = timezone.localdate()
+        self.record_on(today, Article, self.article.pk, 2)
+        self.record_on(today - timedelta(days=1), Article, self.article.pk, 1)
+        view_counter.flush()
+        self.record_on(today, Article, self.article.pk, 3)
+        view_counter.flush()
+
+        stats = ViewStat.objects.filter(object_id=self.article.pk, period=ViewStat.DAY).order_by('day')
+        self.assertEqual([(stat.day, stat.hits, stat.section) for stat in stats],
+                         [(today - timedelta(days=1), 1, Category.ARTICLE), (today, 5, Category.ARTICLE)])
+
+    def test_compaction_folds_days_into_weeks_and_weeks_into_months(self):
+        for day in (date(2022, 1, 3), date(2022, 1, 4), date(2022, 1, 10)):
+            self.record_on(day, Article, self.article.pk, 2)
+        view_counter.flush()
+
+        self.assertEqual(ViewStat.compact(ViewStat.WEEK, date(2022, 1, 17)), 2)
+        weeks = ViewStat.objects.filter(period=ViewStat.WEEK).order_by('day')
+        self.assertEqual([(stat.day, stat.hits) for stat in weeks], [(date(2022, 1, 3), 4), (date(2022, 1, 10), 2)])
+        self.assertFalse(ViewStat.objects.filter(period=ViewStat.DAY).exists())
+
+        self.assertEqual(ViewStat.compact(ViewStat.MONTH, date(2022, 2, 1)), 1)
+        month = ViewStat.objects.get()
+        self.assertEqual((month.period, month.day, month.hits), (ViewStat.MONTH, date(2022, 1, 1), 6))
+
+    def test_top_by_sections_in_one_query(self):
+        today = timezone.localdate()
+        for count, topic in enumerate(self.topics, start=1):
+            self.record_on(today, Article, topic.pk, count)
+        self.record_on(today - timedelta(days=10), Article, self.topics[0].pk, 100)
+        self.record_on(today, Article, self.article.pk, 1)
+        self.record_on(today, Quiz, self.quiz.pk, 7)
+        view_counter.flush()
+
+        with self.assertNumQueries(1):
+            top = ViewStat.get_top_by_sections(top=2)
+
+        self.assertEqual([(row['title'], row['hits']) for row in top[Category.TOPIC]], [('topic-2', 3), ('topic-1', 2)])
+        self.assertEqual([(row['title'], row['hits']) for row in top[Category.ARTICLE]], [('present-simple', 1)])
+        self.assertEqual([(row['title'], row['hits']) for row in top[Category.QUIZ]], [('tenses', 7)])
+
+    def test_admin_report(self):
+        from django.contrib.auth.models import User
+
+        self.record_on(timezone.localdate(), Quiz, self.quiz.pk, 7)
+        view_counter.flush()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+
+        response = self.client.get(reverse('admin:knowledge_base_viewstat_changelist'), {'top': 5})
+        self.assertContains(response, 'tenses')
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class HomepageSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('grammar')
+        cls.articles = [create_article(f'article-{i}', cls.category, views=i) for i in range(5)]
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+
+    def setUp(self):
+        cache.clear()
+        article_ids.invalidate()
+        quiz_ids.invalidate()
+        category_resolver.invalidate()
+
+    def test_steady_state_homepage_has_no_queries(self):
+        self.client.get(reverse('index'))
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertEqual([item['title'] for item in response.context['large_feed']],
+                         ['article-4', 'article-3', 'article-2'])
+
+    def test_content_save_rebuilds_snapshot(self):
+        version = homepage_snapshot.get()['version']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_article('article-new', self.category, views=100)
+
+        snapshot = homepage_snapshot.get()
+        self.assertGreater(snapshot['version'], version)
+        self.assertEqual(snapshot['large_feed'][0]['title'], 'article-new')
+
+
+class IdIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        article_ids.invalidate()
+        quiz_ids.invalidate()
+        category_resolver.invalidate()
+
+    def test_incremental_changes(self):
+        id_index = IdIndex('test', lambda: [(1, 'a'), (2, 'a'), (3, 'b')])
+        self.assertCountEqual(id_index.sample('a', 10), [1, 2])
+
+        id_index.add(4, 'a')
+        id_index.add(3, 'a')
+        id_index.remove(1)
+        self.assertCountEqual(id_index.sample('a', 10), [2, 3, 4])
+        self.assertEqual(id_index.sample('b', 10), [])
+        self.assertEqual(len(id_index.sample('a', 2)), 2)
+
+    def test_reloads_after_change_in_another_process(self):
+        rows = [(1, 'a')]
+        id_index = IdIndex('test', lambda: rows)
+        self.assertEqual(id_index.sample('a', 10), [1])
+
+        rows.append((2, 'a'))
+        cache.set(id_index.version_key, 1)
+        self.assertCountEqual(id_index.sample('a', 10), [1, 2])
+
+    def test_change_racing_another_process_reloads(self):
+        rows = [(1, 'a')]
+        id_index = IdIndex('test', lambda: rows)
+        self.assertEqual(id_index.sample('a', 10), [1])
+
+        def incr_after_another_process(key, *args):
+            # its row and bump land right before this process bumps the version
+            rows.append((2, 'a'))
+            incr(key)
+            return incr(key)
+
+        incr = cache.incr
+        rows.append((3, 'a'))
+        with mock.patch.object(cache, 'incr', incr_after_another_process):
+            id_index.add(3, 'a')
+        self.assertCountEqual(id_index.sample('a', 10), [1, 2, 3])
+
+    @override_settings(ID_INDEX_MAX_AGE=300)
+    def test_reloads_after_max_age(self):
+        rows = [(1, 'a')]
+        id_index = IdIndex('test', lambda: rows)
+        self.assertEqual(id_index.sample('a', 10), [1])
+
+        # a change whose version bump this process never saw
+        rows[:] = [(2, 'a')]
+        self.assertEqual(id_index.sample('a', 10), [1])
+        with mock.patch('knowledge_base.sampling.time.monotonic', return_value=time.monotonic() + 301):
+            self.assertEqual(id_index.sample('a', 10), [2])
+
+    def test_most_rated_materials_sample_valid_ids_of_their_section(self):
+        sections = {Category.TOPIC: 'topics', Category.ARTICLE: 'articles', Category.PHRASEBOOK: 'phrasebook'}
+        categories = {type: create_category(f'category-{type}', type) for type in sections}
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(30):
+                type = list(sections)[i % 3]
+                article = create_article(f'{type}-{i}', categories[type])
+                if i % 2:
+                    article.delete()
+
+        Article.get_most_raited_materials_by_sections()
+        with self.assertNumQueries(1):
+            materials = Article.get_most_raited_materials_by_sections(count_for_section=4)
+
+        for type, section in sections.items():
+            self.assertEqual(len(materials[section]), 4)
+            for material in materials[section]:
+                self.assertTrue(Article.objects.filter(category__type=type, title=material['title']).exists())
+
+    def test_most_rated_quizzes_follow_deletes(self):
+        category = create_category('tests', Category.QUIZ)
+        with self.captureOnCommitCallbacks(execute=True):
+            quizzes = [create_quiz(f'quiz-{i}', category) for i in range(3)]
+        Quiz.get_most_raited_materials()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            quizzes[0].delete()
+
+        with self.assertNumQueries(1):
+            materials = Quiz.get_most_raited_materials(count=4)
+        self.assertCountEqual([material['title'] for material in materials], ['quiz-1', 'quiz-2'])
+
+    def test_most_rated_quizzes_include_any_category(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_quiz('loose', None)
+            create_quiz('misfiled', create_category('grammar', Category.ARTICLE))
+        self.assertCountEqual([material['title'] for material in Quiz.get_most_raited_materials(count=4)],
+                              ['loose', 'misfiled'])
+
+        quiz_ids.invalidate()
+        self.assertEqual(quiz_ids.load(), 2)
+        self.assertEqual(len(Quiz.get_most_raited_materials(count=4)), 2)
+
+
+class StaticExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('grammar')
+        cls.articles = [create_article(f'article-{i}', cls.category) for i in range(2)]
+        create_category('travel', Category.TOPIC)
+
+    def test_only_dependent_pages_change(self):
+        from .static_export import collect_pages
+
+        before = collect_pages()
+        Article.objects.filter(pk=self.articles[0].pk).update(content='<p>new</p>')
+        after = collect_pages()
+
+        changed = {path for path in after if before[path] != after[path]}
+        self.assertEqual(changed, {reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'article-0'})})
+
+        Article.objects.filter(pk=self.articles[1].pk).update(title='renamed')
+        changed = {path for path, page_hash in collect_pages().items() if after[path] != page_hash}
+        self.assertEqual(changed, {reverse('index'), reverse('articles-category', kwargs={'slug': 'grammar'}),
+                                   reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'article-1'})})
+
+    def test_render_page_writes_html(self):
+        from .static_export import render_page, file_for_path
+
+        path = reverse('articles-category', kwargs={'slug': 'grammar'})
+        with TemporaryDirectory() as output_dir:
+            self.assertEqual(render_page(output_dir, path), (path, 200))
+            self.assertIn('article-1', file_for_path(output_dir, path).read_text())
+
+    def test_category_pages_are_exported_whole(self):
+        from .static_export import render_page, file_for_path
+
+        category = create_category('vocabulary')
+        for i in range(30):
+            create_article(f'word-{i}', category)
+        path = reverse('articles-category', kwargs={'slug': 'vocabulary'})
+        with TemporaryDirectory() as output_dir:
+            render_page(output_dir, path)
+            html = file_for_path(output_dir, path).read_text()
+        self.assertEqual(html.count('/articles/vocabulary/word-'), 30)
+        self.assertNotIn('?cursor=', html)
+        self.assertEqual(len(self.client.get(path).context['articles']), 24)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grammar = create_category('grammar')
+        handbook = create_category('handbook', Category.HANDBOOK)
+        create_article('present-simple', grammar, title='Present Simple',
+                       content='<p>The present simple tense &amp; <b>habits</b></p><script>x</script>')
+        create_article('past-simple', grammar, title='Past Simple', content='<p>Simple past for finished actions</p>')
+        create_article('articles', handbook, title='Артикли', content='<p>Определённый артикль the</p>')
+        for i in range(12):
+            create_article(f'filler-{i}', grammar, content='<p>filler text about tense</p>')
+
+    def test_results_are_ranked_highlighted_and_linked(self):
+        response = self.client.get(reverse('search'), {'q': 'present'})
+
+        results = response.context['results']
+        self.assertEqual(response.context['paginator'].count, 1)
+        self.assertEqual(results[0]['title'], '<mark>Present</mark> Simple')
+        self.assertIn('&amp;', results[0]['snippet'])
+        self.assertEqual(results[0]['url'], reverse('article', kwargs={'category_slug': 'grammar',
+                                                                       'slug': 'present-simple'}))
+
+    def test_lessons_link_to_handbook(self):
+        results = self.client.get(reverse('search'), {'q': 'артикль'}).context['results']
+        self.assertEqual(results[0]['url'], reverse('lesson', kwargs={'slug': 'articles'}))
+
+    def test_pagination_and_updates_on_save(self):
+        response = self.client.get(reverse('search'), {'q': 'tense', 'page': 2})
+        self.assertEqual(response.context['paginator'].count, 13)
+        self.assertEqual(len(response.context['results']), 3)
+
+        article = Article.objects.get(slug='past-simple')
+        article.content = '<p>now about tense too</p>'
+        article.save()
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'tense'}).context['paginator'].count, 14)
+
+    def test_empty_and_punctuation_queries(self):
+        for query in ('', '"*(', 'AND OR'):
+            response = self.client.get(reverse('search'), {'q': query})
+            self.assertEqual(response.status_code, 200)
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('grammar')
+        cls.article = create_article('present-simple', cls.category)
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+        cls.question = Question.objects.create(number=1, content='?', quiz=cls.quiz)
+        cls.answer = Answer.objects.create(content='yes', correct=True, question=cls.question)
+
+    def setUp(self):
+        cache.clear()
+        category_resolver.invalidate()
+        view_counter.clear()
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_pages_answer_304_without_rendering(self):
+        urls = (
+            reverse('index'),
+            reverse('handbook'),
+            reverse('articles-categories'),
+            reverse('articles-category', kwargs={'slug': 'grammar'}),
+            reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'present-simple'}),
+            reverse('quiz', kwargs={'category_slug': 'tests', 'slug': 'tenses'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('ETag', response)
+                self.assertIn('no-cache', response['Cache-Control'])
+
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.revalidate(url, response)
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+                self.assertLessEqual(len(ctx.captured_queries), 1)
+
+    def test_article_save_changes_validators(self):
+        url = reverse('articles-category', kwargs={'slug': 'grammar'})
+        response = self.client.get(url)
+        self.article.title = 'Present Simple'
+        self.article.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_list_validators_move_once_per_view_flush(self):
+        url = reverse('articles-category', kwargs={'slug': 'grammar'})
+        response = self.client.get(url)
+        self.client.get(reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'present-simple'}))
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertNotIn('knowledge_base_article', ctx.captured_queries[0]['sql'])
+        view_counter.flush()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_answer_save_changes_quiz_list_validators(self):
+        url = reverse('quizzes-category', kwargs={'slug': 'tests'})
+        response = self.client.get(url)
+        self.answer.correct = False
+        self.answer.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_answer_save_touches_quiz(self):
+        url = reverse('quiz', kwargs={'category_slug': 'tests', 'slug': 'tenses'})
+        response = self.client.get(url)
+        view_counter.flush()
+        response = self.client.get(url)
+
+        self.answer.correct = False
+        self.answer.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_revalidated_detail_loads_only_the_validator_columns(self):
+        url = reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'present-simple'})
+        response = self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('content', ctx.captured_queries[0]['sql'])
+
+    def test_revalidated_detail_is_still_counted(self):
+        url = reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'present-simple'})
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.assertEqual(view_counter.pending_for(Article, self.article.pk), 2)
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class CategoryResolverTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('grammar')
+        create_article('present-simple', cls.category)
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+
+    def setUp(self):
+        cache.clear()
+        category_resolver.invalidate()
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def category_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        # whole rows, the validator of a category's list pages reads its stored counters by pk on every request
+        return [query for query in ctx.captured_queries if 'FROM "knowledge_base_category"' in query['sql']
+                and '"knowledge_base_category"."title"' in query['sql']]
+
+    def test_rows_are_read_once_per_request_and_then_from_the_lru(self):
+        urls = (
+            reverse('articles-category', kwargs={'slug': 'grammar'}),
+            reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'present-simple'}),
+            reverse('quiz', kwargs={'category_slug': 'tests', 'slug': 'tenses'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertLessEqual(len(self.category_queries(url)), 1)
+                self.assertEqual(self.category_queries(url), [])
+
+    def test_category_save_invalidates_resolver(self):
+        url = reverse('articles-category', kwargs={'slug': 'grammar'})
+        self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.title = 'Grammar rules'
+            self.category.save()
+        self.assertEqual(self.client.get(url).context['category'].title, 'Grammar rules')
+
+    @override_settings(CATEGORY_RESOLVER_MAX_AGE=60)
+    def test_entries_expire_without_a_version_bump(self):
+        self.assertEqual(category_resolver.get(slug='grammar').title, self.category.title)
+        # a save in another worker whose version bump this one never saw
+        Category.objects.filter(pk=self.category.pk).update(title='Grammar rules')
+        self.assertEqual(category_resolver.get(slug='grammar').title, self.category.title)
+
+        with mock.patch('knowledge_base.identity_map.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(category_resolver.get(slug='grammar').title, 'Grammar rules')
+
+    def test_unknown_category_is_404(self):
+        self.assertEqual(self.client.get(reverse('articles-category', kwargs={'slug': 'missing'})).status_code, 404)
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('grammar')
+        for i in range(30):
+            create_article(f'article-{i}', cls.category, views=i % 4)
+
+    def setUp(self):
+        cache.clear()
+        category_resolver.invalidate()
+
+    def test_cursor_walks_every_article_once_without_offset(self):
+        url = reverse('articles-category', kwargs={'slug': 'grammar'})
+        expected = list(Article.objects.filter(category=self.category).order_by('-views', '-id')
+                        .values_list('slug', flat=True))
+
+        slugs, params = [], {}
+        with CaptureQueriesContext(connection) as ctx:
+            while True:
+                response = self.client.get(url, params)
+                slugs += [article.slug for article in response.context['articles']]
+                if not response.context['next_cursor']:
+                    break
+                params = {'cursor': response.context['next_cursor']}
+        self.assertEqual(slugs, expected)
+        self.assertEqual(len(response.context['articles']), 6)
+        article_queries = [query['sql'] for query in ctx.captured_queries if 'ORDER BY' in query['sql']]
+        self.assertTrue(article_queries)
+        self.assertFalse([sql for sql in article_queries if 'OFFSET' in sql or '"content"' in sql])
+
+    def test_json_fragment(self):
+        url = reverse('articles-category', kwargs={'slug': 'grammar'})
+        cursor = self.client.get(url).context['next_cursor']
+
+        page = self.client.get(url, {'cursor': cursor, 'format': 'json'}).json()
+        self.assertIsNone(page['next'])
+        self.assertEqual(page['html'].count('class="preview-item '), 6)
+        self.assertIn(reverse('article', kwargs={'category_slug': 'grammar', 'slug': 'article-0'}), page['html'])
+
+    def test_invalid_cursor_is_400(self):
+        url = reverse('articles-category', kwargs={'slug': 'grammar'})
+        for cursor in ('!!', 'e30', 'WzEsMl0x'):
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 400)
+
+
+class BulkExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        grammar = create_category('grammar')
+        create_article('present-simple', grammar, content='<p>Привет</p>')
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+        question = Question.objects.create(number=1, content='?', quiz=cls.quiz)
+        Answer.objects.create(content='yes', correct=True, question=question)
+        QuizResult.objects.create(min_value=0, max_value=1, content='ok', quiz=cls.quiz)
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.client.force_login(User.objects.create_user('editor', is_staff=True))
+
+    def export(self, **params):
+        response = self.client.get(reverse('knowledge-base-export'), params)
+        self.assertTrue(response.streaming)
+        return [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+
+    def test_full_export_streams_every_model(self):
+        records = self.export()
+        self.assertEqual(records[0]['model'], 'meta')
+        self.assertEqual([record['model'] for record in records[1:]], [
+            'knowledge_base.category', 'knowledge_base.category', 'knowledge_base.article', 'knowledge_base.quiz',
+            'knowledge_base.question', 'knowledge_base.answer', 'knowledge_base.quizresult',
+        ])
+        self.assertEqual(records[3]['fields']['content'], '<p>Привет</p>')
+
+    def test_since_exports_changed_rows_and_touched_quiz_graph(self):
+        since = self.export()[0]['exported_at']
+        Answer.objects.update(content='no')
+        Answer.objects.get().save()
+
+        models = [record['model'] for record in self.export(since=since)[1:]]
+        self.assertEqual(models, ['knowledge_base.quiz', 'knowledge_base.question', 'knowledge_base.answer',
+                                  'knowledge_base.quizresult'])
+
+    def test_requires_staff_and_valid_since(self):
+        self.assertEqual(self.client.get(reverse('knowledge-base-export'), {'since': 'yesterday'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('knowledge-base-export')).status_code, 302)
+
+    def test_command_writes_ndjson(self):
+        output = io.StringIO()
+        call_command('export_knowledge_base', since='2000-01-01', chunk_size=1, stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 8)
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class QuizPayloadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+        cls.question = Question.objects.create(number=1, content='Which?', quiz=cls.quiz)
+        cls.answers = [Answer.objects.create(content=f'answer {i}', correct=i == 0, question=cls.question)
+                       for i in range(4)]
+        QuizResult.objects.create(min_value=0, max_value=1, content='ok', quiz=cls.quiz)
+
+    def setUp(self):
+        cache.clear()
+        category_resolver.invalidate()
+        self.url = reverse('quiz', kwargs={'category_slug': 'tests', 'slug': 'tenses'})
+
+    def tearDown(self):
+        view_counter.clear()
+        attempt_log.clear()
+
+    def submit(self, choices):
+        return self.client.post(reverse('quiz-submit', kwargs={'category_slug': 'tests', 'slug': 'tenses'}),
+                                {'answers': choices}, content_type='application/json')
+
+    def test_hot_quiz_costs_no_queries(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(ctx.captured_queries, [])
+        self.assertContains(response, 'id="quiz_questions"')
+        self.assertContains(response, 'id="quiz_shuffle_seed"')
+
+    def test_answers_have_a_stable_order(self):
+        questions = Quiz.get_quiz_article_data('tenses')['questions']
+        self.assertEqual([answer['content'] for answer in questions[0]['answers']],
+                         [answer.content for answer in self.answers])
+
+    def test_page_has_no_answer_key(self):
+        response = self.client.get(self.url)
+        self.assertNotContains(response, 'correct')
+        self.assertContains(response, f'"id": {self.answers[0].id}')
+
+    def test_submission_is_graded_and_logged_in_a_batch(self):
+        QuizResult.objects.create(min_value=2, max_value=5, content='great', quiz=self.quiz)
+        second = Question.objects.create(number=2, content='And?', quiz=self.quiz)
+        right = Answer.objects.create(content='right', correct=True, question=second)
+
+        with CaptureQueriesContext(connection) as ctx:
+            graded = self.submit({self.question.id: self.answers[0].id, second.id: right.id}).json()
+            self.submit({self.question.id: self.answers[1].id})
+            self.submit({self.question.id: 'x'})
+        self.assertEqual(write_queries(ctx.captured_queries), [])
+        self.assertEqual((graded['score'], graded['total'], graded['result']), (2, 2, 'great'))
+        self.assertNotIn('correct', graded)
+        self.assertEqual(self.submit({self.question.id: self.answers[1].id}).json()['result'], 'ok')
+        self.assertEqual(self.submit({self.question.id: self.answers[0].id}).json()['result'], 'ok')
+
+        with CaptureQueriesContext(connection) as ctx:
+            attempt_log.flush()
+        # attempts, their answers and one update per distinct (answered, correct) increment
+        self.assertEqual(len(write_queries(ctx.captured_queries)), 4)
+        self.assertEqual(QuizAttempt.objects.count(), 4)
+        self.question.refresh_from_db()
+        self.assertEqual((self.question.answered, self.question.answered_correctly), (4, 2))
+        # the second question was skipped by the later attempts and is not counted as answered wrongly
+        second.refresh_from_db()
+        self.assertEqual((second.answered, second.answered_correctly), (1, 1))
+        self.assertEqual(AttemptAnswer.objects.count(), 5)
+
+    def test_flush_drops_attempts_of_deleted_rows(self):
+        second = Question.objects.create(number=2, content='And?', quiz=self.quiz)
+        right = Answer.objects.create(content='right', correct=True, question=second)
+        self.submit({self.question.id: self.answers[1].id, second.id: right.id})
+        other = create_quiz('other', self.quiz.category)
+        attempt_log.record(QuizAttempt(quiz_id=other.id, score=0, total=0), [])
+        second.delete()
+        self.answers[1].delete()
+        other.delete()
+
+        attempt_log.flush()
+        attempt = QuizAttempt.objects.get()
+        self.assertEqual(attempt.quiz_id, self.quiz.id)
+        self.assertEqual(list(attempt.answers.values_list('question_id', 'answer_id')), [(self.question.id, None)])
+        self.assertEqual(attempt_log._pending, [])
+
+    def test_renamed_quiz_drops_the_payload_of_its_old_slug(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.quiz.slug = 'renamed'
+            self.quiz.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(self.quiz.path).status_code, 200)
+
+    def test_submission_needs_the_csrf_cookie_of_the_quiz_page(self):
+        client = Client(enforce_csrf_checks=True)
+        submit_url = reverse('quiz-submit', kwargs={'category_slug': 'tests', 'slug': 'tenses'})
+        body = json.dumps({'answers': {self.question.id: self.answers[0].id}})
+        self.assertEqual(client.post(submit_url, body, content_type='application/json').status_code, 403)
+
+        response = client.get(self.url)
+        revalidated = Client().get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertIn('csrftoken', revalidated.cookies)
+
+        token = client.cookies['csrftoken'].value
+        response = client.post(submit_url, body, content_type='application/json', HTTP_X_CSRFTOKEN=token)
+        self.assertEqual(response.json()['score'], 1)
+
+    def test_invalid_submission_is_400(self):
+        response = self.client.post(reverse('quiz-submit', kwargs={'category_slug': 'tests', 'slug': 'tenses'}),
+                                    'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_answer_save_drops_payload(self):
+        self.client.get(self.url)
+        self.answers[1].content = 'changed answer'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.answers[1].save()
+        self.assertContains(self.client.get(self.url), 'changed answer')
+
+
+class ContentCompilerTests(TestCase):
+    def test_sanitizes_and_completes_images(self):
+        from .content_compiler import compile_content
+
+        html, words = compile_content(
+            '<P onclick="steal()">Hello <b>world<i>!</p><script>alert("<p>")</script>'
+            '<a href=" javascript:steal()" target="_blank">link</a>'
+            '<img src="/media/uploads/cat.jpg" style="width:300px; height:200px" onerror="steal()">'
+            '<img src="/media/uploads/dog.png" alt="dog"><form><input>lost</form>'
+        )
+        self.assertEqual(html, '<p>Hello <b>world<i>!</i></b></p><a target="_blank" rel="noopener">link</a>'
+                               '<img src="/media/uploads/cat.jpg" style="width:300px; height:200px" loading="lazy" '
+                               'decoding="async" width="300" height="200">'
+                               '<img src="/media/uploads/dog.png" alt="dog" loading="lazy" decoding="async">')
+        self.assertEqual(words, 3)
+
+        html, _ = compile_content('<img src="/media/uploads/dog.png">', image_size=lambda src: (640, 480))
+        self.assertIn('width="640" height="480"', html)
+
+    def test_save_compiles_and_detail_page_serves_compiled_html(self):
+        category = create_category('grammar')
+        article = create_article('present-simple', category, content='<p onclick="x">%s</p>' % ('слово ' * 400))
+        self.assertEqual(article.time_for_read, 3)
+        self.assertNotIn('onclick', article.compiled_content)
+
+        Article.objects.filter(pk=article.pk).update(compiled_content='<p>precompiled</p>')
+        response = self.client.get(reverse('article', kwargs={'category_slug': 'grammar', 'slug': article.slug}))
+        self.assertContains(response, '<p>precompiled</p>')
+
+        article.refresh_from_db()
+        article.title = 'renamed'
+        article.save(update_fields=['title'])
+        self.assertEqual(Article.objects.get().compiled_content, '<p>precompiled</p>')
+
+    def test_recompile_command_updates_changed_rows(self):
+        category = create_category('grammar')
+        Article.objects.bulk_create([Article(slug=f'a-{i}', title='a', content='<p>one two<script>x</script>',
+                                             category=category) for i in range(3)])
+        create_article('compiled', category)
+        before = dict(Article.objects.values_list('slug', 'updated_at'))
+
+        output = io.StringIO()
+        call_command('recompile_content', batch_size=2, stdout=output)
+        self.assertIn('4 articles compiled, 3 changed', output.getvalue())
+        self.assertEqual(set(Article.objects.filter(slug__startswith='a-').values_list('compiled_content', flat=True)),
+                         {'<p>one two</p>'})
+        self.assertEqual(Article.objects.get(slug='compiled').updated_at, before['compiled'])
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None, SITEMAP_SHARD_SIZE=2)
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.articles_category = create_category('news')
+        cls.articles = [create_article(f'article-{i}', cls.articles_category) for i in range(5)]
+        cls.lesson = create_article('lesson', create_category('grammar', Category.HANDBOOK))
+        cls.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, re.findall(r'<loc>http://testserver(.*?)</loc>', content.decode())
+
+    def fetch_all(self):
+        _, shards = self.fetch(reverse('sitemap'))
+        return {shard: self.fetch(shard) for shard in shards}
+
+    def test_shards_list_every_page(self):
+        shards = self.fetch_all()
+        self.assertEqual(len([shard for shard in shards if '/articles/' in shard]), 3)
+        paths = {path for _, paths in shards.values() for path in paths}
+        self.assertEqual(paths, {
+            *(reverse('article', kwargs={'category_slug': 'news', 'slug': article.slug}) for article in self.articles),
+            reverse('lesson', kwargs={'slug': 'lesson'}),
+            reverse('quiz', kwargs={'category_slug': 'tests', 'slug': 'tenses'}),
+            reverse('articles-category', kwargs={'slug': 'news'}),
+            reverse('quizzes-category', kwargs={'slug': 'tests'}),
+        })
+        self.assertEqual(self.client.get(reverse('sitemap-shard', kwargs={'section': 'articles', 'shard': 99}))
+                         .status_code, 404)
+
+    def test_only_changed_shards_are_rendered_again(self):
+        first = list(self.fetch_all())
+        with self.assertNumQueries(0):
+            self.assertTrue(all(not response.streaming for response, _ in self.fetch_all().values()))
+
+        changed = self.articles[-1]
+        with self.captureOnCommitCallbacks(execute=True):
+            changed.title = 'changed'
+            changed.save()
+        changed_url = reverse('sitemap-shard', kwargs={'section': 'articles', 'shard': changed.id // 2})
+        # the index and one fingerprint per shard
+        with self.assertNumQueries(6 + len(first) + 1):
+            shards = self.fetch_all()
+        self.assertEqual([shard for shard, (response, _) in shards.items() if response.streaming], [changed_url])
+
+        response = self.client.get(changed_url, HTTP_IF_NONE_MATCH=shards[changed_url][0]['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_feeds_are_cached_until_content_changes(self):
+        for name in ('feed-rss', 'feed-atom'):
+            url = reverse(name, kwargs={'section': 'articles'})
+            response = self.client.get(url)
+            self.assertContains(response, 'article-4')
+            with self.assertNumQueries(0):
+                self.client.get(url)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_article('fresh', self.articles_category)
+        self.assertContains(self.client.get(reverse('feed-rss', kwargs={'section': 'articles'})), 'fresh')
+        self.assertEqual(self.client.get(reverse('feed-rss', kwargs={'section': 'categories'})).status_code, 404)
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class ChildCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.news = create_category('news')
+        self.travel = create_category('travel')
+
+    def counts(self):
+        return dict(Category.objects.values_list('slug', 'child_count'))
+
+    def test_counters_follow_saves_moves_and_deletes(self):
+        article = create_article('first', self.news)
+        create_article('second', self.news)
+        create_quiz('tenses', create_category('tests', Category.QUIZ))
+        self.assertEqual(self.counts(), {'news': 2, 'travel': 0, 'tests': 1})
+
+        article.category = self.travel
+        article.save()
+        self.assertEqual(self.counts(), {'news': 1, 'travel': 1, 'tests': 1})
+        article.delete()
+        self.assertEqual(self.counts(), {'news': 1, 'travel': 0, 'tests': 1})
+
+        # quiz categories count quizzes, the others articles
+        self.news.type = Category.QUIZ
+        self.news.save()
+        self.assertEqual(self.counts()['news'], 0)
+
+    def test_reconcile_fixes_drift(self):
+        create_article('first', self.news)
+        Category.objects.filter(slug='news').update(child_count=7)
+        output = io.StringIO()
+        call_command('reconcile_child_counts', stdout=output)
+        self.assertIn('2 categories recounted, 1 corrected', output.getvalue())
+        self.assertEqual(self.counts(), {'news': 1, 'travel': 0})
+
+    def test_category_list_does_not_read_articles(self):
+        for i in range(3):
+            create_article(f'article-{i}', self.news)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('articles-categories'))
+        self.assertContains(response, 'news')
+        self.assertFalse([query for query in ctx.captured_queries if 'knowledge_base_article' in query['sql']])
+
+        etag = response['ETag']
+        create_article('fresh', self.news)
+        self.assertEqual(self.client.get(reverse('articles-categories'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None, FRAGMENT_STATS_FLUSH_INTERVAL=None)
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('news')
+        cls.articles = [create_article(f'article-{i}', cls.category) for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        # the pages rendered by the other tests
+        fragment_stats.clear()
+
+    def tearDown(self):
+        fragment_stats.clear()
+
+    def counts(self):
+        fragment_stats.flush()
+        counts = fragment_stats.totals().get('article-card', {'hits': 0, 'misses': 0})
+        fragment_stats.reset()
+        return counts
+
+    def get(self):
+        return self.client.get(reverse('articles-category', kwargs={'slug': 'news'}))
+
+    def test_only_changed_cards_are_rendered_again(self):
+        self.get()
+        self.assertEqual(self.counts(), {'hits': 0, 'misses': 3})
+        self.assertContains(self.get(), 'article-1')
+        self.assertEqual(self.counts(), {'hits': 3, 'misses': 0})
+
+        changed = self.articles[1]
+        changed.title = 'changed title'
+        changed.save()
+        Article.objects.filter(pk=self.articles[2].pk).update(views=5)
+        response = self.get()
+        self.assertContains(response, 'changed title')
+        self.assertEqual(self.counts(), {'hits': 1, 'misses': 2})
+
+    def test_cards_follow_generated_thumbnails(self):
+        from services import thumbnails
+
+        image = self.articles[0].image.name
+        self.assertContains(self.get(), f'url(/media/{image})')
+        variant = 'thumbnails/ab/preview.abcdef.640w.jpg'
+        cache.set(thumbnails.cache_key(image), {'source': image, 'width': 1280, 'format': 'jpg',
+                                                'variants': [{'width': 640, 'format': 'jpg', 'name': variant}]}, None)
+        self.assertContains(self.get(), f'url(/media/{variant})', count=3)
+
+    def test_saves_generate_thumbnails(self):
+        from services import thumbnails
+
+        name = 'preview_images/articles/wide.jpg'
+        write_image(name, 1600, 900)
+        with self.assertNoLogs('services.thumbnails'), self.captureOnCommitCallbacks(execute=True):
+            article = create_article('wide', self.articles[0].category, image=name)
+        self.assertRegex(thumbnails.thumbnail_url(article.image, 640), r'^/media/thumbnails/.+\.640w\.jpg$')
+        self.assertRegex(thumbnails.thumbnail_url(PREVIEW_IMAGE, 640), f'^/media/{PREVIEW_IMAGE}$')
+
+    def test_stats_command(self):
+        self.get()
+        self.get()
+        output = io.StringIO()
+        call_command('fragment_cache_stats', reset=True, stdout=output)
+        self.assertRegex(output.getvalue(), r'article-card +3 hits +3 misses +50.0%')
+        self.assertEqual(fragment_stats.totals(), {})
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class WarmupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = create_category('news')
+        create_article('article', cls.category)
+
+    def setUp(self):
+        cache.clear()
+        category_resolver.invalidate()
+        article_ids.invalidate()
+
+    def test_warm_up_fills_the_caches(self):
+        output = io.StringIO()
+        call_command('warmup', stdout=output)
+        for step in ('templates', 'urls', 'connections', 'caches', 'total'):
+            self.assertIn(step, output.getvalue())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(category_resolver.get(slug='news').pk, self.category.pk)
+            article_ids.sample(Category.ARTICLE, 1)
+            homepage_snapshot.get()
+
+    def test_timings_per_step(self):
+        timings = warm_up()
+        self.assertEqual(list(timings), ['templates', 'urls', 'connections', 'caches'])
+        self.assertRegex(timings['templates'][1], r'^\d+ templates$')
+
+    def test_failing_step_does_not_stop_the_others(self):
+        with mock.patch('knowledge_base.warmup.engines.all', side_effect=RuntimeError('broken template')), \
+                self.assertLogs('knowledge_base.warmup', 'ERROR'):
+            timings = warm_up()
+        self.assertEqual(timings['templates'][1], "failed: RuntimeError('broken template')")
+        self.assertRegex(timings['caches'][1], r'^\d+ categories')
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class StoredPathTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category_resolver.invalidate()
+        self.news = create_category('news')
+        self.article = create_article('first', self.news)
+        self.lesson = create_article('lesson', create_category('grammar', Category.HANDBOOK))
+        self.quiz = create_quiz('tenses', create_category('tests', Category.QUIZ))
+
+    def paths(self):
+        return {row.slug: row.path for model in (Article, Quiz) for row in model.objects.all()}
+
+    def test_paths_follow_slugs_and_categories(self):
+        self.assertEqual(self.paths(), {
+            'first': reverse('article', kwargs={'category_slug': 'news', 'slug': 'first'}),
+            'lesson': reverse('lesson', kwargs={'slug': 'lesson'}),
+            'tenses': reverse('quiz', kwargs={'category_slug': 'tests', 'slug': 'tenses'}),
+        })
+        self.article.slug = 'renamed'
+        self.article.save(update_fields=['slug'])
+        self.assertEqual(Article.objects.get(pk=self.article.pk).path, '/articles/news/renamed')
+
+        # one UPDATE per model moves every row of a renamed or retyped category
+        self.news.slug = 'latest'
+        self.news.save()
+        self.assertEqual(self.paths()['renamed'], '/articles/latest/renamed')
+        self.news.type = Category.TOPIC
+        self.news.save()
+        self.assertEqual(self.paths()['renamed'], '/topics/latest/renamed')
+        self.news.delete()
+        self.assertEqual(self.paths()['renamed'], '')
+
+    def test_backfill_fixes_drift(self):
+        Article.objects.update(path='')
+        output = io.StringIO()
+        call_command('backfill_paths', stdout=output)
+        self.assertIn('2 paths updated', output.getvalue())
+        self.assertEqual(self.paths()['first'], '/articles/news/first')
+
+    def test_cards_and_breadcrumbs_use_stored_paths(self):
+        article_ids.invalidate()
+        quiz_ids.invalidate()
+        article_ids.load()
+        quiz_ids.load()
+        with CaptureQueriesContext(connection) as ctx:
+            materials = Article.get_most_raited_materials_by_sections()
+            tests = Quiz.get_most_raited_materials()
+        self.assertEqual(materials['articles'][0]['url'], '/articles/news/first')
+        self.assertEqual(tests[0]['url'], '/quizzes/tests/tenses')
+        self.assertFalse([query for query in ctx.captured_queries if 'knowledge_base_category' in query['sql']])
+
+        response = self.client.get(self.article.path)
+        self.assertEqual(response.context['breadcrumbs'], (
+            ('На главную!', '/'), ('Статьи', '/articles/'), ('news', '/articles/news/'),
+            ('first', '/articles/news/first'),
+        ))
+        response = self.client.get(reverse('articles-category', kwargs={'slug': 'news'}))
+        self.assertContains(response, 'href="/articles/news/first"')
+        self.assertEqual(response.context['breadcrumbs'], (
+            ('На главную!', '/'), ('Статьи', '/articles/'), ('news', '/articles/news/'),
+        ))
+        self.assertEqual(self.client.get(reverse('quizzes-categories')).context['breadcrumbs'],
+                         (('На главную!', '/'), ('Тесты', '/quizzes/')))
+        response = self.client.get(self.quiz.path)
+        self.assertEqual(response.context['breadcrumbs'][1:3],
+                         (('Тесты', '/quizzes/'), ('tests', '/quizzes/tests/')))
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class QueryPlanTests(TestCase):
+    # EXPLAIN of every query the benchmark pages run with cold caches, on a benchmark sized data set with
+    # planner statistics. UPDATE_QUERY_PLANS=1 records the plans of the test database into query_plans.json,
+    # once per database vendor (sqlite for local runs, postgresql for production).
+
+    @classmethod
+    def setUpTestData(cls):
+        from .synthetic import ContentGenerator
+
+        if connection.vendor == 'postgresql':
+            # rows of earlier tests were rolled back but their dead pages stay and count in the costs;
+            # truncating in this transaction starts the tables afresh and is rolled back with it
+            tables = [table for table in connection.introspection.django_table_names(only_existing=True)
+                      if table.startswith('knowledge_base_')]
+            with connection.cursor() as cursor:
+                cursor.execute(f'TRUNCATE {", ".join(tables)} CASCADE')
+        ContentGenerator(articles=2000, seed=1).generate()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        QueryBudgetTests.setUp(self)
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def test_hot_queries_use_indexes(self):
+        from .query_plans import check_plan, collect_plans, load_query_plans, plan_scenarios, save_query_plans
+
+        plans = collect_plans(plan_scenarios(), host='testserver')
+        if os.environ.get('UPDATE_QUERY_PLANS'):
+            save_query_plans(connection.vendor, plans)
+            return
+
+        baselines = load_query_plans().get(connection.vendor)
+        # without a baseline only the scans would be checked, the costs never
+        self.assertIsNotNone(baselines, f'No {connection.vendor} plans recorded, run with UPDATE_QUERY_PLANS=1')
+        problems = [problem for key, plan in plans.items() for problem in check_plan(key, plan, baselines)]
+        self.assertEqual(problems, [], '\n'.join(problems))
+
+    @skipUnless(connection.vendor == 'sqlite', 'sqlite plan format')
+    def test_sqlite_plans_are_parsed(self):
+        from .query_plans import check_plan, explain
+
+        plan = explain('SELECT id FROM knowledge_base_article WHERE time_for_read > %s', [1])
+        self.assertEqual(plan['scans'], ['knowledge_base_article'])
+        self.assertEqual(len(check_plan('page:1', {**plan, 'sql': 'WHERE'}, None)), 1)
+        plan = explain('SELECT id FROM knowledge_base_article WHERE slug = %s', ['a'])
+        self.assertEqual(plan['scans'], [])
+        self.assertEqual(check_plan('page:1', {**plan, 'sql': 'WHERE'}, {'page:1': plan}), [])
+        self.assertEqual(len(check_plan('page:1', {**plan, 'indexes': [], 'sql': 'WHERE'}, {'page:1': plan})), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'postgresql plan format')
+    def test_postgresql_plans_are_parsed(self):
+        from .query_plans import check_plan, explain
+
+        plan = explain('SELECT id FROM knowledge_base_article WHERE time_for_read > %s', [1])
+        self.assertEqual(plan['scans'], ['knowledge_base_article'])
+        # the quiz table is small enough for a seq scan, but it has an index for the lookup
+        plan = explain('SELECT id FROM knowledge_base_quiz WHERE id IN (%s)', [1])
+        self.assertEqual(plan['scans'], [])
+        self.assertEqual(check_plan('page:1', {**plan, 'sql': 'WHERE'}, {'page:1': plan}), [])
+        self.assertEqual(len(check_plan('page:1', {**plan, 'cost': plan['cost'] * 2, 'sql': 'WHERE'},
+                                        {'page:1': plan})), 1)
+
+
+def seed_content():
+    categories = {type: create_category(f'seed-{type.lower()}', type) for type, _ in Category.TYPE_CHOICES}
+    articles = {}
+    for type in (Category.TOPIC, Category.PHRASEBOOK, Category.ARTICLE):
+        articles[type] = [create_article(f'seed-{type.lower()}-{i}', categories[type]) for i in range(4)]
+
+    lesson = None
+    for i in range(4):
+        lesson = create_article(f'seed-lesson-{i}', categories[Category.HANDBOOK], parent=lesson)
+        articles.setdefault(Category.HANDBOOK, []).append(lesson)
+
+    quizzes = [create_quiz(f'seed-quiz-{i}', categories[Category.QUIZ]) for i in range(4)]
+    for quiz in quizzes:
+        for number in range(1, 4):
+            question = Question.objects.create(number=number, content=f'question {number}', quiz=quiz)
+            Answer.objects.bulk_create([Answer(content=f'answer {i}', correct=i == 0, question=question)
+                                        for i in range(3)])
+        QuizResult.objects.create(min_value=0, max_value=3, content='result', quiz=quiz)
+    return categories, articles, quizzes
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class QueryBudgetTests(TestCase):
+    # Every named url is requested with cold caches. A view fails when it issues more queries than its
+    # budget in query_budgets.json or repeats one query shape more often than the budget allows.
+    # UPDATE_QUERY_BUDGETS=1 rewrites the file with the measured numbers.
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories, cls.articles, cls.quizzes = seed_content()
+
+    def setUp(self):
+        cache.clear()
+        article_ids.invalidate()
+        quiz_ids.invalidate()
+        category_resolver.invalidate()
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def request_for(self, name):
+        def slug_of(type):
+            return self.categories[type].slug
+
+        def detail(type):
+            return {'category_slug': slug_of(type), 'slug': self.articles[type][0].slug}
+
+        kwargs = {
+            'lesson': {'slug': self.articles[Category.HANDBOOK][1].slug},
+            'topics': {'slug': slug_of(Category.TOPIC)},
+            'topic': detail(Category.TOPIC),
+            'phrasebook-category': {'slug': slug_of(Category.PHRASEBOOK)},
+            'phrase-article': detail(Category.PHRASEBOOK),
+            'articles-category': {'slug': slug_of(Category.ARTICLE)},
+            'article': detail(Category.ARTICLE),
+            'quizzes-category': {'slug': slug_of(Category.QUIZ)},
+            'quiz': {'category_slug': slug_of(Category.QUIZ), 'slug': self.quizzes[0].slug},
+            'quiz-submit': {'category_slug': slug_of(Category.QUIZ), 'slug': self.quizzes[0].slug},
+            'sitemap-shard': {'section': 'articles', 'shard': self.articles[Category.ARTICLE][0].id // 5000},
+            'feed-rss': {'section': 'articles'},
+            'feed-atom': {'section': 'articles'},
+        }
+        params = {
+            'search': {'q': 'seed'},
+        }
+        return reverse(name, kwargs=kwargs.get(name)), params.get(name, {})
+
+    def test_views_stay_within_query_budgets(self):
+        from .query_audit import QueryAudit, load_query_budgets, save_query_budgets
+        from .urls import urlpatterns
+
+        budgets = load_query_budgets()
+        measured = {}
+        for pattern in urlpatterns:
+            name = pattern.name
+            path, params = self.request_for(name)
+            self.setUp()
+            with QueryAudit() as audit:
+                if name == 'quiz-submit':
+                    response = self.client.post(path, {'answers': {}}, content_type='application/json')
+                else:
+                    response = self.client.get(path, params)
+            self.assertEqual(response.status_code, 200, path)
+            measured[name] = {'queries': audit.count, 'repeated': sum(count - 1 for count in audit.repeated.values())}
+
+            if os.environ.get('UPDATE_QUERY_BUDGETS'):
+                continue
+            with self.subTest(name):
+                self.assertIn(name, budgets, f'{name} has no query budget')
+                budget = budgets[name]
+                self.assertLessEqual(audit.count, budget['queries'], f'{path}: {audit.report()}')
+                self.assertLessEqual(measured[name]['repeated'], budget['repeated'],
+                                     f'{path} repeats queries (N+1?): {audit.report()}')
+
+        if os.environ.get('UPDATE_QUERY_BUDGETS'):
+            save_query_budgets(measured)
+
+    def test_query_shapes_ignore_parameters(self):
+        from .query_audit import repeated_shapes
+
+        queries = [{'sql': "SELECT * FROM t WHERE id = 1 AND slug = 'a'"},
+                   {'sql': "SELECT * FROM t WHERE id = 22 AND slug = 'it''s'"},
+                   {'sql': 'SELECT * FROM t WHERE id IN (1, 2, 3)'},
+                   {'sql': 'SELECT * FROM t WHERE id IN (4)'}]
+        self.assertEqual(list(repeated_shapes(queries).values()), [2, 2])
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class BenchmarkTests(TestCase):
+    def test_generator_and_runner(self):
+        from .benchmarks import run_benchmark, compare
+        from .synthetic import ContentGenerator
+
+        ContentGenerator(articles=40, quizzes=3, categories_per_type=2, content_words=50, batch_size=16).generate()
+        self.assertEqual(Article.objects.count(), 40)
+        self.assertEqual(Answer.objects.filter(question__quiz__slug='syn-quiz-0').count(), 40)
+        lessons = Article.objects.filter(category__type=Category.HANDBOOK)
+        self.assertEqual(lessons.filter(parent__isnull=True).count(), 2)
+
+        results = run_benchmark(requests=3, warmup=1)
+        view_counter.clear()
+        self.assertTrue(all(result['status'] == 200 for result in results.values()), results)
+        self.assertIn('quiz', results)
+
+        slower = {name: {**result, 'p99_ms': result['p99_ms'] * 2} for name, result in results.items()}
+        self.assertTrue(compare(slower, results)['index']['p99_ms'][3])
+        self.assertFalse(compare(results, slower)['index']['p99_ms'][3])
+
+    def test_category_size_runner(self):
+        from .benchmarks import run_category_size_benchmark
+
+        results = run_category_size_benchmark([30], requests=2, warmup=1)
+        self.assertEqual(Article.objects.filter(category__slug='size30-art-0').count(), 30)
+        self.assertEqual({name: result['status'] for name, result in results[30].items()},
+                         {'first': 200, 'deep': 200, 'json': 200, 'not-modified': 304})
+
+
+@override_settings(VIEWS_FLUSH_INTERVAL=None, HOMEPAGE_SNAPSHOT_MAX_AGE=None)
+class AsyncViewTests(TransactionTestCase):
+    # The async twins answer like the sync views. A TransactionTestCase, the homepage snapshot is read
+    # by threads with their own connections.
+    sync_only = ('quiz-submit', 'search', 'sitemap', 'sitemap-shard', 'feed-rss', 'feed-atom')
+
+    def setUp(self):
+        QueryBudgetTests.setUp(self)
+        self.categories, self.articles, self.quizzes = seed_content()
+        self.paths = [QueryBudgetTests.request_for(self, pattern.name) for pattern in stack_urlconf('async').urlpatterns
+                      if pattern.name not in self.sync_only]
+
+    def tearDown(self):
+        view_counter.clear()
+
+    def normalize(self, response):
+        return re.sub(rb'"shuffle_seed": \d+|\d+', b'', response.content)
+
+    async def test_async_views_render_the_same_pages(self):
+        for path, params in self.paths:
+            expected = await sync_to_async(self.client.get)(path, params)
+            with override_settings(ROOT_URLCONF=stack_urlconf('async')):
+                response = await self.async_client.get(path, params)
+                # AsyncClient takes raw header names
+                not_modified = await self.async_client.get(path, params, **{'if-none-match': response['ETag']})
+            self.assertEqual(response.status_code, 200, path)
+            self.assertEqual(self.normalize(response), self.normalize(expected), path)
+            self.assertEqual(not_modified.status_code, 304, path)
+
+    async def test_missing_rows_and_bad_cursors(self):
+        with override_settings(ROOT_URLCONF=stack_urlconf('async')):
+            for path in ('/articles/missing/', '/articles/seed-art/missing', '/handbook/missing/',
+                         '/quizzes/seed-quiz/missing'):
+                self.assertEqual((await self.async_client.get(path)).status_code, 404, path)
+            response = await self.async_client.get('/articles/seed-art/', {'cursor': '!!'})
+            self.assertEqual(response.status_code, 400)
+            response = await self.async_client.get('/articles/seed-art/', {'format': 'json'})
+            self.assertEqual(json.loads(response.content)['next'], None)
+
+    def test_load_test_runs_both_stacks(self):
+        from .benchmarks import run_load_test
+
+        scenarios = {
+            'index': (reverse('index'), {}),
+            'article': (reverse('article', kwargs={'category_slug': 'seed-art', 'slug': 'seed-art-0'}), {}),
+        }
+        results = run_load_test(scenarios, concurrency=2, requests=4, warmup=2)
+        for name in scenarios:
+            self.assertEqual(set(results[name]), {'sync', 'async'})
+            self.assertTrue(all(result['throughput_rps'] > 0 and result['peak_memory_kib'] > 0
+                                for result in results[name].values()))
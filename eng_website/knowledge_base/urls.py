@@ -1,24 +1,36 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import (IndexView, HandbookTopicsListView, LessonDetailView, TopicsCategoriesListView,
-                    TopicsListView, TopicDetailView, PhrasebookCategoriesListView, PhrasesArticlesListView,
-                    PhrasesArticleDetailView, ArticleCategoriesListView, ArticlesListView, ArticleDetailView,
-                    QuizCategoriesListView, QuizzesListView, QuizDetailView)
+from . import async_views, views
+from .feeds import AtomSectionFeed, SectionFeed
 
-urlpatterns = [
-    path('', IndexView.as_view(), name='index'),
-    path('handbook/', HandbookTopicsListView.as_view(), name='handbook'),
-    path('handbook/<slug:slug>/', LessonDetailView.as_view(), name='lesson'),
-    path('topics/', TopicsCategoriesListView.as_view(), name='topics-categories'),
-    path('topics/<slug:slug>/', TopicsListView.as_view(), name='topics'),
-    path('topics/<slug:category_slug>/<slug:slug>', TopicDetailView.as_view(), name='topic'),
-    path('phrasebook/', PhrasebookCategoriesListView.as_view(), name='phrasebook-categories'),
-    path('phrasebook/<slug:slug>/', PhrasesArticlesListView.as_view(), name='phrasebook-category'),
-    path('phrasebook/<slug:category_slug>/<slug:slug>', PhrasesArticleDetailView.as_view(), name='phrase-article'),
-    path('articles/', ArticleCategoriesListView.as_view(), name='articles-categories'),
-    path('articles/<slug:slug>/', ArticlesListView.as_view(), name='articles-category'),
-    path('articles/<slug:category_slug>/<slug:slug>', ArticleDetailView.as_view(), name='article'),
-    path('quizzes/', QuizCategoriesListView.as_view(), name='quizzes-categories'),
-    path('quizzes/<slug:slug>/', QuizzesListView.as_view(), name='quizzes-category'),
-    path('quizzes/<slug:category_slug>/<slug:slug>', QuizDetailView.as_view(), name='quiz'),
-]
+
+def build_urlpatterns(views):
+    # views is knowledge_base.views or its async twins in knowledge_base.async_views
+    return [
+        path('', views.IndexView.as_view(), name='index'),
+        path('handbook/', views.HandbookTopicsListView.as_view(), name='handbook'),
+        path('handbook/<slug:slug>/', views.LessonDetailView.as_view(), name='lesson'),
+        path('topics/', views.TopicsCategoriesListView.as_view(), name='topics-categories'),
+        path('topics/<slug:slug>/', views.TopicsListView.as_view(), name='topics'),
+        path('topics/<slug:category_slug>/<slug:slug>', views.TopicDetailView.as_view(), name='topic'),
+        path('phrasebook/', views.PhrasebookCategoriesListView.as_view(), name='phrasebook-categories'),
+        path('phrasebook/<slug:slug>/', views.PhrasesArticlesListView.as_view(), name='phrasebook-category'),
+        path('phrasebook/<slug:category_slug>/<slug:slug>', views.PhrasesArticleDetailView.as_view(),
+             name='phrase-article'),
+        path('articles/', views.ArticleCategoriesListView.as_view(), name='articles-categories'),
+        path('articles/<slug:slug>/', views.ArticlesListView.as_view(), name='articles-category'),
+        path('articles/<slug:category_slug>/<slug:slug>', views.ArticleDetailView.as_view(), name='article'),
+        path('quizzes/', views.QuizCategoriesListView.as_view(), name='quizzes-categories'),
+        path('quizzes/<slug:slug>/', views.QuizzesListView.as_view(), name='quizzes-category'),
+        path('quizzes/<slug:category_slug>/<slug:slug>', views.QuizDetailView.as_view(), name='quiz'),
+        path('quizzes/<slug:category_slug>/<slug:slug>/submit', views.QuizSubmitView.as_view(), name='quiz-submit'),
+        path('search/', views.SearchView.as_view(), name='search'),
+        path('sitemap.xml', views.SitemapIndexView.as_view(), name='sitemap'),
+        path('sitemaps/<slug:section>/<int:shard>.xml', views.SitemapShardView.as_view(), name='sitemap-shard'),
+        path('feeds/<slug:section>/rss.xml', SectionFeed(), name='feed-rss'),
+        path('feeds/<slug:section>/atom.xml', AtomSectionFeed(), name='feed-atom'),
+    ]
+
+
+urlpatterns = build_urlpatterns(async_views if getattr(settings, 'ASYNC_VIEWS', False) else views)
@@ -0,0 +1,124 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction, DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    # Flush runs on a daemon timer `flush_interval` seconds after the first buffered write.
+    # With the interval set to None only explicit flush() calls (and the exit hook) write.
+    flush_interval_setting = None
+    default_flush_interval = 10
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timer = None
+        self._pending = self._empty()
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, self.flush_interval_setting, self.default_flush_interval)
+
+    def _empty(self):
+        raise NotImplementedError
+
+    def _merge(self, pending):
+        raise NotImplementedError
+
+    def _write(self, pending):
+        raise NotImplementedError
+
+    def _schedule_flush(self):
+        interval = self.flush_interval
+        if interval is None or self._timer is not None:
+            return
+        self._timer = threading.Timer(interval, self._flush_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_in_background(self):
+        # the connections a timer thread opens are its own and nothing else would ever close them
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, self._empty()
+            self._timer = None
+        if not pending:
+            return 0
+
+        try:
+            self._write(pending)
+        except DatabaseError:
+            logger.exception('%s flush failed, keeping writes for the next flush', self.__class__.__name__)
+            with self._lock:
+                self._merge(pending)
+            return 0
+        return len(pending)
+
+    def clear(self):
+        with self._lock:
+            self._pending = self._empty()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+class ViewCounter(WriteBehindBuffer):
+    # Hits are summed per row and written as `views = views + n`, one UPDATE per (model, n) group.
+    # The same flush appends the per-day totals to the ViewStat rollups.
+    flush_interval_setting = 'VIEWS_FLUSH_INTERVAL'
+
+    def _empty(self):
+        return Counter()
+
+    def _merge(self, pending):
+        self._pending.update(pending)
+
+    def record(self, model, pk, count=1):
+        day = timezone.localdate()
+        with self._lock:
+            self._pending[(model._meta.concrete_model, pk, day)] += count
+            self._schedule_flush()
+
+    def pending_for(self, model, pk):
+        model = model._meta.concrete_model
+        with self._lock:
+            return sum(count for (m, p, _), count in self._pending.items() if m is model and p == pk)
+
+    def _write(self, pending):
+        from .models import Category, ViewStat
+
+        totals = Counter()
+        for (model, pk, _), count in pending.items():
+            totals[(model, pk)] += count
+
+        pks_by_model_and_count = defaultdict(list)
+        for (model, pk), count in totals.items():
+            pks_by_model_and_count[(model, count)].append(pk)
+
+        pks_by_model = defaultdict(list)
+        for model, pk in totals:
+            pks_by_model[model].append(pk)
+
+        with transaction.atomic():
+            for (model, count), pks in pks_by_model_and_count.items():
+                model.objects.filter(pk__in=pks).update(views=F('views') + count)
+            # the list pages show the counts, so their validators move once per flush rather than per view
+            for model, pks in pks_by_model.items():
+                Category.touch_items(model.objects.filter(pk__in=pks).values('category_id'))
+            ViewStat.add_daily_hits(pending)
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
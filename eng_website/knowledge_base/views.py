@@ -1,17 +1,198 @@
-from django.http import Http404
+import hashlib
+import json
+import random
+from datetime import datetime, timezone
+
+from django.core.exceptions import BadRequest
+from django.db.models import Count, Max, Sum
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.functional import cached_property
+from django.utils.http import http_date, quote_etag
 from django.utils.translation import gettext as _
 from django.views.generic.detail import DetailView
-from django.views.generic import TemplateView
+from django.views.generic import TemplateView, View
 from django.views.generic.list import ListView
 
+from .attempt_log import attempt_log
+from .bulk_export import export_ndjson, parse_since
 from .models import Category, HandbookCategory, Article, Lesson, TopicCategory, Topic, PhrasesCategory, \
-    PhrasesArticle, ArticleCategory, QuizCategory, Quiz
+    PhrasesArticle, ArticleCategory, QuizCategory, Quiz, QuizAttempt, AttemptAnswer
+from .identity_map import category_resolver, get_or_load
+from .pagination import InvalidCursor, keyset_page
+from .quiz_payloads import quiz_payloads, grade, result_for
+from .search import SearchResults
+from .sitemaps import SECTIONS, site_url, sitemaps
+from .snapshots import homepage_snapshot
+from .view_counter import view_counter
 
 
-class IndexView(TemplateView):
+SITEMAP_CONTENT_TYPE = 'application/xml; charset=utf-8'
+
+
+class ConditionalGetMixin:
+    # Answers If-None-Match / If-Modified-Since with 304 before the object is loaded or anything is rendered.
+    # get_validators() returns (parts, last_modified): the ETag is a hash of the parts, so it should include
+    # everything shown on the page that can change without updated_at moving (e.g. views).
+
+    def get_validators(self):
+        return None
+
+    def not_modified(self):
+        pass
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        validators = self.get_validators()
+        if validators is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, timestamp = validator_headers(validators)
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        elif response.status_code == 304:
+            self.not_modified()
+        return add_validator_headers(response, etag, timestamp)
+
+
+def validator_headers(validators):
+    parts, last_modified = validators
+    etag = quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp
+
+
+def add_validator_headers(response, etag, timestamp):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        if timestamp is not None:
+            response.headers.setdefault('Last-Modified', http_date(timestamp))
+        # browsers keep the page but revalidate on every visit
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+class KeysetPaginationMixin:
+    # Lists are paged by a cursor over an indexed ordering instead of OFFSET, the page links to ?cursor=...
+    # With ?format=json the view answers {"html": rendered grid items, "next": cursor} for infinite scroll.
+    ordering = ('-views', '-id')
+    page_size = 24
+    fragment_template_name = None
+    next_cursor = None
+
+    def paginate_keyset(self, queryset):
+        try:
+            items, self.next_cursor = keyset_page(queryset, self.ordering, self.request.GET.get('cursor'),
+                                                  self.page_size)
+        except InvalidCursor:
+            raise BadRequest('Invalid cursor')
+        return items
+
+    def get_fragment_context(self, context):
+        return {}
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.GET.get('format') != 'json':
+            return super().render_to_response(context, **response_kwargs)
+        html = render_to_string(self.fragment_template_name, self.get_fragment_context(context), self.request)
+        return JsonResponse({'html': html, 'next': self.next_cursor})
+
+
+def latest(*dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def category_aggregates(related):
+    # one aggregate over the categories and the rows they list
+    return {
+        'categories': Count('id', distinct=True),
+        'updated': Max('updated_at'),
+        'items': Count(related),
+        'items_updated': Max(f'{related}__updated_at'),
+        'items_views': Sum(f'{related}__views'),
+    }
+
+
+def category_validators_from(data):
+    return tuple(data.values()), latest(data['updated'], data['items_updated'])
+
+
+def category_validators(queryset, related):
+    return category_validators_from(queryset.aggregate(**category_aggregates(related)))
+
+
+# the category cards only show the category and its stored counter, so the rows they list are not read
+CATEGORY_LIST_VALIDATOR_FIELDS = ('id', 'updated_at', 'child_count')
+
+
+def category_list_validators_from(rows):
+    rows = tuple(rows)
+    return rows, latest(*(updated_at for _, updated_at, _ in rows))
+
+
+ITEMS_LIST_VALIDATOR_FIELDS = ('id', 'updated_at', 'child_count', 'items_updated_at')
+
+
+# what object_validators reads, a revalidated detail page loads no other column
+DETAIL_VALIDATOR_FIELDS = ('id', 'updated_at', 'views', 'category')
+
+
+def load_by_slug(queryset, slug, key='slug'):
+    # read once per request under the key, the category comes from the resolver
+    def load():
+        obj = queryset.filter(slug=slug).first()
+        if obj is not None and obj.category_id is not None:
+            obj.category = category_resolver.get(pk=obj.category_id)
+        return obj
+
+    return get_or_load((queryset.model, key, slug), load)
+
+
+def detail_crumbs(section_name, category_title, title, path):
+    # from the stored path of the page, /<section>/<category>/<slug>: the category and section pages are its parents
+    category_url = path.rpartition('/')[0] + '/'
+    section_url = category_url[:-1].rpartition('/')[0] + '/'
+    return (
+        ('На главную!', '/'),
+        (section_name, section_url),
+        (category_title, category_url),
+        (title, path),
+    )
+
+
+def section_crumbs(section_name, section_url_name):
+    return (('На главную!', '/'), (section_name, reverse(section_url_name)))
+
+
+def snapshot_validators(snapshot):
+    built_at = datetime.fromtimestamp(snapshot['built_at'], tz=timezone.utc)
+    return (snapshot['version'], snapshot['built_at']), built_at
+
+
+def object_validators(obj):
+    category_updated_at = obj.category.updated_at if obj.category_id else None
+    return (obj.pk, obj.updated_at, obj.views, category_updated_at), latest(obj.updated_at, category_updated_at)
+
+
+class IndexView(ConditionalGetMixin, TemplateView):
     template_name = 'base.html'
+    snapshot = None
+
+    def get_validators(self):
+        self.snapshot = homepage_snapshot.get()
+        return snapshot_validators(self.snapshot)
 
     def get_context_data(self, **kwargs):
         kwargs.setdefault("view", self)
@@ -21,74 +202,88 @@ class IndexView(TemplateView):
         return kwargs
 
     def add_template_data(self, context):
-        context['large_feed'] = Article.get_large_feed_data()
-        materials_by_sections = Article.get_most_raited_materials_by_sections()
-        materials_by_sections['tests'] = Quiz.get_most_raited_materials()
-        context['materials_by_sections'] = materials_by_sections
+        snapshot = self.snapshot or homepage_snapshot.get()
+        context['large_feed'] = snapshot['large_feed']
+        context['materials_by_sections'] = snapshot['materials_by_sections']
 
 
-class HandbookTopicsListView(ListView):
+class HandbookTopicsListView(ConditionalGetMixin, ListView):
     home_label = _("На главную!")
     template_name = "knowledge_base/handbook/topics.html"
 
     def get_queryset(self):
         return HandbookCategory.objects.none()
 
+    def get_validators(self):
+        return category_validators(Category.objects.filter(type=Category.HANDBOOK), 'articles')
+
+    def get_topics(self):
+        return HandbookCategory.get_topics_with_lessons()
+
     @cached_property
     def get_crumbs(self):
         return (('На главную!', '/'), ('Справочник', reverse("handbook")))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["topics"] = HandbookCategory.get_topics_with_lessons()
+        context["topics"] = self.get_topics()
         context['breadcrumbs'] = self.get_crumbs
         return context
 
 
-class DetailViewWithViewsIncrement(DetailView):
+class DetailViewWithViewsIncrement(ConditionalGetMixin, DetailView):
     model = Article
     section_name = None
+    validated_pk = None
 
-    def get_object(self, queryset=None):
-        if queryset is None:
-            queryset = self.get_queryset()
+    def get_queryset(self):
+        # pages print compiled_content, the source html is only read for rows not compiled yet
+        return super().get_queryset().defer('content')
 
-        pk = self.kwargs.get(self.pk_url_kwarg)
+    def get_slug(self):
         slug = self.kwargs.get(self.slug_url_kwarg)
-        if pk is not None:
-            queryset = queryset.filter(pk=pk)
-
-        if slug is not None and (pk is None or self.query_pk_and_slug):
-            slug_field = self.get_slug_field()
-            queryset = queryset.filter(**{slug_field: slug})
-
-        if pk is None and slug is None:
+        if slug is None:
             raise AttributeError(
-                "Generic detail view %s must be called with either an object "
-                "pk or a slug in the URLconf." % self.__class__.__name__
+                "Generic detail view %s must be called with an object slug in the URLconf." % self.__class__.__name__
             )
+        return slug
 
-        try:
-            obj = queryset.get()
-            obj.views += 1
-            obj.save()
-        except queryset.model.DoesNotExist:
+    def load_object(self):
+        return load_by_slug(self.get_queryset(), self.get_slug())
+
+    def validators_queryset(self):
+        return self.model._default_manager.only(*DETAIL_VALIDATOR_FIELDS)
+
+    def get_validators(self):
+        # the page itself is only loaded when it is rendered
+        obj = load_by_slug(self.validators_queryset(), self.get_slug(), key='validators')
+        if obj is None:
+            return None
+        self.validated_pk = obj.pk
+        return object_validators(obj)
+
+    def not_modified(self):
+        # a revalidated page is still a view
+        view_counter.record(self.model, self.validated_pk)
+
+    def get_object(self, queryset=None):
+        obj = self.load_object()
+        if obj is None:
             raise Http404(
                 _("No %(verbose_name)s found matching the query")
-                % {"verbose_name": queryset.model._meta.verbose_name}
+                % {"verbose_name": self.model._meta.verbose_name}
             )
+        return self.count_view(obj)
+
+    def count_view(self, obj):
+        view_counter.record(self.model, obj.pk)
+        obj.views += 1
         return obj
 
     def add_crumbs(self, context):
         context_name = self.context_object_name or self.model._meta.model_name
         object = context[context_name]
-        _, section_slug, category_slug, detail_slug = self.request.path.split('/')
-        context['breadcrumbs'] = (
-            ('На главную!', '/'),
-            (self.section_name, f'/{section_slug}'),
-            (object.category.title, f'/{section_slug}/{category_slug}'),
-            (object.title, f'/{section_slug}/{category_slug}/{detail_slug}'),
-        )
+        context['breadcrumbs'] = detail_crumbs(self.section_name, object.category.title, object.title, object.path)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -96,12 +291,29 @@ class DetailViewWithViewsIncrement(DetailView):
         return context
 
 
-class LessonDetailView(DetailView):
+class LessonDetailView(ConditionalGetMixin, DetailView):
     model = Lesson
     template_name = 'knowledge_base/handbook/lesson.html'
 
+    aggregates = {
+        'updated': Max('updated_at'),
+        'parent_updated': Max('parent__updated_at'),
+        'children': Count('child_article'),
+        'children_updated': Max('child_article__updated_at'),
+    }
+
+    def get_validators(self):
+        return self.validators_from(
+            self.model.objects.filter(slug=self.kwargs.get(self.slug_url_kwarg)).aggregate(**self.aggregates))
+
+    @staticmethod
+    def validators_from(data):
+        if data['updated'] is None:
+            return None
+        return tuple(data.values()), latest(data['updated'], data['parent_updated'], data['children_updated'])
+
     def get_queryset(self):
-        return self.model.objects.select_related('parent').prefetch_related('child_article')
+        return self.model.objects.defer('content').select_related('parent').prefetch_related('child_article')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -115,7 +327,7 @@ class LessonDetailView(DetailView):
         context['breadcrumbs'] = (
             ('На главную!', '/'),
             ('Справочник', reverse("handbook")),
-            (object.title, reverse("lesson", kwargs={'slug': object.slug}))
+            (object.title, object.path)
         )
 
     def add_previous_and_next_ancestor_urls(self, context):
@@ -126,20 +338,27 @@ class LessonDetailView(DetailView):
         context['previous_url'] = reverse("lesson", kwargs={'slug': object.parent.slug}) if object.parent else None
 
 
-class CategoriesBaseListView(ListView):
+class CategoriesBaseListView(ConditionalGetMixin, KeysetPaginationMixin, ListView):
     type = None
     model = Category
     section_name = None
+    ordering = ('id',)
+    fragment_template_name = 'knowledge_base/grid_categories_items.html'
+    item_url_name = None
+    section_url_name = None
 
     def get_queryset(self):
-        return self.model.all_with_child_count(self.type)
+        return self.paginate_keyset(self.model.all_with_child_count(self.type))
+
+    def get_fragment_context(self, context):
+        return {'categories': self.object_list, 'pattern_name': self.item_url_name}
+
+    def get_validators(self):
+        queryset = self.model.objects.filter(type=self.type or self.model.proxy_type)
+        return category_list_validators_from(queryset.values_list(*CATEGORY_LIST_VALIDATOR_FIELDS))
 
     def add_crumbs(self, context):
-        index, section_slug, category = self.request.path.split('/')
-        context['breadcrumbs'] = (
-            ('На главную!', '/'),
-            (self.section_name, f'/{section_slug}'),
-        )
+        context['breadcrumbs'] = section_crumbs(self.section_name, self.section_url_name)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -151,29 +370,58 @@ class TopicsCategoriesListView(CategoriesBaseListView):
     context_object_name = 'categories'
     model = TopicCategory
     template_name = 'knowledge_base/topics/categories.html'
+    item_url_name = 'topics'
+    section_url_name = 'topics-categories'
     section_name = 'Топики'
 
 
-class ArticlesBaseListView(ListView):
+class ArticlesBaseListView(ConditionalGetMixin, KeysetPaginationMixin, ListView):
     model = Article
     category_model = Category
     section_name = 'Статьи'
+    section_url_name = 'articles-categories'
+    category_url_name = 'articles-category'
+    fragment_template_name = 'knowledge_base/grid_articles_items.html'
+    # the grid only shows the preview fields
+    deferred_fields = ('content', 'compiled_content')
 
     def get_queryset(self):
-        return self.model.all_in_category(self.kwargs.get('slug'))
+        queryset = self.model.objects.filter(category_id=self.category.pk).defer(*self.deferred_fields)
+        return self.paginate_keyset(queryset)
+
+    def get_fragment_context(self, context):
+        return {'articles': self.object_list}
+
+    @cached_property
+    def category(self):
+        category = category_resolver.get(slug=self.kwargs.get('slug'))
+        if category is None:
+            raise Http404(_("No %(verbose_name)s found matching the query")
+                          % {"verbose_name": self.category_model._meta.verbose_name})
+        return category
+
+    def validators_queryset(self):
+        # one row whatever the category's size: its counter and the time a listed row last changed, which saves
+        # and view counter flushes store on it (Category.touch_items); the resolved category may be stale
+        return Category.objects.filter(pk=self.category.pk).values_list(*ITEMS_LIST_VALIDATOR_FIELDS)
+
+    def get_validators(self):
+        return self.validators_from(self.validators_queryset().first())
+
+    def validators_from(self, row):
+        if row is None:
+            return None
+        _, updated_at, _, items_updated_at = row
+        return row, latest(updated_at, items_updated_at)
 
     def add_crumbs(self, context):
-        _, section_slug, category, _ = self.request.path.split('/')
-        category_obj = self.category_model.objects.get(slug=category)
-        context['breadcrumbs'] = (
-            ('На главную!', '/'),
-            (self.section_name, f'/{section_slug}'),
-            (category_obj.title, f'/{section_slug}/{category}'),
-        )
+        category_url = reverse(self.category_url_name, kwargs={'slug': self.category.slug})
+        context['breadcrumbs'] = section_crumbs(self.section_name, self.section_url_name) + \
+            ((self.category.title, category_url),)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["category"] = self.category_model.objects.get(slug=self.kwargs.get('slug'))
+        context["category"] = self.category
         self.add_crumbs(context)
         return context
 
@@ -184,6 +432,8 @@ class TopicsListView(ArticlesBaseListView):
     category_model = TopicCategory
     template_name = 'knowledge_base/topics/topics.html'
     section_name = 'Топики'
+    section_url_name = 'topics-categories'
+    category_url_name = 'topics'
 
 
 class TopicDetailView(DetailViewWithViewsIncrement):
@@ -196,6 +446,8 @@ class PhrasebookCategoriesListView(CategoriesBaseListView):
     context_object_name = 'categories'
     model = PhrasesCategory
     template_name = 'knowledge_base/phrasebook/categories.html'
+    item_url_name = 'phrasebook-category'
+    section_url_name = 'phrasebook-categories'
     section_name = 'Разговорник'
 
 
@@ -205,6 +457,8 @@ class PhrasesArticlesListView(ArticlesBaseListView):
     category_model = PhrasesCategory
     template_name = 'knowledge_base/phrasebook/phrases_articles.html'
     section_name = 'Разговорник'
+    section_url_name = 'phrasebook-categories'
+    category_url_name = 'phrasebook-category'
 
 
 class PhrasesArticleDetailView(DetailViewWithViewsIncrement):
@@ -218,6 +472,8 @@ class ArticleCategoriesListView(CategoriesBaseListView):
     context_object_name = 'categories'
     model = ArticleCategory
     template_name = 'knowledge_base/articles/categories.html'
+    item_url_name = 'articles-category'
+    section_url_name = 'articles-categories'
     section_name = 'Статьи'
 
 
@@ -236,6 +492,8 @@ class QuizCategoriesListView(CategoriesBaseListView):
     context_object_name = 'categories'
     model = QuizCategory
     template_name = 'knowledge_base/quizzes/categories.html'
+    item_url_name = 'quizzes-category'
+    section_url_name = 'quizzes-categories'
     section_name = 'Тесты'
 
 
@@ -244,47 +502,159 @@ class QuizzesListView(ArticlesBaseListView):
     category_model = QuizCategory
     context_object_name = 'quizzes'
     template_name = 'knowledge_base/quizzes/quizzes.html'
+    deferred_fields = ()
     section_name = 'Тесты'
+    section_url_name = 'quizzes-categories'
+    category_url_name = 'quizzes-category'
 
 
-class QuizDetailView(DetailView):
+class QuizDetailView(ConditionalGetMixin, DetailView):
     model = Quiz
     context_object_name = 'quiz_data'
     template_name = 'knowledge_base/quizzes/quiz.html'
+    validated_pk = None
+    category = None
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        # the CSRF cookie for the submit, sent with 304s as well (a cached page renders no token of its own)
+        get_token(request)
+
+    def load_object(self):
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        return get_or_load((self.model, 'payload', slug), lambda: quiz_payloads.get(slug))
+
+    def get_validators(self):
+        payload = self.load_object()
+        if payload is None:
+            return None
+        return self.validators_from(payload, category_resolver.get(pk=payload['category_id']))
+
+    def validators_from(self, payload, category):
+        # question, answer and result saves touch the quiz, see signals.touch_quiz
+        self.validated_pk = payload['id']
+        category_updated_at = category.updated_at if category else None
+        return (payload['id'], payload['updated_at'], payload['views'], category_updated_at), \
+            latest(payload['updated_at'], category_updated_at)
+
+    def not_modified(self):
+        self.model.increase_views_by_one(self.validated_pk)
 
     def get(self, request, *args, **kwargs):
-        context = self.get_context_data()
-        return self.render_to_response(context)
+        self.object = self.load_object()
+        if self.object is not None:
+            self.category = category_resolver.get(pk=self.object['category_id'])
+        return self.render_to_response(self.get_context_data())
 
-    def add_crumbs(self, context):
-        _, section_slug, category_slug, detail_slug = self.request.path.split('/')
-        object = self.model.objects.select_related('category').get(slug=detail_slug)
-        context['breadcrumbs'] = (
-            ('На главную!', '/'),
-            ('Тесты', f'/{section_slug}'),
-            (object.category.title, f'/{section_slug}/{category_slug}'),
-            (object.title, f'/{section_slug}/{category_slug}/{detail_slug}')
-        )
+    def add_crumbs(self, context, payload):
+        context['breadcrumbs'] = detail_crumbs('Тесты', self.category.title, payload['title'], payload['path'])
 
     def get_context_data(self, **kwargs):
         context = {}
-        slug = self.kwargs.get(self.slug_url_kwarg)
-
-        if slug:
-            try:
-                self.object = self.model.get_quiz_article_data(slug)
-                context[self.context_object_name] = self.object
-                self.model.increase_views_by_one(slug)
+        if self.object is None:
+            raise Http404(
+                _("No %(verbose_name)s found matching the query") % {"verbose_name": self.model._meta.verbose_name})
 
-            except self.model.DoesNotExist:
-                raise Http404(
-                    _("No %(verbose_name)s found matching the query") % {"verbose_name": self.model._meta.verbose_name})
+        context[self.context_object_name] = self.object
+        context['shuffle_seed'] = random.getrandbits(32)
+        context['submit_url'] = reverse('quiz-submit', kwargs=self.kwargs)
+        self.model.increase_views_by_one(self.object['id'])
 
-        else:
-            raise AttributeError(
-                "Generic detail view %s must be called with either an object "
-                "pk or a slug in the URLconf." % self.__class__.__name__
-            )
         context.update(kwargs)
-        self.add_crumbs(context)
+        self.add_crumbs(context, self.object)
         return super().get_context_data(**context)
+
+
+class QuizSubmitView(View):
+    # Grades {"answers": {question id: answer id}} against the cached answer key and queues the attempt.
+    # quiz.js posts with the CSRF cookie the quiz page sets, so only the page itself can add attempts.
+    http_method_names = ['post']
+
+    def post(self, request, *args, **kwargs):
+        payload = quiz_payloads.get(kwargs['slug'])
+        if payload is None:
+            raise Http404(_("No %(verbose_name)s found matching the query") % {"verbose_name": Quiz._meta.verbose_name})
+        try:
+            choices = {int(question): int(answer) for question, answer in json.loads(request.body)['answers'].items()}
+        except (ValueError, TypeError, KeyError, AttributeError):
+            raise BadRequest('Invalid answers')
+
+        score, graded = grade(payload, choices)
+        total = len(payload['answer_key'])
+        attempt = QuizAttempt(quiz_id=payload['id'], score=score, total=total)
+        attempt_log.record(attempt, [
+            AttemptAnswer(attempt=attempt, question_id=question_id, answer_id=answer_id, correct=correct)
+            for question_id, answer_id, correct in graded
+        ])
+
+        result = result_for(payload, score)
+        return JsonResponse({
+            'score': score,
+            'total': total,
+            'result': result['content'] if result else None,
+        })
+
+
+class SearchView(ListView):
+    context_object_name = 'results'
+    template_name = 'knowledge_base/search.html'
+    paginate_by = 10
+
+    def get_queryset(self):
+        return SearchResults(self.request.GET.get('q', '').strip())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.object_list.text
+        context['breadcrumbs'] = (('На главную!', '/'), ('Поиск', reverse('search')))
+        return context
+
+
+class SitemapIndexView(ConditionalGetMixin, View):
+    shards = None
+
+    def get_validators(self):
+        self.shards = sitemaps.index()
+        return tuple(self.shards), latest(*(lastmod for _, _, lastmod in self.shards))
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(sitemaps.render_index(self.shards, site_url(request)), content_type=SITEMAP_CONTENT_TYPE)
+
+
+class SitemapShardView(ConditionalGetMixin, View):
+    # a cached shard is sent as is, a changed one is streamed while it is rendered, see sitemaps.Sitemaps
+    section = None
+    entry = None
+    fingerprint = None
+
+    def get_validators(self):
+        self.section = SECTIONS.get(self.kwargs['section'])
+        if self.section is None:
+            raise Http404('Unknown sitemap')
+        self.entry, self.fingerprint = sitemaps.lookup(self.section, self.kwargs['shard'], site_url(self.request))
+        rows, *dates = self.fingerprint
+        if not rows:
+            raise Http404('Empty sitemap')
+        return self.fingerprint, latest(*dates)
+
+    def get(self, request, *args, **kwargs):
+        if self.entry is not None:
+            return HttpResponse(self.entry['content'], content_type=SITEMAP_CONTENT_TYPE)
+        return StreamingHttpResponse(
+            sitemaps.render_shard(self.section, self.kwargs['shard'], site_url(request), self.fingerprint),
+            content_type=SITEMAP_CONTENT_TYPE)
+
+
+class BulkExportView(View):
+    # staff only, see eng_website/urls.py
+
+    def get(self, request, *args, **kwargs):
+        since = request.GET.get('since')
+        try:
+            since = parse_since(since) if since else None
+        except ValueError:
+            raise BadRequest('Invalid since')
+
+        response = StreamingHttpResponse(export_ndjson(since), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="knowledge-base.ndjson"'
+        return response
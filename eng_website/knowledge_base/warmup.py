@@ -0,0 +1,83 @@
+import logging
+import time
+from pathlib import Path
+
+from django.db import connections, DatabaseError
+from django.template import engines
+from django.urls import get_resolver, reverse
+
+logger = logging.getLogger(__name__)
+
+
+def compile_templates():
+    # Parsed once into the cached loader of each engine (Django enables it whenever no loaders are
+    # configured, DEBUG included), the views then only render
+    count = 0
+    for engine in engines.all():
+        for directory in engine.dirs:
+            for path in sorted(Path(directory).rglob('*')):
+                if path.is_file():
+                    engine.get_template(path.relative_to(directory).as_posix())
+                    count += 1
+    return f'{count} templates'
+
+
+def prime_urls():
+    # the resolver and its reverse lookup tables are built on first use
+    resolver = get_resolver()
+    count = len(resolver.reverse_dict)
+    reverse('index')
+    return f'{count} url names'
+
+
+def open_connections():
+    # kept open for the worker's first requests by CONN_MAX_AGE; connections belong to the thread that opens
+    # them, so this helps the sync worker's single thread. An unreachable replica is left to the router.
+    opened = 0
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+            opened += 1
+        except DatabaseError:
+            logger.warning('Warmup could not connect to %s', alias, exc_info=True)
+    return f'{opened}/{len(connections.all())} connections'
+
+
+def fill_caches():
+    from .identity_map import category_resolver
+    from .sampling import article_ids, quiz_ids
+    from .sitemaps import sitemaps
+    from .snapshots import homepage_snapshot
+
+    # process-local first, then the shared ones an earlier worker most likely filled already
+    categories = category_resolver.preload()
+    ids = article_ids.load() + quiz_ids.load()
+    homepage_snapshot.get()
+    sitemaps.index()
+    return f'{categories} categories, {ids} ids, homepage, sitemap index'
+
+
+STEPS = (
+    ('templates', compile_templates),
+    ('urls', prime_urls),
+    ('connections', open_connections),
+    ('caches', fill_caches),
+)
+
+
+def warm_up(log=lambda message: None):
+    # runs every step, returns {step: (seconds, what was done)}; called by the warmup command and gunicorn.conf.py.
+    # A failing step is logged and skipped: a cold worker still serves, one that fails to boot stops the deploy.
+    timings = {}
+    started = time.perf_counter()
+    for name, step in STEPS:
+        step_started = time.perf_counter()
+        try:
+            detail = step()
+        except Exception as error:
+            logger.exception('Warmup step %s failed', name)
+            detail = f'failed: {error!r}'
+        timings[name] = (time.perf_counter() - step_started, detail)
+        log(f'{name:12} {timings[name][0] * 1000:>9.1f} ms  {detail}')
+    log(f'{"total":12} {(time.perf_counter() - started) * 1000:>9.1f} ms')
+    return timings
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Reads go to a healthy alias from DATABASE_REPLICAS, writes to the primary ('default'). Reads stay on the
+# primary inside transactions, in requests with an unsafe method, for REPLICA_STICKY_SECONDS after a
+# response that wrote (through a cookie, so the author sees their own save) and inside primary().
+STICKY_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request_state = ContextVar('services_db_router_state', default=None)
+_pinned = ContextVar('services_db_router_pinned', default=False)
+
+
+class ReplicaSet:
+    # An alias is probed at most once per REPLICA_HEALTH_CHECK_INTERVAL seconds; a failed probe takes it
+    # out of rotation for REPLICA_RETRY_INTERVAL seconds. Without a healthy replica reads use the primary.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._down_until = {}
+
+    @property
+    def aliases(self):
+        return getattr(settings, 'DATABASE_REPLICAS', ())
+
+    def probe(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+            return connection.is_usable()
+        except DatabaseError:
+            return False
+
+    def is_healthy(self, alias):
+        now = time.monotonic()
+        with self._lock:
+            if self._down_until.get(alias, 0) > now:
+                return False
+            if now - self._checked_at.get(alias, float('-inf')) < getattr(settings, 'REPLICA_HEALTH_CHECK_INTERVAL', 5):
+                return True
+            self._checked_at[alias] = now
+        if self.probe(alias):
+            return True
+        logger.warning('Replica %s is unavailable, reading from the primary', alias)
+        self.mark_down(alias)
+        return False
+
+    def mark_down(self, alias):
+        with self._lock:
+            self._down_until[alias] = time.monotonic() + getattr(settings, 'REPLICA_RETRY_INTERVAL', 30)
+
+    def reset(self):
+        with self._lock:
+            self._checked_at.clear()
+            self._down_until.clear()
+
+    def choose(self):
+        candidates = list(self.aliases)
+        random.shuffle(candidates)
+        for alias in candidates:
+            if self.is_healthy(alias):
+                return alias
+        return DEFAULT_DB_ALIAS
+
+
+replicas = ReplicaSet()
+
+
+def reads_from_primary():
+    state = _request_state.get()
+    return (_pinned.get() or (state is not None and state['pinned'])
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block)
+
+
+def read_alias():
+    if not replicas.aliases or reads_from_primary():
+        return DEFAULT_DB_ALIAS
+    return replicas.choose()
+
+
+@contextmanager
+def primary():
+    # for reads that fill shared caches right after a write, a lagging replica would cache the old rows
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema through replication
+        return db not in replicas.aliases
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = self.request_state(request)
+        token = _request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.process_response(state, response)
+
+    async def __acall__(self, request):
+        state = self.request_state(request)
+        token = _request_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+        return self.process_response(state, response)
+
+    @staticmethod
+    def request_state(request):
+        return {'pinned': request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES, 'wrote': False}
+
+    @staticmethod
+    def process_response(state, response):
+        if state['wrote']:
+            response.set_cookie(STICKY_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                                httponly=True, samesite='Lax')
+        return response
@@ -1,13 +1,29 @@
-from django.db import connection
+from asgiref.sync import sync_to_async
+from django.db import connections
 
-def dict_fetch_all(sql):
+from .db_router import read_alias
+
+
+def dict_fetch_all(sql, params=None, using=None):
     data = []
-    with connection.cursor() as cursor:
-        cursor.execute(sql)
+    with connections[using or read_alias()].cursor() as cursor:
+        cursor.execute(sql, params)
         columns = [col[0] for col in cursor.description]
         data = [
             dict(zip(columns, row))
             for row in cursor.fetchall()
         ]
-        
-    return data
\ No newline at end of file
+
+    return data
+
+
+async def run_in_thread(func, *args):
+    # Runs blocking ORM code off the event loop in a pool thread, unlike the async ORM methods that all share
+    # one thread, so several calls can be awaited together. The thread's connections are closed afterwards.
+    def call():
+        try:
+            return func(*args)
+        finally:
+            connections.close_all()
+
+    return await sync_to_async(call, thread_sensitive=False)()
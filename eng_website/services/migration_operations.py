@@ -0,0 +1,41 @@
+from django.db.migrations import AddIndex
+
+
+def drop_invalid_index(schema_editor, name):
+    # a concurrent build that failed or was interrupted leaves an INVALID index behind under the same name
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid '
+            'WHERE pg_class.relname = %s AND NOT pg_index.indisvalid', [name])
+        if cursor.fetchone():
+            schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {schema_editor.quote_name(name)}')
+
+
+def runs_concurrently(schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return False
+    if schema_editor.connection.in_atomic_block:
+        raise ValueError('Concurrent index operations need a migration with atomic = False')
+    return True
+
+
+class AddIndexConcurrently(AddIndex):
+    # CREATE / DROP INDEX CONCURRENTLY on PostgreSQL, so the table stays writable while the index builds
+    # and deploys need no downtime. Other databases get the plain statements.
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not runs_concurrently(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            drop_invalid_index(schema_editor, self.index.name)
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not runs_concurrently(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
@@ -0,0 +1,94 @@
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Static build: collectstatic copies every file under a name with the md5 of its contents (css url()s and
+# the {% static %} tag are rewritten to those names) and writes a .gz next to each compressible file.
+# serve_static picks the .gz for clients that accept it, fingerprinted names are cached forever.
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ttf', '.eot')
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# unfingerprinted names (ckeditor loads its plugins by plain path) can change on the next deploy
+PLAIN_CACHE_CONTROL = 'public, max-age=3600'
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+GZIP_RE = re.compile(r'\bgzip\b')
+
+
+def compress(storage, name):
+    # writes name.gz at maximum compression when it is worth it, returns whether it did
+    if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+        return False
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return False
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) >= len(data):
+        return False
+    with open(storage.path(name + '.gz'), 'wb') as target:
+        target.write(compressed)
+    return True
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def url_converter(self, name, hashed_files, template=None):
+        converter = super().url_converter(name, hashed_files, template)
+
+        def convert_or_keep(matchobj):
+            # the site css still points at images that were never added or lie outside static/, keep those urls
+            try:
+                return converter(matchobj)
+            except (ValueError, SuspiciousFileOperation):
+                return matchobj['matched']
+        return convert_or_keep
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # both the plain and the fingerprinted copies, after the css rewrites are final
+        for name in list(paths) + list(self.hashed_files.values()):
+            compress(self, name)
+
+
+def accepts_gzip(request):
+    return bool(GZIP_RE.search(request.headers.get('Accept-Encoding', '')))
+
+
+def serve_static(request, path):
+    # the collected STATIC_ROOT only, no finders; for deployments without a web server in front
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(staticfiles_storage.location, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if path.endswith('.gz') or not os.path.isfile(full_path):
+        raise Http404
+
+    served_path, encoding = full_path, None
+    if accepts_gzip(request) and os.path.isfile(full_path + '.gz'):
+        served_path, encoding = full_path + '.gz', 'gzip'
+
+    stat = os.stat(served_path)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        response = FileResponse(open(served_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(path) else PLAIN_CACHE_CONTROL
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,15 @@
+from django import template
+
+from services import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(image, format=None):
+    return thumbnails.srcset(image, format)
+
+
+@register.simple_tag
+def thumbnail_url(image, width=640):
+    return thumbnails.thumbnail_url(image, width)
@@ -1,3 +1,180 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from services import thumbnails
+from services.db_router import (STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, primary, read_alias,
+                                replicas)
+from services.static_files import serve_static
+
+
+def save_image(name, size=(1600, 900), format='JPEG'):
+    output = io.BytesIO()
+    Image.new('RGB', size, (200, 100, 50)).save(output, format)
+    return default_storage.save(name, ContentFile(output.getvalue()))
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name, THUMBNAIL_WIDTHS=(320, 640, 1280))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def test_variants_are_content_hashed_and_listed_in_srcset(self):
+        name = save_image('preview_images/articles/cover.jpg')
+        index = thumbnails.generate(name)
+
+        jpegs = [variant for variant in index['variants'] if variant['format'] == 'jpg']
+        self.assertEqual([variant['width'] for variant in jpegs], [320, 640, 1280])
+        for variant in index['variants']:
+            self.assertTrue(default_storage.exists(variant['name']))
+            with Image.open(default_storage.open(variant['name'])) as image:
+                self.assertEqual(image.width, variant['width'])
+
+        srcset = thumbnails.srcset(name)
+        self.assertEqual(srcset.count('w, '), 3)
+        self.assertTrue(srcset.endswith('cover.jpg 1600w'))
+        self.assertIn('.640w.jpg', thumbnails.thumbnail_url(name, 400))
+        if thumbnails.webp_supported():
+            self.assertIn('.320w.webp 320w', thumbnails.srcset(name, 'webp'))
+
+        # same name, new contents: new urls, the old ones stay valid for cached pages
+        default_storage.delete(name)
+        save_image(name, size=(800, 600))
+        cache.clear()
+        self.assertNotEqual(thumbnails.generate(name)['variants'][0]['name'], jpegs[0]['name'])
+        self.assertTrue(default_storage.exists(jpegs[0]['name']))
+
+    def test_missing_index_falls_back_to_the_original(self):
+        self.assertEqual(thumbnails.srcset('preview_images/missing.jpg'), '')
+        self.assertTrue(thumbnails.thumbnail_url('preview_images/missing.jpg', 640).endswith('missing.jpg'))
+
+    def test_backfill_command(self):
+        from knowledge_base.models import Category
+
+        for i in range(3):
+            Category.objects.create(title=str(i), description='', slug=f'category-{i}', type=Category.ARTICLE,
+                                    image=save_image(f'preview_images/categories/{i}.png', format='PNG'))
+        Category.objects.create(title='broken', description='', slug='broken', type=Category.ARTICLE,
+                                image='preview_images/categories/missing.png')
+
+        output, errors = io.StringIO(), io.StringIO()
+        call_command('backfill_thumbnails', workers=2, stdout=output, stderr=errors)
+        self.assertIn('3 images done, 1 failed', output.getvalue())
+        self.assertIn('missing.png', errors.getvalue())
+        self.assertIn('.320w.png', thumbnails.thumbnail_url('preview_images/categories/0.png', 320))
+        self.assertTrue(os.path.exists(os.path.join(default_storage.location, thumbnails.index_name(
+            'preview_images/categories/1.png'))))
+
+
+class StaticBuildTests(SimpleTestCase):
+    def setUp(self):
+        source, root = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        self.addCleanup(root.cleanup)
+        os.makedirs(os.path.join(source.name, 'css'))
+        with open(os.path.join(source.name, 'css', 'logo.svg'), 'w') as svg:
+            svg.write('<svg xmlns="http://www.w3.org/2000/svg"></svg>')
+        with open(os.path.join(source.name, 'css', 'site.css'), 'w') as css:
+            css.write('.logo { background: url(logo.svg); }\n.gone { background: url(missing.png); }\n' * 50)
+
+        settings_override = override_settings(
+            STATICFILES_DIRS=[source.name], STATIC_ROOT=root.name,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATICFILES_STORAGE='services.static_files.CompressedManifestStaticFilesStorage',
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_fingerprinted_and_precompressed(self):
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        name = staticfiles_storage.stored_name('css/site.css')
+        self.assertRegex(name, r'^css/site\.[0-9a-f]{12}\.css$')
+        with gzip.open(staticfiles_storage.path(name + '.gz'), 'rt') as compressed:
+            content = compressed.read()
+        self.assertIn(staticfiles_storage.stored_name('css/logo.svg').split('/')[-1], content)
+        self.assertIn('url(missing.png)', content)
+
+        factory = RequestFactory()
+        response = serve_static(factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br'), name)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode(), content)
+
+        response = serve_static(factory.get('/'), 'css/site.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        response.close()
+
+        for path in ('css/site.css.gz', '../site.css', 'css/missing.css'):
+            with self.assertRaises(Http404):
+                serve_static(factory.get('/'), path)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1', 'replica_2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        replicas.reset()
+        self.addCleanup(replicas.reset)
+        probe = mock.patch.object(replicas, 'probe', side_effect=lambda alias: alias not in self.down)
+        self.probe = probe.start()
+        self.addCleanup(probe.stop)
+        self.down = set()
+
+    def route(self, request, write=False):
+        seen = []
+
+        def view(request):
+            seen.append(read_alias())
+            if write:
+                ReplicaRouter().db_for_write(None)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_use_healthy_replicas(self):
+        self.assertIn(read_alias(), {'replica_1', 'replica_2'})
+        self.down = {'replica_1'}
+        replicas.reset()
+        self.probe.reset_mock()
+        self.assertEqual({read_alias() for _ in range(20)}, {'replica_2'})
+        # probed once, then skipped until the retry interval passes
+        self.assertEqual(self.probe.call_args_list.count(mock.call('replica_1')), 1)
+
+        self.down = {'replica_1', 'replica_2'}
+        replicas.reset()
+        self.assertEqual(read_alias(), 'default')
+        with primary():
+            self.assertEqual(read_alias(), 'default')
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        factory = RequestFactory()
+        alias, response = self.route(factory.get('/'))
+        self.assertNotEqual(alias, 'default')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+        alias, response = self.route(factory.post('/admin/'), write=True)
+        self.assertEqual(alias, 'default')
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], 10)
+
+        request = factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.route(request)[0], 'default')
@@ -0,0 +1,142 @@
+import hashlib
+import io
+import json
+import logging
+import posixpath
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+logger = logging.getLogger(__name__)
+
+# Fixed width derivatives of uploaded images. Files are named by the hash of the source contents, so a
+# re-uploaded image gets new urls and every derivative can be cached forever. The variants of an image
+# are listed in a json index next to them and cached, templates never touch the files.
+THUMBNAILS_DIR = 'thumbnails'
+SOURCE_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+QUALITY = 82
+
+
+def widths():
+    return getattr(settings, 'THUMBNAIL_WIDTHS', (320, 640, 1280))
+
+
+def webp_supported():
+    return features.check('webp')
+
+
+def index_name(name):
+    return posixpath.join(THUMBNAILS_DIR, 'index', f'{name}.json')
+
+
+def cache_key(name):
+    return f'services:thumbnails:{hashlib.md5(name.encode()).hexdigest()}'
+
+
+def encode(image, format):
+    output = io.BytesIO()
+    if format == 'JPEG':
+        image.convert('RGB').save(output, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+    elif format == 'WEBP':
+        image.save(output, 'WEBP', quality=QUALITY, method=4)
+    else:
+        image.save(output, format, optimize=True)
+    return output.getvalue()
+
+
+def generate(name, storage=default_storage):
+    # writes the derivatives and the index of one source image, returns the variants
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    image = Image.open(io.BytesIO(data))
+    format = image.format if image.format in SOURCE_FORMATS else 'JPEG'
+    image = ImageOps.exif_transpose(image)
+    if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    formats = [format] + (['WEBP'] if format != 'WEBP' and webp_supported() else [])
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    variants = []
+    for width in sorted(width for width in widths() if width < image.width):
+        resized = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        for variant_format in formats:
+            extension = SOURCE_FORMATS[variant_format]
+            variant_name = posixpath.join(THUMBNAILS_DIR, digest[:2], f'{stem}.{digest}.{width}w.{extension}')
+            if not storage.exists(variant_name):
+                storage.save(variant_name, ContentFile(encode(resized, variant_format)))
+            variants.append({'width': width, 'format': extension, 'name': variant_name})
+
+    index = {'source': name, 'width': image.width, 'format': SOURCE_FORMATS[format], 'variants': variants}
+    if storage.exists(index_name(name)):
+        storage.delete(index_name(name))
+    storage.save(index_name(name), ContentFile(json.dumps(index).encode()))
+    cache.set(cache_key(name), index, None)
+    return index
+
+
+def generate_safely(name):
+    # (name, index or None, error or None); runs in backfill workers and after uploads
+    try:
+        return name, generate(name), None
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as error:
+        return name, None, repr(error)
+
+
+def ensure(name):
+    if load_index(name):
+        return
+    _, _, error = generate_safely(name)
+    if error:
+        logger.warning('Thumbnails for %s failed: %s', name, error)
+
+
+def load_index(name, storage=default_storage):
+    index = cache.get(cache_key(name))
+    if index is None:
+        try:
+            with storage.open(index_name(name), 'rb') as index_file:
+                index = json.load(index_file)
+        except (OSError, ValueError):
+            # not generated yet: remember that briefly so a missing index costs one stat per minute
+            index = {}
+            cache.set(cache_key(name), index, 60)
+            return index
+        cache.set(cache_key(name), index, None)
+    return index
+
+
+def image_name(image):
+    # an ImageFieldFile, a file name or nothing
+    return getattr(image, 'name', image) or None
+
+
+def srcset(image, format=None, storage=default_storage):
+    name = image_name(image)
+    if name is None:
+        return ''
+    index = load_index(name, storage)
+    if not index:
+        return ''
+    format = format or index['format']
+    candidates = [f"{storage.url(variant['name'])} {variant['width']}w"
+                  for variant in index['variants'] if variant['format'] == format]
+    if format == index['format']:
+        candidates.append(f"{storage.url(name)} {index['width']}w")
+    return ', '.join(candidates)
+
+
+def thumbnail_url(image, width, storage=default_storage):
+    # the smallest variant at least `width` wide in the source format, the original when there is none
+    name = image_name(image)
+    if name is None:
+        return ''
+    index = load_index(name, storage)
+    for variant in index.get('variants', ()):
+        if variant['format'] == index['format'] and variant['width'] >= width:
+            return storage.url(variant['name'])
+    return storage.url(name)
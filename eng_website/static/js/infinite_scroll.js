@@ -0,0 +1,46 @@
+let loadMoreLink = document.querySelector('[data-infinite-scroll]')
+let loading = false
+
+
+function fragmentUrl(href) {
+    let url = new URL(href, window.location.href)
+    url.searchParams.set('format', 'json')
+    return url
+}
+
+function loadNextPage() {
+    if (loading || !loadMoreLink)
+        return
+    loading = true
+
+    fetch(fragmentUrl(loadMoreLink.href), {headers: {'Accept': 'application/json'}})
+        .then(response => response.json())
+        .then(page => {
+            let list = document.querySelector(loadMoreLink.dataset.infiniteScroll)
+            list.insertAdjacentHTML('beforeend', page.html)
+            if (page.next) {
+                loadMoreLink.href = '?cursor=' + encodeURIComponent(page.next)
+            } else {
+                observer.disconnect()
+                loadMoreLink.parentElement.remove()
+                loadMoreLink = null
+            }
+        })
+        .finally(() => {
+            loading = false
+        })
+}
+
+// without javascript the link still opens the next page
+let observer = new IntersectionObserver(entries => {
+    if (entries.some(entry => entry.isIntersecting))
+        loadNextPage()
+}, {rootMargin: '400px'})
+
+if (loadMoreLink) {
+    loadMoreLink.addEventListener('click', event => {
+        event.preventDefault()
+        loadNextPage()
+    })
+    observer.observe(loadMoreLink)
+}
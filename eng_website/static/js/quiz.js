@@ -7,12 +7,41 @@ let answerContentTemplate
 let submitButton
 
 
+// mulberry32, a small seeded generator: the same seed gives the same answer order
+function seededRandom(seed) {
+    return function () {
+        seed = (seed + 0x6D2B79F5) | 0
+        let t = Math.imul(seed ^ (seed >>> 15), 1 | seed)
+        t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t
+        return ((t ^ (t >>> 14)) >>> 0) / 4294967296
+    }
+}
+
+// set by the quiz page, the submit is rejected without it
+function csrfToken() {
+    let cookie = document.cookie.split('; ').find(cookie => cookie.startsWith('csrftoken='))
+    return cookie ? decodeURIComponent(cookie.substring('csrftoken='.length)) : ''
+}
+
+function shuffle(items, random) {
+    for (let i = items.length - 1; i > 0; i--) {
+        let j = Math.floor(random() * (i + 1));
+        [items[i], items[j]] = [items[j], items[i]]
+    }
+    return items
+}
+
+
 class Quiz {
     constructor() {
         this.questions = JSON.parse(document.getElementById('quiz_questions').textContent)
-        this.results = JSON.parse(document.getElementById('quiz_results').textContent)
+        this.submitUrl = JSON.parse(document.getElementById('quiz_submit_url').textContent)
+        // the server sends answers in a fixed order so the page can be cached, they are shuffled here
+        let random = seededRandom(JSON.parse(document.getElementById('quiz_shuffle_seed').textContent))
+        this.questions.forEach(question => shuffle(question.answers, random))
         this.currentQuestion = 1
-        this.score = 0
+        // question id -> chosen answer id, graded by the server on submit
+        this.choices = {}
     }
 
     setNextQuestion() {
@@ -29,13 +58,21 @@ class Quiz {
         return this.currentQuestion > this.questions.length
     }
 
-
-    isAnswerCorrect(answerIndex) {
-        return this.questions[this.currentQuestion - 1].answers[answerIndex].correct
+    chooseAnswer(answerIndex) {
+        let question = this.getCurrentQuestion()
+        this.choices[question.id] = question.answers[answerIndex].id
     }
 
-    updateScore() {
-        this.score++
+    submit() {
+        return fetch(this.submitUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json', 'X-CSRFToken': csrfToken()},
+            body: JSON.stringify({answers: this.choices}),
+        }).then(response => {
+            if (!response.ok)
+                throw new Error('Submit failed with ' + response.status)
+            return response.json()
+        })
     }
 }
 
@@ -46,32 +83,23 @@ function answerElementHandler(event) {
     }
 
     let answerIndex = Number(answerElement.getAttribute('answer'))
-    let correct = quiz.isAnswerCorrect(answerIndex)
-    if (correct) {
-        quiz.updateScore()
-    }
+    quiz.chooseAnswer(answerIndex)
 
-    setAnswersIcons()
+    setAnswersIcons(answerIndex)
     submitButton.style.display = "inline"
 }
 
-function setAnswersIcons() {
-    let answerIndex
-    let iconElement
-    let counter
-
+function setAnswersIcons(chosenIndex) {
     answers.childNodes.forEach(function (answerElement, index) {
-        answerIndex = Number(answerElement.getAttribute('answer'))
-        iconElement = answerElement.querySelector(".answer-icon")
-        counter = answerElement.querySelector(".answer-counter")
-
-
-        counter.textContent = null
+        let answerIndex = Number(answerElement.getAttribute('answer'))
+        let iconElement = answerElement.querySelector(".answer-icon")
+        let counter = answerElement.querySelector(".answer-counter")
 
-        if (quiz.isAnswerCorrect(answerIndex)) {
-            iconElement.className += ' fa fa-check'
-        } else {
-            iconElement.className += ' fa fa-times'
+        iconElement.classList.remove('fa', 'fa-check')
+        counter.textContent = answerIndex + 1 + ')'
+        if (answerIndex === chosenIndex) {
+            counter.textContent = null
+            iconElement.classList.add('fa', 'fa-check')
         }
     })
 
@@ -80,34 +108,35 @@ function setAnswersIcons() {
 function submitButtonHandler(event) {
     quiz.setNextQuestion()
     if (quiz.isQuizEnded()) {
-        showQuizResult()
+        submitButton.disabled = true
+        quiz.submit().then(showQuizResult).catch(showSubmitError)
     } else {
         showCurrentQuestion()
     }
 
 }
 
-function showQuizResult() {
+function showQuizResult(graded) {
     let resultContentTemplate = document.getElementById("test_result_template").content.firstElementChild.cloneNode(true)
 
     let resultElement = resultContentTemplate.querySelector('#your-result')
-    resultElement.textContent += quiz.score
+    resultElement.textContent += graded.score + '/' + graded.total
 
     let resultDescriptionElement = resultContentTemplate.querySelector('#description-result')
-    let description
-    for (const result of quiz.results) {
-        if (result.max_value >= quiz.score && result.min_value <= quiz.score) {
-            description = result.content
-            break
-        }
-    }
-
-    resultDescriptionElement.textContent = description
+    resultDescriptionElement.textContent = graded.result
 
     mainContent.innerHTML = resultContentTemplate.innerHTML
 
 }
 
+function showSubmitError() {
+    // the answers are kept, the button sends them again
+    questionNumberElement.textContent = 'Ошибка'
+    questionTitle.textContent = 'Не удалось отправить ответы, попробуйте ещё раз'
+    answers.replaceChildren()
+    submitButton.disabled = false
+}
+
 function showCurrentQuestion() {
     let question = quiz.getCurrentQuestion()
     questionNumberElement.textContent = 'Вопрос ' + quiz.currentQuestion + '/' + quiz.questions.length